@@ -1,7 +1,20 @@
 from django.contrib import admin
+from django.db import transaction
+
+from . import ledger
 from .models import Medicine
 
 class MedicineAdmin(admin.ModelAdmin):
     list_display = ('name', 'quantity', 'buying_price', 'selling_price', 'expiry_date', 'manufacturer')
 
+    def get_readonly_fields(self, request, obj=None):
+        # Stock changes go through the ledger (the edit page, sales, imports), never straight to the column.
+        return ('quantity',) if obj is not None else ()
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                ledger.record_opening(obj)
+
 admin.site.register(Medicine, MedicineAdmin)
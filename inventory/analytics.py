@@ -0,0 +1,318 @@
+"""
+Sales analytics for charting: time series, best sellers and slow movers.
+
+``series`` reads the daily rollup rows (``DailySalesSummary``), which are
+already grouped by day, payment mode and category, and lets the database
+do the rest in one query per call: rows are truncated to the day, week or
+month, summed, and window functions add the running totals (month to date
+for days, year to date for weeks and months) and the previous period's
+figures for period-over-period deltas.
+
+A period that has ended can no longer change, so its rows are cached for
+a day in the ``analytics`` cache; only the open period is queried again.
+Voiding a past sale, rebuilding the rollups or deleting a category calls
+``invalidate()``, which bumps a version kept in the database
+(``inventory.versions``), so every process stops reading the old entries.
+
+``top_medicines`` and ``slow_movers`` need per-medicine figures, which
+the rollups do not keep, so they group ``SaleItem`` joined to ``Medicine``;
+they only cover the live (not archived) months.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.db.models import Count, ExpressionWrapper, F, Func, Q, Sum, Window
+from django.db.models.functions import Coalesce, Lag, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from . import archive, versions
+from .dashboard import CENTS, MONEY
+from .models import DailySalesSummary, Medicine, SaleItem
+
+GRAINS = ('day', 'week', 'month')
+DIMENSIONS = {None: None, 'category': 'category__name', 'payment_mode': 'payment_mode'}
+METRICS = ('revenue', 'profit', 'units')
+TOP_LIMIT = 10
+SLOW_MOVER_DAYS = 90
+OPEN_TIMEOUT = 60  # seconds; reports over ranges that include today
+CLOSED_TIMEOUT = 60 * 60 * 24  # ended ranges; invalidate() covers corrections
+CACHE_ALIAS = 'analytics'
+VERSION_NAME = 'analytics'
+ZERO = Decimal('0')
+
+
+class InvalidReport(ValueError):
+    pass
+
+
+class Aggregated(Func):
+    """Lets an aggregate be the argument of an aggregate window, e.g. SUM(SUM(x)) OVER (...)."""
+    template = '%(expressions)s'
+    contains_aggregate = False
+
+    def get_group_by_cols(self):
+        return []
+
+
+# -----------------------------
+# PERIODS
+# -----------------------------
+
+def period_start(day, grain):
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start, grain):
+    if grain == 'week':
+        return start + timedelta(days=7)
+    if grain == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def previous_period(start, grain):
+    return period_start(start - timedelta(days=1), grain)
+
+
+def periods(start, end, grain):
+    current = period_start(start, grain)
+    while current <= end:
+        yield current
+        current = next_period(current, grain)
+
+
+def _running_start(start, grain):
+    """First day of the running-total window (month or year) containing ``start``."""
+    return start.replace(day=1) if grain == 'day' else start.replace(month=1, day=1)
+
+
+# -----------------------------
+# CACHE
+# -----------------------------
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version():
+    return versions.get(VERSION_NAME)
+
+
+def invalidate():
+    """Forget every cached report, e.g. after a past sale was voided; call inside the writing transaction."""
+    versions.bump(VERSION_NAME)
+
+
+def _period_key(version, grain, by, start):
+    return f'analytics:{version}:series:{grain}:{by}:{start}'
+
+
+# -----------------------------
+# TIME SERIES
+# -----------------------------
+
+def _truncate(grain):
+    return {'day': F('date'), 'week': TruncWeek('date'), 'month': TruncMonth('date')}[grain]
+
+
+def _running_partition(grain):
+    return TruncMonth('period') if grain == 'day' else TruncYear('period')
+
+
+def query_series(start, end, grain, by=None):
+    """
+    Rows for the periods from ``start`` to ``end``, straight from the
+    database. Rows before ``start`` are read too, so the running totals and
+    previous-period figures of the first periods are right, then dropped.
+    """
+    first = period_start(start, grain)
+    dimension = DIMENSIONS[by]
+    group = ['period'] + ([dimension] if dimension else [])
+    partition = [F(dimension)] if dimension else []
+    by_period = {'order_by': F('period').asc()}
+
+    def running(field):
+        return Window(Sum(Aggregated(Sum(field))), partition_by=[_running_partition(grain), *partition], **by_period)
+
+    def previous(expression):
+        return Window(Lag(expression), partition_by=partition or None, **by_period)
+
+    rows = (
+        DailySalesSummary.objects
+        .filter(date__gte=min(_running_start(first, grain), previous_period(first, grain)), date__lte=end)
+        .annotate(period=_truncate(grain))
+        .values(*group)
+        .annotate(
+            revenue_total=Sum('revenue'),
+            cost_total=Sum('cost'),
+            profit_total=Sum('profit'),
+            units_total=Sum('units'),
+        )
+        # Separate annotate(): windows added with the aggregates would be grouped by.
+        .annotate(
+            running_revenue=running('revenue'),
+            running_profit=running('profit'),
+            previous_start=previous(_truncate(grain)),
+            previous_revenue=previous(Sum('revenue')),
+            previous_profit=previous(Sum('profit')),
+        )
+        .order_by(*group)
+    )
+    return [_series_row(row, grain, dimension) for row in rows if row['period'] >= first]
+
+
+def _series_row(row, grain, dimension):
+    revenue, profit = row['revenue_total'].quantize(CENTS), row['profit_total'].quantize(CENTS)
+    # Lag() returns the previous period that had sales; an empty period in between counts as zero.
+    contiguous = row['previous_start'] == previous_period(row['period'], grain)
+    previous_revenue = row['previous_revenue'].quantize(CENTS) if contiguous else ZERO
+    previous_profit = row['previous_profit'].quantize(CENTS) if contiguous else ZERO
+    result = {'period': row['period']}
+    if dimension:
+        result['key'] = row[dimension] or "Uncategorized"
+    result.update({
+        'revenue': revenue,
+        'cost': row['cost_total'].quantize(CENTS),
+        'profit': profit,
+        'units': row['units_total'],
+        'margin': (profit * 100 / revenue).quantize(CENTS) if revenue else None,
+        'running_revenue': row['running_revenue'].quantize(CENTS),
+        'running_profit': row['running_profit'].quantize(CENTS),
+        'previous_revenue': previous_revenue,
+        'revenue_change': revenue - previous_revenue,
+        'profit_change': profit - previous_profit,
+    })
+    return result
+
+
+def series(start, end, grain='month', by=None):
+    """
+    Revenue, cost, profit, units and margin per period (and per category or
+    payment mode with ``by``), with running totals and changes from the
+    previous period. Ended periods come from the cache.
+    """
+    if grain not in GRAINS:
+        raise InvalidReport(f"grain must be one of {', '.join(GRAINS)}.")
+    if by not in DIMENSIONS:
+        raise InvalidReport("by must be 'category' or 'payment_mode'.")
+    if start > end:
+        raise InvalidReport("from must not be after to.")
+
+    today = timezone.localdate()
+    version = _version()
+    wanted = list(periods(start, end, grain))
+    closed = [p for p in wanted if next_period(p, grain) <= today]
+    keys = {p: _period_key(version, grain, by, p) for p in closed}
+    cache = get_cache()
+    found = cache.get_many(keys.values())
+    by_period = {p: found[key] for p, key in keys.items() if key in found}
+
+    missing = [p for p in wanted if p not in by_period]
+    if missing:
+        fresh = {p: [] for p in missing}
+        for row in query_series(missing[0], min(end, next_period(missing[-1], grain) - timedelta(days=1)), grain, by):
+            if row['period'] in fresh:
+                fresh[row['period']].append(row)
+        cache.set_many({keys[p]: rows for p, rows in fresh.items() if p in keys}, CLOSED_TIMEOUT)
+        by_period.update(fresh)
+    return [row for p in wanted for row in by_period[p]]
+
+
+# -----------------------------
+# MEDICINES
+# -----------------------------
+
+def _line_revenue():
+    return ExpressionWrapper(F('price') * F('quantity'), output_field=MONEY)
+
+
+def _line_profit():
+    unit_cost = Coalesce('unit_cost', 'medicine__buying_price')
+    return ExpressionWrapper((F('price') - unit_cost) * F('quantity'), output_field=MONEY)
+
+
+def _since(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _cached(key, end, build):
+    """Cache a report over a range ending ``end``: for a day once the range is over."""
+    cache = get_cache()
+    key = f'analytics:{_version()}:{key}'
+    result = cache.get(key)
+    if result is None:
+        result = build()
+        cache.set(key, result, CLOSED_TIMEOUT if end < timezone.localdate() else OPEN_TIMEOUT)
+    return result
+
+
+def top_medicines(start, end, metric='revenue', limit=TOP_LIMIT):
+    """
+    The ``limit`` best-selling medicines between two dates by revenue, profit
+    or units. Archived sales have no live lines, so ranges reaching into the
+    archived months are rejected rather than silently short.
+    """
+    if metric not in METRICS:
+        raise InvalidReport(f"metric must be one of {', '.join(METRICS)}.")
+    live_since = archive.live_since()
+    if live_since and start < live_since:
+        raise InvalidReport(f"Sales before {live_since} are archived; from must be {live_since} or later.")
+
+    def build():
+        rows = (
+            SaleItem.objects
+            .filter(sale__sale_date__gte=_since(start), sale__sale_date__lt=_since(end + timedelta(days=1)),
+                    sale__voided_at__isnull=True)
+            .values('medicine_id', 'medicine__name')
+            .annotate(revenue=Sum(_line_revenue()), profit=Sum(_line_profit()), units=Sum('quantity'),
+                      sales=Count('sale', distinct=True))
+            .order_by(f'-{metric}', 'medicine__name')[:limit]
+        )
+        return [{
+            'rank': rank,
+            'medicine_id': row['medicine_id'],
+            'name': row['medicine__name'],
+            'revenue': row['revenue'].quantize(CENTS),
+            'profit': row['profit'].quantize(CENTS),
+            'units': row['units'],
+            'sales': row['sales'],
+        } for rank, row in enumerate(rows, 1)]
+
+    return _cached(f'top:{start}:{end}:{metric}:{limit}', end, build)
+
+
+def slow_movers(days=SLOW_MOVER_DAYS, limit=TOP_LIMIT * 2):
+    """
+    Medicines in stock that sold least over the last ``days`` days, with the
+    stock value tied up in them and how many days the stock lasts at that rate.
+    """
+    today = timezone.localdate()
+    since = today - timedelta(days=days)
+
+    def build():
+        recent = Q(saleitem__sale__sale_date__gte=_since(since + timedelta(days=1)),
+                   saleitem__sale__voided_at__isnull=True)
+        rows = (
+            Medicine.objects.filter(quantity__gt=0)
+            .annotate(
+                sold=Coalesce(Sum('saleitem__quantity', filter=recent), 0),
+                stock_value=ExpressionWrapper(F('quantity') * F('buying_price'), output_field=MONEY),
+            )
+            .order_by('sold', '-stock_value', 'name')
+            .values('id', 'name', 'quantity', 'sold', 'stock_value')[:limit]
+        )
+        return [{
+            'medicine_id': row['id'],
+            'name': row['name'],
+            'stock': row['quantity'],
+            'sold': row['sold'],
+            'stock_value': row['stock_value'].quantize(CENTS),
+            'days_of_cover': round(row['quantity'] * days / row['sold']) if row['sold'] else None,
+        } for row in rows]
+
+    return _cached(f'slow:{today}:{days}:{limit}', today, build)
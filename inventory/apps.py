@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from . import catalog, profiling, rollups, search, sync  # noqa: F401 - these register signal receivers
+
+        post_migrate.connect(search.ensure_index, sender=self)
+        connection_created.connect(profiling.install_wrapper)
+        for connection in connections.all(initialized_only=True):
+            profiling.install_wrapper(connection=connection)
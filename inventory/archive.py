@@ -0,0 +1,319 @@
+"""
+Hot/cold storage for sales: old months move out of the live tables.
+
+``archive_before(cutoff)`` writes every month that ended before ``cutoff``
+to one gzip-compressed, columnar JSON file under ``SALES_ARCHIVE_DIR``
+(``sales-YYYY-MM.json.gz``: one list per column for the sales, their lines
+and their receipt snapshots), records it as an ``ArchivedMonth`` and then
+deletes the month's ``Sale``, ``SaleItem`` and ``Receipt`` rows. Sales added
+to an archived month later are merged into a new file; the record switches
+to it in the same transaction that deletes their rows, and the old file is
+removed once that commits. Stock
+movements are kept (their ``sale`` becomes null), and so are the daily
+rollup rows, so stock balances, the dashboard and the analytics series are
+unchanged. The live tables, and every query and search over them, only
+hold the recent months.
+
+Archived sales stay readable: ``receipt_data`` finds a receipt by sale id
+and ``sales_rows`` yields export rows for a date range, reading the month
+files (the last few are kept parsed in memory).
+"""
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F, Max, Min
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import ArchivedMonth, Receipt, Sale, SaleItem, StockMovement
+from .receipts import snapshot_data
+
+MIN_MONTHS = 4  # the forecasts, slow movers and void window read the last ~90 days of sale lines
+LOADED_MONTHS = 4
+
+
+def archive_dir():
+    return Path(settings.SALES_ARCHIVE_DIR)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _local_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _money(value):
+    return f"{value:.2f}"
+
+
+def _stamp(value):
+    return value.isoformat() if value else None
+
+
+def cutoff_for(months, today=None):
+    """First day of the month ``months`` months before this one; sales before it are archived."""
+    month = month_start(today or timezone.localdate())
+    for _ in range(months):
+        month = month_start(month - timedelta(days=1))
+    return month
+
+
+def check_cutoff(cutoff):
+    """Raise ``ValueError`` unless ``cutoff`` is a first of the month leaving ``MIN_MONTHS`` live."""
+    if cutoff.day != 1:
+        raise ValueError("Sales are archived by whole months; the cutoff must be a first of the month.")
+    if cutoff > cutoff_for(MIN_MONTHS):
+        raise ValueError(f"Keep at least {MIN_MONTHS} months of sales live.")
+
+
+def pending(cutoff):
+    """The live sales ``archive_before(cutoff)`` would move."""
+    return Sale.objects.filter(sale_date__lt=_local_start(cutoff))
+
+
+def live_since():
+    """The first day whose sales are still in the live tables, or None when nothing is archived."""
+    last = ArchivedMonth.objects.aggregate(last=Max('month'))['last']
+    return next_month(last) if last else None
+
+
+# -----------------------------
+# WRITING
+# -----------------------------
+
+def _columns(rows, names):
+    columns = {name: [] for name in names}
+    for row in rows:
+        for name, value in zip(names, row):
+            columns[name].append(value)
+    return columns
+
+
+def _month_data(sales):
+    """Columnar copy of ``sales`` (a queryset of one month) with their lines and receipts."""
+    sale_rows = list(sales.order_by('sale_date', 'pk').values_list(
+        'id', 'sale_date', 'payment_mode', 'total_amount', 'voided_at',
+    ))
+    ids = [row[0] for row in sale_rows]
+    lines = list(
+        SaleItem.objects.filter(sale_id__in=ids).order_by('sale_id', 'pk').values_list(
+            'sale_id', 'medicine_id', 'medicine__name', 'quantity', 'price',
+            Coalesce('unit_cost', F('medicine__buying_price')),
+        )
+    )
+    receipts = dict(Receipt.objects.filter(sale_id__in=ids).values_list('sale_id', 'data'))
+
+    # Sales from before receipt snapshots get one now, from the lines being archived.
+    by_sale = {}
+    for sale_id, _, name, quantity, price, unit_cost in lines:
+        by_sale.setdefault(sale_id, []).append((name, quantity, price, unit_cost))
+    for pk, sale_date, payment_mode, _, voided_at in sale_rows:
+        if pk not in receipts:
+            sale = Sale(pk=pk, sale_date=sale_date, payment_mode=payment_mode, voided_at=voided_at)
+            receipts[pk] = snapshot_data(sale, by_sale.get(pk, []))
+
+    return {
+        'sales': _columns(
+            ((pk, _stamp(date), mode, _money(total), _stamp(voided)) for pk, date, mode, total, voided in sale_rows),
+            ['id', 'sale_date', 'payment_mode', 'total_amount', 'voided_at'],
+        ),
+        'lines': _columns(
+            ((sale, medicine, name, quantity, _money(price), _money(cost))
+             for sale, medicine, name, quantity, price, cost in lines),
+            ['sale_id', 'medicine_id', 'medicine', 'quantity', 'price', 'unit_cost'],
+        ),
+        'receipts': _columns(sorted(receipts.items()), ['sale_id', 'data']),
+    }
+
+
+def _merge(old, new):
+    for table, columns in new.items():
+        for name, values in columns.items():
+            old[table][name].extend(values)
+    return old
+
+
+def _write(path, data):
+    partial = path.with_name(path.name + '.part')
+    with gzip.open(partial, 'wt', encoding='utf-8') as out:
+        json.dump(data, out, separators=(',', ':'))
+    os.replace(partial, path)
+    return path.stat().st_size
+
+
+def _voided_lines(data):
+    voided = {pk for pk, voided_at in zip(data['sales']['id'], data['sales']['voided_at']) if voided_at}
+    return sum(1 for sale_id in data['lines']['sale_id'] if sale_id in voided)
+
+
+def _delete(queryset):
+    # The rows are in the archive file; a plain DELETE skips loading them
+    # for the model signals, which only invalidate the catalog cache.
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def archive_month(month):
+    """Move the live sales of ``month`` into its archive file. Returns the ``ArchivedMonth`` or None."""
+    sales = Sale.objects.filter(sale_date__gte=_local_start(month), sale_date__lt=_local_start(next_month(month)))
+    directory = archive_dir()
+    written = None
+    try:
+        with write_transaction():
+            data = _month_data(sales)
+            ids = data['sales']['id']
+            if not ids:
+                return None
+            record = ArchivedMonth.objects.filter(month=month).first()
+            if record is not None:
+                # Sales were added to the month after it was archived (e.g. a backdated import).
+                # They go to a new file, so the old one stays right until this commits.
+                replaced = directory / record.filename
+                data = _merge(_read(replaced), data)
+                transaction.on_commit(lambda: replaced.unlink(missing_ok=True))
+                record.filename = f'sales-{month:%Y-%m}-{timezone.now():%Y%m%d%H%M%S%f}.json.gz'
+            else:
+                record = ArchivedMonth(month=month, filename=f'sales-{month:%Y-%m}.json.gz')
+            data['month'] = f'{month:%Y-%m}'
+
+            directory.mkdir(parents=True, exist_ok=True)
+            written = directory / record.filename
+            record.size = _write(written, data)
+            record.sales = len(data['sales']['id'])
+            record.lines = len(data['lines']['sale_id'])
+            record.voided_lines = _voided_lines(data)
+            record.first_sale_id = min(data['sales']['id'])
+            record.last_sale_id = max(data['sales']['id'])
+            record.archived_at = timezone.now()
+            record.save()
+
+            StockMovement.objects.filter(sale_id__in=ids).update(sale=None)
+            _delete(Receipt.objects.filter(sale_id__in=ids))
+            _delete(SaleItem.objects.filter(sale_id__in=ids))
+            _delete(Sale.objects.filter(pk__in=ids))
+    except BaseException:
+        # Rolled back: the rows are still live, so the file written for them must go.
+        if written is not None:
+            written.unlink(missing_ok=True)
+        raise
+    return record
+
+
+def archive_before(cutoff):
+    """Archive every month that ended before ``cutoff`` (a first of the month). Returns the months written."""
+    check_cutoff(cutoff)
+    first = pending(cutoff).aggregate(first=Min('sale_date'))['first']
+    if first is None:
+        return []
+    written = []
+    month = month_start(timezone.localdate(first))
+    while month < cutoff:
+        record = archive_month(month)
+        if record is not None:
+            written.append(record)
+        month = next_month(month)
+    return written
+
+
+# -----------------------------
+# READING
+# -----------------------------
+
+def _read(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        return json.load(archive)
+
+
+@lru_cache(maxsize=LOADED_MONTHS)
+def _load(path, size, mtime):
+    # Keyed by size and mtime, so a month rewritten by a later run is read again.
+    return _read(path)
+
+
+def load(record):
+    """The parsed file of an ``ArchivedMonth``; recently read months are kept in memory."""
+    path = archive_dir() / record.filename
+    stat = path.stat()
+    return _load(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def receipt_data(sale_id):
+    """Receipt data of an archived sale, or None."""
+    months = ArchivedMonth.objects.filter(first_sale_id__lte=sale_id, last_sale_id__gte=sale_id).order_by('month')
+    for record in months:
+        receipts = load(record)['receipts']
+        if sale_id in receipts['sale_id']:
+            return receipts['data'][receipts['sale_id'].index(sale_id)]
+    return None
+
+
+def _months(start=None, end=None):
+    months = ArchivedMonth.objects.order_by('month')
+    if start:
+        months = months.filter(month__gte=month_start(start))
+    if end:
+        months = months.filter(month__lte=end)
+    return months
+
+
+def _month_rows(record, low, high):
+    data = load(record)
+    sales, lines = data['sales'], data['lines']
+    kept = {}
+    for pk, stamp, payment_mode, voided_at in zip(
+        sales['id'], sales['sale_date'], sales['payment_mode'], sales['voided_at'],
+    ):
+        sale_date = datetime.fromisoformat(stamp)
+        if voided_at or (low and sale_date < low) or (high and sale_date >= high):
+            continue
+        kept[pk] = (sale_date, payment_mode)
+    rows = [
+        (sale_id, *kept[sale_id], medicine_id, name, quantity, Decimal(price), Decimal(unit_cost))
+        for sale_id, medicine_id, name, quantity, price, unit_cost in zip(
+            lines['sale_id'], lines['medicine_id'], lines['medicine'], lines['quantity'], lines['price'],
+            lines['unit_cost'],
+        )
+        if sale_id in kept
+    ]
+    rows.sort(key=lambda row: row[1])  # stable: lines stay in sale order
+    return rows
+
+
+def _bounds(start, end):
+    return _local_start(start) if start else None, _local_start(end + timedelta(days=1)) if end else None
+
+
+def line_count(start=None, end=None):
+    """Archived lines of unvoided sales between two dates, the rows ``sales_rows`` yields."""
+    low, high = _bounds(start, end)
+    count = 0
+    for record in _months(start, end):
+        if (start and record.month < start) or (end and next_month(record.month) > end + timedelta(days=1)):
+            count += len(_month_rows(record, low, high))  # a month cut by the range is read
+        else:
+            count += record.lines - record.voided_lines
+    return count
+
+
+def sales_rows(start=None, end=None):
+    """
+    Lines of the archived, unvoided sales between two dates, oldest first, as
+    ``(sale_id, sale_date, payment_mode, medicine_id, name, quantity, price,
+    unit_cost)`` like the live export query.
+    """
+    low, high = _bounds(start, end)
+    for record in _months(start, end):
+        yield from _month_rows(record, low, high)
@@ -0,0 +1,73 @@
+"""
+Async point-of-sale endpoints.
+
+Tills hit these on every keystroke and scan, so they are written as async
+views with Django's async ORM and cache APIs. Served through ASGI
+(``pharmacy.asgi``) one worker process can then keep many tills waiting on
+the database at once, and a slow report in another request no longer holds
+up a cashier's search. Under WSGI they still work; Django runs them in an
+event loop per request.
+"""
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponse, JsonResponse
+
+from . import receipts, search
+from .models import Medicine
+
+MAX_STOCK_IDS = 100
+
+
+def alogin_required(view):
+    """``login_required`` for async views; the user is loaded with ``request.auser()``."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+# ----- TYPEAHEAD -----
+@alogin_required
+async def pos_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', search.TYPEAHEAD_LIMIT))
+    except ValueError:
+        limit = search.TYPEAHEAD_LIMIT
+    results = await search.atypeahead(query, limit) if query else []
+    return JsonResponse({'results': results})
+
+
+# ----- STOCK AVAILABILITY -----
+@alogin_required
+async def pos_stock(request):
+    """``?ids=1,2,3`` -> current price, stock and earliest expiry of each medicine."""
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip().isdigit()][:MAX_STOCK_IDS]
+    medicines = Medicine.objects.filter(pk__in=ids).values_list('id', 'name', 'selling_price', 'quantity', 'expiry_date')
+    return JsonResponse({'medicines': [
+        {
+            'id': pk,
+            'name': name,
+            'price': f"{Decimal(price):.2f}",
+            'stock': quantity,
+            'in_stock': quantity > 0,
+            'expiry_date': expiry_date,
+        }
+        async for pk, name, price, quantity, expiry_date in medicines
+    ]})
+
+
+# ----- RECEIPT FETCH -----
+@alogin_required
+async def pos_receipt(request, sale_id):
+    fmt = receipts.TEXT if request.GET.get('format') == 'text' else receipts.HTML
+    output = await receipts.arendered(sale_id, fmt)
+    if output is None:
+        raise Http404("Sale not found.")
+    return HttpResponse(output, content_type='text/plain' if fmt == receipts.TEXT else 'text/html')
@@ -0,0 +1,94 @@
+"""
+Expiry reporting over stock batches.
+
+Every query here is a range scan of the ``(expiry_date, medicine)`` batch
+index, restricted to batches that still hold stock, so the cost follows the
+number of batches near expiry rather than the size of the catalog. Writes to
+batches go through ``inventory.ledger``.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from . import catalog
+from .dashboard import CENTS, MONEY
+from .models import Medicine, StockBatch
+
+BUCKET_DAYS = (30, 60, 90)
+ALERT_LIMIT = 200
+MAX_ALERT_DAYS = 365 * 10  # longer windows overflow the date arithmetic
+
+
+def _batch_value():
+    return ExpressionWrapper(F('quantity') * F('medicine__buying_price'), output_field=MONEY)
+
+
+def open_batches(until):
+    """Batches holding stock that expire on or before ``until``."""
+    return StockBatch.objects.filter(expiry_date__lte=until, quantity__gt=0)
+
+
+def compute_buckets(today=None):
+    """
+    Count batches, medicines, units and stock value per expiry bucket in one
+    aggregate query: already expired, then within 30, 60 and 90 days.
+    Buckets are cumulative, so ``within_60`` includes ``within_30``.
+    """
+    today = today or timezone.localdate()
+    bounds = {'expired': today - timedelta(days=1)}
+    bounds.update({f'within_{days}': today + timedelta(days=days) for days in BUCKET_DAYS})
+
+    aggregates = {}
+    for name, until in bounds.items():
+        expiring = Q(expiry_date__lte=until)
+        aggregates[f'{name}__batches'] = Count('id', filter=expiring)
+        aggregates[f'{name}__medicines'] = Count('medicine', filter=expiring, distinct=True)
+        aggregates[f'{name}__units'] = Sum('quantity', filter=expiring, default=0)
+        aggregates[f'{name}__value'] = Sum(_batch_value(), filter=expiring, output_field=MONEY, default=Decimal('0'))
+    totals = open_batches(max(bounds.values())).aggregate(**aggregates)
+
+    buckets = {}
+    for key, value in totals.items():
+        name, measure = key.split('__')
+        buckets.setdefault(name, {'until': bounds[name]})[measure] = value.quantize(CENTS) if measure == 'value' else value
+    return buckets
+
+
+def expiry_buckets():
+    """``compute_buckets`` for today, cached until stock or the date changes."""
+    today = timezone.localdate()
+    return catalog.cached(f'expiry_buckets:{today}', lambda: compute_buckets(today))
+
+
+def expiring(days=BUCKET_DAYS[-1], limit=ALERT_LIMIT):
+    """Batches holding stock that expire within ``days``, earliest first, as dicts."""
+    until = timezone.localdate() + timedelta(days=days)
+    rows = (
+        open_batches(until)
+        .order_by('expiry_date', 'medicine_id', 'pk')
+        .values('id', 'medicine_id', 'medicine__name', 'lot_number', 'expiry_date', 'quantity')
+        .annotate(value=_batch_value())[:limit]
+    )
+    return [
+        {
+            'batch_id': row['id'],
+            'medicine_id': row['medicine_id'],
+            'medicine': row['medicine__name'],
+            'lot_number': row['lot_number'],
+            'expiry_date': row['expiry_date'],
+            'quantity': row['quantity'],
+            'value': row['value'].quantize(CENTS),
+        }
+        for row in rows
+    ]
+
+
+def reconcile(medicines=None):
+    """Return medicines whose batches do not add up to their stored quantity."""
+    medicines = Medicine.objects.all() if medicines is None else medicines
+    return (
+        medicines.annotate(batch_quantity=Sum('batches__quantity', default=0))
+        .exclude(quantity=F('batch_quantity'))
+    )
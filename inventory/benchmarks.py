@@ -0,0 +1,396 @@
+"""
+Seeded benchmark of every inventory view.
+
+``seed`` bulk-loads a synthetic pharmacy (categories, medicines with their
+batches and opening movements, sales with their lines and receipts, and the
+daily sales rollup). ``run`` then drives each ``Case`` through the Django
+test client and records wall time, SQL query count and peak Python memory.
+Query budgets do not depend on the size of the data, so a view that starts
+issuing a query per row fails its budget at any scale.
+
+Use the ``benchmark`` management command to run it against a throwaway test
+database and write or compare a JSON report.
+"""
+import json
+import random
+import statistics
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from time import perf_counter
+from typing import Callable, Optional
+
+import django
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from . import jobs, rollups, sync
+from .checkout import checkout
+from .models import Category, Job, Medicine, Receipt, Sale, SaleItem, StockBatch, StockMovement
+from .receipts import snapshot_data
+
+CHUNK_SIZE = 5000
+STEMS = ['amoxi', 'para', 'ibu', 'metfor', 'cipro', 'lorata', 'omepra', 'azithro', 'cetiri', 'diclo']
+SUFFIXES = ['cillin', 'cetamol', 'profen', 'min', 'floxacin', 'dine', 'zole', 'mycin', 'zine', 'fenac']
+MANUFACTURERS = ['Cosmos', 'Dawa', 'Universal', 'Regal', 'Beta Healthcare', 'Elys', 'Laborex', 'Shelys']
+PAYMENT_MODES = [mode for mode, _ in Sale.PAYMENT_CHOICES]
+BASKET_LINES = 10  # lines of the checkout_basket case, each from another category
+
+
+@dataclass
+class Dataset:
+    """Counts and sample ids of a seeded pharmacy, used to build the cases."""
+    medicines: int
+    sales: int
+    sale_items: int
+    medicine_id: int
+    sale_id: int
+    sale_day: str
+    query: str
+    basket: list = field(default_factory=list)  # medicine ids in stock, one per category
+
+    def counts(self):
+        return {'medicines': self.medicines, 'sales': self.sales, 'sale_items': self.sale_items}
+
+
+@contextmanager
+def _explicit_sale_dates():
+    # bulk_create() honours auto_now_add, which would stamp every seeded sale
+    # with the current time.
+    sale_date = Sale._meta.get_field('sale_date')
+    sale_date.auto_now_add = False
+    try:
+        yield
+    finally:
+        sale_date.auto_now_add = True
+
+
+def _chunked(count, size):
+    for start in range(0, count, size):
+        yield range(start, min(start + size, count))
+
+
+@transaction.atomic
+def seed(medicines=50_000, sales=200_000, items_per_sale=5, categories=25, days=365, seed=0,
+         chunk_size=CHUNK_SIZE):
+    """
+    Bulk-load a synthetic pharmacy and return its ``Dataset``. Sales are
+    spread over the last ``days`` days; with the defaults this writes one
+    million sale lines.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    now = timezone.now()
+
+    category_ids = [
+        category.pk for category in
+        Category.objects.bulk_create(Category(name=f"Category {i:03d}") for i in range(categories))
+    ]
+
+    prices = {}
+    for chunk in _chunked(medicines, chunk_size):
+        created = Medicine.objects.bulk_create(
+            Medicine(
+                name=f"{rng.choice(STEMS)}{rng.choice(SUFFIXES)} {rng.choice([50, 100, 250, 500])}mg #{i}",
+                quantity=rng.randint(0, 500),
+                buying_price=Decimal(rng.randint(50, 5000)) / 100,
+                selling_price=Decimal(rng.randint(60, 8000)) / 100,
+                expiry_date=today + timedelta(days=rng.randint(-30, 720)),
+                manufacturer=rng.choice(MANUFACTURERS),
+                category_id=rng.choice(category_ids),
+            )
+            for i in chunk
+        )
+        batches = StockBatch.objects.bulk_create(
+            StockBatch(medicine=medicine, lot_number='SEED', expiry_date=medicine.expiry_date,
+                       quantity=medicine.quantity)
+            for medicine in created if medicine.quantity
+        )
+        StockMovement.objects.bulk_create(
+            StockMovement(medicine=batch.medicine, batch=batch, kind=StockMovement.OPENING, quantity=batch.quantity)
+            for batch in batches
+        )
+        sync.record(medicine.pk for medicine in created)
+        for medicine in created:
+            prices[medicine.pk] = (medicine.name, medicine.selling_price, medicine.buying_price)
+
+    medicine_ids = list(prices)
+    sale_items = 0
+    with _explicit_sale_dates():
+        for chunk in _chunked(sales, max(1, chunk_size // items_per_sale)):
+            baskets = [
+                [(pk, rng.randint(1, 5)) for pk in rng.sample(medicine_ids, min(items_per_sale, len(medicine_ids)))]
+                for _ in chunk
+            ]
+            created = Sale.objects.bulk_create(
+                Sale(
+                    sale_date=now - timedelta(seconds=rng.randint(0, days * 24 * 60 * 60)),
+                    payment_mode=rng.choice(PAYMENT_MODES),
+                    total_amount=sum(prices[pk][1] * quantity for pk, quantity in basket),
+                )
+                for basket in baskets
+            )
+            items = SaleItem.objects.bulk_create(
+                SaleItem(sale=sale, medicine_id=pk, quantity=quantity, price=prices[pk][1], unit_cost=prices[pk][2])
+                for sale, basket in zip(created, baskets) for pk, quantity in basket
+            )
+            Receipt.objects.bulk_create(
+                Receipt(sale=sale, data=snapshot_data(sale, [
+                    (prices[pk][0], quantity, prices[pk][1], prices[pk][2]) for pk, quantity in basket
+                ]))
+                for sale, basket in zip(created, baskets)
+            )
+            sale_items += len(items)
+    rollups.rebuild()
+
+    sample_sale = Sale.objects.order_by('-sale_date', '-pk').first()
+    sample_medicine = Medicine.objects.filter(quantity__gt=20).order_by('pk').first() or Medicine.objects.first()
+    in_stock = Medicine.objects.filter(quantity__gt=20).order_by('pk')
+    basket = [pk for pk in (
+        in_stock.filter(category_id=category_id).values_list('pk', flat=True).first()
+        for category_id in category_ids[:BASKET_LINES]
+    ) if pk]
+    return Dataset(
+        medicines=medicines,
+        sales=sales,
+        sale_items=sale_items,
+        medicine_id=sample_medicine.pk,
+        sale_id=sample_sale.pk if sample_sale else 0,
+        sale_day=timezone.localdate(sample_sale.sale_date).isoformat() if sample_sale else today.isoformat(),
+        query=sample_medicine.name.split()[0][:5],
+        basket=basket,
+    )
+
+
+# -----------------------------
+# CASES
+# -----------------------------
+
+@dataclass
+class Case:
+    """
+    One request to benchmark. ``prepare(client)`` runs untimed before each
+    request and may return the URL to use (e.g. a sale created just for it),
+    or a ``(url, data)`` pair.
+    """
+    name: str
+    url: str = ''
+    budget: int = 0
+    method: str = 'get'
+    data: dict = field(default_factory=dict)
+    prepare: Optional[Callable] = None
+
+
+def _new_sales(data, count):
+    """Ids of ``count`` one-unit sales made just now, for the void cases."""
+    return [checkout([{'medicine_id': data.medicine_id, 'quantity': 1}]).pk for _ in range(count)]
+
+
+def _catalog_changed(data):
+    """A catalog delta after one sale: the till last synced just before it."""
+    def prepare(client):
+        since = sync.current_version()
+        _new_sales(data, 1)
+        return reverse('catalog_sync'), {'since': since}
+    return prepare
+
+
+def _sale_to_void(data):
+    def prepare(client):
+        return reverse('sale_void', args=_new_sales(data, 1))
+    return prepare
+
+
+def _sales_to_void(data, count=10):
+    def prepare(client):
+        return reverse('sales_void'), {'ids': ','.join(map(str, _new_sales(data, count)))}
+    return prepare
+
+
+def _login_again(user):
+    def prepare(client):
+        client.force_login(user)
+    return prepare
+
+
+def _job(user, url_name, finished=None):
+    """Queue a stock export for ``user`` and return ``url_name`` for it; run it first with ``finished``."""
+    def prepare(client):
+        job = jobs.enqueue('export', {'kind': 'stock'}, user=user)
+        if finished == Job.DONE:
+            jobs.claim()
+            jobs.execute(job.pk)
+        elif finished == Job.FAILED:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error="Benchmark")
+        return reverse(url_name, args=[job.pk])
+    return prepare
+
+
+def cases(data, user):
+    """
+    The benchmark cases for a seeded ``Dataset``, one or more per URL.
+    Budgets include the query that loads the user. The session is read from
+    the cache and only saved when it changes or its expiry is stale (see
+    ``inventory.sessions``); in a run that is the first case, medicine_list.
+    """
+    m, s = data.medicine_id, data.sale_id
+    return [
+        Case('home', '/', budget=0),
+        Case('medicine_list', reverse('medicine_list'), budget=10),
+        Case('medicine_list_search', reverse('medicine_list'), budget=5, data={'q': data.query}),
+        Case('medicine_search', reverse('medicine_search'), budget=2, data={'q': data.query}),
+        Case('catalog_sync', reverse('catalog_sync'), budget=4),
+        Case('catalog_sync_delta', budget=4, prepare=_catalog_changed(data)),
+        Case('pos_search', reverse('pos_search'), budget=2, data={'q': data.query}),
+        Case('pos_stock', reverse('pos_stock'), budget=2, data={'ids': f'{m},{m + 1},{m + 2}'}),
+        Case('pos_receipt', reverse('pos_receipt', args=[s]), budget=3),
+        Case('expiry_alerts', reverse('expiry_alerts'), budget=4),
+        Case('medicine_add', reverse('medicine_add'), budget=3),
+        Case('medicine_import', reverse('medicine_import'), budget=1),
+        Case('medicine_edit', reverse('medicine_edit', args=[m]), budget=3),
+        Case('medicine_delete', reverse('medicine_delete', args=[m]), budget=2),
+        Case('medicine_sell', reverse('medicine_sell'), budget=1),
+        Case('medicine_sell_single', reverse('medicine_sell', args=[m]), budget=2),
+        Case('medicine_sell_search', reverse('medicine_sell'), budget=1, data={'q': data.query}),
+        Case('sales_list', reverse('sales_list'), budget=6),
+        Case('sales_list_filtered', reverse('sales_list'), budget=6,
+             data={'from': data.sale_day, 'to': data.sale_day, 'payment_mode': 'Cash'}),
+        Case('sales_api', reverse('sales_api'), budget=3),
+        Case('sale_receipt', reverse('sale_receipt', args=[s]), budget=2),
+        Case('sale_receipt_print', reverse('sale_receipt', args=[s]), budget=3, data={'print': 'true'}),
+        Case('sale_receipts_batch', reverse('sale_receipts_batch'), budget=2, data={'date': data.sale_day}),
+        Case('export_sales', reverse('export_csv', args=['sales']), budget=3,
+             data={'from': data.sale_day, 'to': data.sale_day}),
+        Case('export_stock', reverse('export_csv', args=['stock']), budget=2),
+        Case('export_expiry', reverse('export_csv', args=['expiry']), budget=2),
+        Case('checkout', reverse('medicine_sell'), budget=18, method='post',
+             data={'items': f'[{{"medicine_id": {m}, "quantity": 1}}]', 'payment_mode': 'Cash'}),
+        # Several lines over several categories: checkout must not cost a query per line or category.
+        # The first run creates the day's rollup rows for the payment mode (three queries more).
+        Case('checkout_basket', reverse('medicine_sell'), budget=21, method='post',
+             data={'items': json.dumps([{'medicine_id': pk, 'quantity': 1} for pk in data.basket]),
+                   'payment_mode': 'Mobile'}),
+        Case('analytics_series', reverse('analytics_report', args=['series']), budget=3, data={'by': 'category'}),
+        Case('analytics_top', reverse('analytics_report', args=['top']), budget=4),
+        Case('analytics_slow', reverse('analytics_report', args=['slow']), budget=3),
+        Case('job_list', reverse('job_list'), budget=2),
+        Case('job_start', reverse('job_start', args=['export']), budget=2, method='post', data={'kind': 'sales'}),
+        Case('job_status', budget=2, prepare=_job(user, 'job_status')),
+        Case('job_download', budget=2, prepare=_job(user, 'job_download', finished=Job.DONE)),
+        Case('job_retry', budget=4, method='post', prepare=_job(user, 'job_retry', finished=Job.FAILED)),
+        Case('sale_void', budget=24, method='post', prepare=_sale_to_void(data)),
+        Case('sales_void', budget=23, method='post', prepare=_sales_to_void(data)),
+        Case('request_stats', reverse('request_stats'), budget=1),
+        Case('user_login', reverse('user_login'), budget=0),
+        Case('user_logout', reverse('user_logout'), budget=3, prepare=_login_again(user)),
+    ]
+
+
+def uncovered_url_names(case_list, urlconf='inventory.urls'):
+    """Named inventory URLs that no case requests."""
+    names = {pattern.name for pattern in get_resolver(urlconf).url_patterns if pattern.name}
+    covered = set()
+    for case in case_list:
+        if case.url:
+            covered.add(get_resolver().resolve(case.url).url_name)
+        elif case.name in names:
+            covered.add(case.name)
+    return names - covered
+
+
+# -----------------------------
+# RUNNER
+# -----------------------------
+
+def _request(client, case):
+    prepared = (case.prepare(client) if case.prepare else None) or case.url
+    url, data = prepared if isinstance(prepared, tuple) else (prepared, case.data)
+    with CaptureQueriesContext(connection) as captured:
+        start = perf_counter()
+        response = getattr(client, case.method)(url, data)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+        seconds = perf_counter() - start
+    return response, seconds, len(captured.captured_queries)
+
+
+def measure(client, case, repeat=3):
+    """
+    Time ``case`` ``repeat`` times and trace its peak memory once more.
+    The first request usually fills caches and is reported separately.
+    """
+    timings, queries, status = [], 0, None
+    for _ in range(repeat):
+        response, seconds, count = _request(client, case)
+        timings.append(seconds)
+        queries = max(queries, count)
+        status = response.status_code
+
+    tracemalloc.start()
+    try:
+        _request(client, case)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    warm = timings[1:] or timings
+    return {
+        'status': status,
+        'queries': queries,
+        'budget': case.budget,
+        'first_ms': round(timings[0] * 1000, 2),
+        'median_ms': round(statistics.median(warm) * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run(client, case_list, dataset, repeat=3):
+    """Measure every case in order and return the JSON-serialisable report."""
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': dataset.counts(),
+            'repeat': repeat,
+        },
+        'views': {case.name: measure(client, case, repeat) for case in case_list},
+    }
+
+
+def over_budget(report):
+    """``[(name, queries, budget)]`` for every view that exceeded its query budget."""
+    return [
+        (name, result['queries'], result['budget'])
+        for name, result in report['views'].items()
+        if result['budget'] and result['queries'] > result['budget']
+    ]
+
+
+def compare(baseline, current, tolerance=0.25, min_ms=5.0):
+    """
+    List regressions of ``current`` against ``baseline``: more queries, a
+    different status code, or a median time more than ``tolerance`` slower
+    (ignoring differences under ``min_ms``).
+    """
+    regressions = []
+    for name, now in current['views'].items():
+        before = baseline['views'].get(name)
+        if before is None:
+            continue
+        if now['status'] != before['status']:
+            regressions.append(f"{name}: status {before['status']} -> {now['status']}")
+        if now['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {now['queries']}")
+        slower = now['median_ms'] - before['median_ms']
+        if slower > min_ms and now['median_ms'] > before['median_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: median {before['median_ms']}ms -> {now['median_ms']}ms")
+    return regressions
@@ -0,0 +1,126 @@
+"""
+Versioned cache of catalog snapshots (medicines and categories).
+
+Snapshots are stored under keys that embed the catalog version
+(``inventory.versions``). Any write to a medicine, category or sale line
+bumps the version in its own transaction, so no process reads the stale
+snapshots again once it commits; they simply age out of the cache's LRU.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import versions
+from .dashboard import annotate_stock_values, dashboard_summary, reorder_list
+from .models import Category, Medicine, SaleItem
+
+CACHE_ALIAS = 'catalog'
+VERSION_NAME = 'catalog'
+SNAPSHOT_TIMEOUT = 60 * 60
+
+_MISSING = object()
+_pinned = ContextVar('catalog_version', default=None)
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def current_version():
+    pinned = _pinned.get()
+    return versions.get(VERSION_NAME) if pinned is None else pinned
+
+
+@contextmanager
+def pinned():
+    """Read the catalog version once for every snapshot used in the block, e.g. one page."""
+    token = _pinned.set(current_version())
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def invalidate():
+    """Move the catalog to a new version; the change is visible when the current transaction commits."""
+    versions.bump(VERSION_NAME)
+    with _stats_lock:
+        _stats['invalidations'] += 1
+
+
+def cached(name, build):
+    """Return snapshot ``name`` for the current catalog version, building it on a miss."""
+    cache = get_cache()
+    key = f'catalog:{current_version()}:{name}'
+    value = cache.get(key, _MISSING)
+    hit = value is not _MISSING
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+    if not hit:
+        value = build()
+        cache.set(key, value, SNAPSHOT_TIMEOUT)
+    return value
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = round(result['hits'] / lookups, 3) if lookups else None
+    result['version'] = current_version()
+    return result
+
+
+# -----------------------------
+# SNAPSHOTS
+# -----------------------------
+
+MEDICINE_FIELDS = (
+    'id', 'name', 'quantity', 'buying_price', 'selling_price', 'expiry_date', 'manufacturer', 'category_id',
+)
+
+
+def categories():
+    """``[(id, name), ...]`` ordered by name."""
+    return cached('categories', lambda: list(Category.objects.order_by('name').values_list('id', 'name')))
+
+
+def category_tables():
+    """Per-category medicine rows for the medicine_list page."""
+    def build():
+        medicines = annotate_stock_values(Medicine.objects.order_by('name')).values(
+            *MEDICINE_FIELDS, 'total_value', 'profit_per_unit_value', 'is_low_stock',
+        )
+        by_category = {}
+        for medicine in medicines:
+            by_category.setdefault(medicine['category_id'], []).append(medicine)
+        return [
+            {'id': pk, 'name': name, 'medicines': by_category.get(pk, [])}
+            for pk, name in Category.objects.values_list('id', 'name').order_by('pk')
+        ]
+    return cached('category_tables', build)
+
+
+def summary():
+    """Dashboard KPIs for the whole catalog. Expiry counts depend on the date."""
+    today = timezone.localdate()
+    return cached(f'summary:{today}', lambda: dashboard_summary(Medicine.objects.all(), today=today))
+
+
+def reorders():
+    """Medicines at or below their forecast reorder point, for the dashboard."""
+    return cached('reorders', reorder_list)
+
+
+@receiver([post_save, post_delete], sender=Medicine)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SaleItem)
+def catalog_changed(sender, **kwargs):
+    invalidate()
@@ -0,0 +1,118 @@
+from django.utils import timezone
+
+from . import ledger, receipts, rollups
+from .db import write_transaction
+from .models import Medicine, Sale, SaleItem, StockMovement
+
+
+class CheckoutError(Exception):
+    """Raised when a basket cannot be sold. Nothing is written to the database."""
+
+
+def merge_lines(lines):
+    """
+    Collapse basket lines into ``{medicine_id: quantity}``.
+
+    Each line is a mapping with ``medicine_id`` and ``quantity`` keys, as posted
+    by the sell page. Repeated medicines are summed so each row is locked and
+    decremented once.
+    """
+    if not isinstance(lines, (list, tuple)):
+        raise CheckoutError("Invalid basket.")
+    quantities = {}
+    for line in lines:
+        if not isinstance(line, dict):
+            raise CheckoutError("Invalid basket line.")
+        try:
+            medicine_id = int(line['medicine_id'])
+            quantity = int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError("Invalid basket line.")
+        if quantity <= 0:
+            raise CheckoutError("Quantities must be greater than zero.")
+        quantities[medicine_id] = quantities.get(medicine_id, 0) + quantity
+    if not quantities:
+        raise CheckoutError("No medicines selected for sale.")
+    return quantities
+
+
+@write_transaction()
+def checkout(lines, payment_mode='Cash'):
+    """
+    Sell a basket in one transaction and return the new ``Sale``.
+
+    All requested medicines are locked and fetched in a single query, the sale
+    lines and their SALE ledger movements are inserted with ``bulk_create`` and
+    stock is decremented with a single guarded ``UPDATE`` (``quantity >=
+    requested``). Units are taken first-expiry-first-out from the medicines'
+    batches, which are likewise locked in one query and updated in one
+    guarded ``UPDATE``. If another till sold the stock in the meantime the guard
+    matches fewer rows and the whole sale is rolled back, so stock can never go
+    negative. The receipt snapshot and the day's sales rollup are written in the
+    same transaction, which takes the database write lock up front (see
+    ``inventory.db``).
+    """
+    if payment_mode not in dict(Sale.PAYMENT_CHOICES):
+        raise CheckoutError("Invalid payment mode.")
+
+    quantities = merge_lines(lines)
+    medicines = Medicine.objects.select_for_update().in_bulk(list(quantities))
+
+    total_amount = 0
+    for medicine_id, quantity in quantities.items():
+        medicine = medicines.get(medicine_id)
+        if medicine is None:
+            raise CheckoutError("Selected medicine no longer exists.")
+        if quantity > medicine.quantity:
+            raise CheckoutError(f"Invalid quantity for {medicine.name}")
+        total_amount += medicine.selling_price * quantity
+
+    sale = Sale.objects.create(payment_mode=payment_mode, total_amount=total_amount)
+    SaleItem.objects.bulk_create([
+        SaleItem(
+            sale=sale,
+            medicine=medicines[medicine_id],
+            quantity=quantity,
+            price=medicines[medicine_id].selling_price,
+            unit_cost=medicines[medicine_id].buying_price,
+        )
+        for medicine_id, quantity in quantities.items()
+    ])
+    receipts.freeze(sale, [
+        (medicines[pk].name, quantity, medicines[pk].selling_price, medicines[pk].buying_price)
+        for pk, quantity in quantities.items()
+    ])
+    rollups.add_sale(sale, lines=[
+        (medicine.category_id, medicine.selling_price, medicine.buying_price, quantities[pk])
+        for pk, medicine in medicines.items()
+    ])
+
+    try:
+        ledger.record(ledger.take_movements(quantities, StockMovement.SALE, sale=sale))
+    except ledger.InsufficientStock:
+        raise CheckoutError("Stock changed while checking out. Please try again.")
+    return sale
+
+
+@write_transaction()
+def void_sales(sale_ids, note=''):
+    """
+    Void one or many sales in one transaction and return the ones voided.
+
+    The sales are kept, stamped with ``voided_at``: their units go back to
+    the medicines and batches they came from as VOID ledger movements (one
+    grouped read, one UPDATE per table) and their lines are subtracted from
+    the daily rollup. Their receipts are stamped as voided. Sales already
+    voided are skipped, so voiding twice never returns stock twice.
+    """
+    sales = list(Sale.objects.select_for_update().filter(pk__in=list(sale_ids), voided_at__isnull=True).order_by('pk'))
+    if not sales:
+        return []
+    ledger.void_sales(sales, note=note)
+    rollups.remove_sales(sales)
+    voided_at = timezone.now()
+    Sale.objects.filter(pk__in=[sale.pk for sale in sales]).update(voided_at=voided_at)
+    for sale in sales:
+        sale.voided_at = voided_at
+    receipts.mark_voided(sales)
+    return sales
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import BooleanField, Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from .models import Medicine
+
+LOW_STOCK_THRESHOLD = 10
+EXPIRY_WINDOW_DAYS = 30
+REORDER_LIMIT = 50
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+CENTS = Decimal('0.01')
+
+
+def low_stock_condition():
+    """
+    At or below the medicine's forecast reorder point; medicines not yet
+    forecast (see ``inventory.forecasting``) fall back to the fixed threshold.
+    """
+    return (
+        Q(forecast__isnull=False, quantity__lte=F('forecast__reorder_point'))
+        | Q(forecast__isnull=True, quantity__lt=LOW_STOCK_THRESHOLD)
+    )
+
+
+def stock_value_expression():
+    return ExpressionWrapper(F('quantity') * F('buying_price'), output_field=MONEY)
+
+
+def annotate_stock_values(queryset):
+    """Annotate each medicine with its stock value, per-unit profit and low-stock flag in SQL."""
+    return queryset.annotate(
+        total_value=stock_value_expression(),
+        profit_per_unit_value=ExpressionWrapper(F('selling_price') - F('buying_price'), output_field=MONEY),
+        is_low_stock=ExpressionWrapper(low_stock_condition(), output_field=BooleanField()),
+    )
+
+
+def dashboard_summary(queryset, today=None):
+    """
+    Return the medicine_list KPIs for ``queryset`` from a single aggregate query.
+    """
+    today = today or timezone.now().date()
+    expiry_cutoff = today + timedelta(days=EXPIRY_WINDOW_DAYS)
+
+    summary = queryset.aggregate(
+        medicine_count=Count('id'),
+        total_quantity=Sum('quantity', default=0),
+        total_stock_value=Sum(stock_value_expression(), output_field=MONEY, default=Decimal('0')),
+        low_stock_count=Count('id', filter=low_stock_condition()),
+        soon_to_expire_count=Count('id', filter=Q(expiry_date__lte=expiry_cutoff)),
+    )
+    # SQLite hands SUM() back unscaled; keep the two-decimal money format.
+    summary['total_stock_value'] = summary['total_stock_value'].quantize(CENTS)
+    summary['normal_stock_count'] = summary['medicine_count'] - summary['low_stock_count']
+    summary['today_plus_30'] = expiry_cutoff
+    return summary
+
+
+def reorder_list(limit=REORDER_LIMIT):
+    """
+    Medicines at or below their reorder point with something to order, the
+    least days of cover first. Medicines with no recent sales have a reorder
+    point of 0 and are left out even when out of stock.
+    """
+    return list(
+        Medicine.objects.filter(quantity__lte=F('forecast__reorder_point'), forecast__reorder_quantity__gt=0)
+        .order_by(F('forecast__days_of_cover').asc(nulls_last=True), 'name')
+        .values('id', 'name', 'quantity', 'forecast__reorder_point', 'forecast__reorder_quantity',
+                'forecast__smoothed', 'forecast__days_of_cover')[:limit]
+    )
@@ -0,0 +1,78 @@
+"""
+Write transactions for the sales hot path.
+
+``write_transaction()`` is ``transaction.atomic()`` plus two things that
+matter when several tills write to one SQLite file:
+
+* on the SQLite backend in ``pharmacy.db_backends.sqlite3`` the outermost
+  block starts with ``BEGIN IMMEDIATE``, so the write lock is taken (or
+  waited for, up to ``busy_timeout``) before the first read instead of
+  failing on the first write, and
+* with ``SQLITE_WRITE_QUEUE = True`` writers of this process queue up and
+  commit one at a time in arrival order, so they never contend for the
+  SQLite lock among themselves.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+
+class WriteQueue:
+    """First-come, first-served lock; re-entrant within a thread."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def turn(self):
+        depth = getattr(self._local, 'depth', 0)
+        if not depth:
+            with self._condition:
+                ticket = self._next_ticket
+                self._next_ticket += 1
+                self._condition.wait_for(lambda: self._serving == ticket)
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if not depth:
+                with self._condition:
+                    self._serving += 1
+                    self._condition.notify_all()
+
+
+write_queue = WriteQueue()
+
+
+@contextmanager
+def _queued(enabled):
+    if enabled:
+        with write_queue.turn():
+            yield
+    else:
+        yield
+
+
+@contextmanager
+def write_transaction(using=None):
+    """``atomic()`` for sale commits: immediate write lock, optionally queued in process."""
+    connection = transaction.get_connection(using)
+    outermost = not connection.in_atomic_block
+    with _queued(outermost and getattr(settings, 'SQLITE_WRITE_QUEUE', False)):
+        immediate = outermost and hasattr(connection, 'begin_immediate')
+        if immediate:
+            connection.begin_immediate = True
+        try:
+            with transaction.atomic(using=using):
+                if immediate:
+                    connection.begin_immediate = False
+                yield
+        finally:
+            if immediate:
+                connection.begin_immediate = False
@@ -0,0 +1,139 @@
+"""
+Streaming CSV exports of sales lines, stock valuation and expiring batches.
+
+Each export reads its rows with ``QuerySet.iterator(chunk_size=...)`` and
+writes them straight to the response, so a multi-year export runs in
+constant memory. The sales export reads archived months first (see
+``inventory.archive``), then the live tables.
+"""
+import csv
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import archive, batches
+from .models import Medicine, SaleItem, StockBatch
+
+CHUNK_SIZE = 2000
+EXPIRY_DAYS = 90
+
+
+class Echo:
+    """File-like object whose ``write`` returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def sales_items(start=None, end=None):
+    items = SaleItem.objects.filter(sale__voided_at__isnull=True).order_by('sale__sale_date', 'pk')
+    if start:
+        items = items.filter(sale__sale_date__gte=_day_start(start))
+    if end:
+        items = items.filter(sale__sale_date__lt=_day_start(end + timedelta(days=1)))
+    return items
+
+
+def sales_rows(start=None, end=None, chunk_size=CHUNK_SIZE):
+    # values_list() joins sale and medicine in the same query.
+    rows = sales_items(start, end).values_list(
+        'sale_id', 'sale__sale_date', 'sale__payment_mode', 'medicine_id', 'medicine__name',
+        'quantity', 'price', Coalesce('unit_cost', F('medicine__buying_price')),
+    )
+    archived = archive.sales_rows(start, end)
+    for sale_id, sale_date, payment_mode, medicine_id, name, quantity, price, unit_cost in chain(
+        archived, rows.iterator(chunk_size),
+    ):
+        yield [
+            sale_id, timezone.localtime(sale_date).strftime('%Y-%m-%d %H:%M:%S'), payment_mode, medicine_id, name,
+            quantity, f"{price:.2f}", f"{unit_cost:.2f}", f"{price * quantity:.2f}",
+            f"{(price - unit_cost) * quantity:.2f}",
+        ]
+
+
+def stock_medicines():
+    return Medicine.objects.order_by('name', 'pk')
+
+
+def stock_rows(chunk_size=CHUNK_SIZE):
+    rows = stock_medicines().values_list(
+        'id', 'name', 'category__name', 'manufacturer', 'quantity', 'buying_price', 'selling_price', 'expiry_date',
+    )
+    for pk, name, category, manufacturer, quantity, buying, selling, expiry in rows.iterator(chunk_size):
+        yield [
+            pk, name, category or '', manufacturer, quantity, f"{buying:.2f}", f"{selling:.2f}",
+            f"{buying * quantity:.2f}", f"{selling * quantity:.2f}", expiry.isoformat(),
+        ]
+
+
+def expiring_batches(days=EXPIRY_DAYS):
+    today = timezone.localdate()
+    days = min(days, batches.MAX_ALERT_DAYS)  # a larger window overflows the date
+    return (
+        StockBatch.objects.filter(quantity__gt=0, expiry_date__lte=today + timedelta(days=days))
+        .order_by('expiry_date', 'medicine__name', 'pk')
+    )
+
+
+def expiry_rows(days=EXPIRY_DAYS, chunk_size=CHUNK_SIZE):
+    today = timezone.localdate()
+    rows = (
+        expiring_batches(days)
+        .values_list('medicine_id', 'medicine__name', 'medicine__manufacturer', 'lot_number', 'quantity',
+                     'medicine__buying_price', 'expiry_date')
+    )
+    for pk, name, manufacturer, lot_number, quantity, buying, expiry in rows.iterator(chunk_size):
+        yield [
+            pk, name, manufacturer, lot_number, quantity, expiry.isoformat(), (expiry - today).days,
+            f"{buying * quantity:.2f}",
+        ]
+
+
+EXPORTS = {
+    'sales': (
+        ['sale_id', 'sale_date', 'payment_mode', 'medicine_id', 'medicine', 'quantity', 'price', 'unit_cost',
+         'subtotal', 'profit'],
+        sales_rows,
+        sales_items,
+    ),
+    'stock': (
+        ['medicine_id', 'medicine', 'category', 'manufacturer', 'quantity', 'buying_price', 'selling_price',
+         'stock_value', 'retail_value', 'expiry_date'],
+        stock_rows,
+        stock_medicines,
+    ),
+    'expiry': (
+        ['medicine_id', 'medicine', 'manufacturer', 'lot_number', 'quantity', 'expiry_date', 'days_left',
+         'stock_value'],
+        expiry_rows,
+        expiring_batches,
+    ),
+}
+
+
+def export_lines(kind, **options):
+    """Yield the CSV lines of export ``kind`` ('sales', 'stock' or 'expiry')."""
+    header, rows, _ = EXPORTS[kind]
+    return csv_lines(header, rows(**options))
+
+
+def export_size(kind, **options):
+    """Number of data rows export ``kind`` will write, for progress reporting."""
+    size = EXPORTS[kind][2](**options).count()
+    if kind == 'sales':
+        size += archive.line_count(options.get('start'), options.get('end'))
+    return size
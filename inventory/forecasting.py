@@ -0,0 +1,124 @@
+"""
+Demand forecasts and reorder points for the whole catalog, with NumPy.
+
+``run()`` reads the daily units sold per medicine over the last
+``HISTORY_DAYS`` days in one grouped query and scatters them into a
+``medicines x days`` matrix. Every statistic is then a whole-matrix
+operation, one row per medicine:
+
+* ``moving_average``: mean daily units over the last ``MOVING_AVERAGE_DAYS``,
+* ``smoothed``: simple exponential smoothing with ``alpha``, as the matrix
+  product with the weights ``alpha * (1 - alpha) ** age``, and
+* ``deviation``: standard deviation of daily units over the same window.
+
+The forecast demand is ``smoothed``. The reorder point covers the lead
+time plus safety stock, ``demand * lead + Z * deviation * sqrt(lead)``, and
+the suggested order tops stock up to the reorder point plus
+``ORDER_COVER_DAYS`` of demand. Results replace the ``DemandForecast``
+rows; the dashboard compares live stock against the stored reorder points.
+
+NumPy is only needed to run the forecast, not to read the stored results.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import catalog
+from .db import write_transaction
+from .models import DemandForecast, Medicine, SaleItem
+
+HISTORY_DAYS = 90
+MOVING_AVERAGE_DAYS = 28
+ALPHA = 0.3
+LEAD_TIME_DAYS = 7
+ORDER_COVER_DAYS = 30
+SERVICE_Z = 1.65  # ~95% of lead-time demand covered
+
+
+def daily_units(medicine_ids, start, days):
+    """``len(medicine_ids) x days`` matrix of units sold per medicine and day from ``start``."""
+    since = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+    rows = list(
+        SaleItem.objects.filter(sale__sale_date__gte=since, sale__sale_date__lt=since + timedelta(days=days),
+                                sale__voided_at__isnull=True)
+        .annotate(day=TruncDate('sale__sale_date'))
+        .values_list('medicine_id', 'day')
+        .annotate(units=Sum('quantity'))
+        .order_by()
+    )
+    matrix = np.zeros((len(medicine_ids), days))
+    if rows:
+        ids, sale_days, units = zip(*rows)
+        row = np.searchsorted(medicine_ids, np.asarray(ids, dtype=np.int64))
+        column = (np.asarray(sale_days, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+        np.add.at(matrix, (row, column), np.asarray(units, dtype=float))
+    return matrix
+
+
+def forecast(matrix, stock, alpha=ALPHA, lead_time=LEAD_TIME_DAYS, window=MOVING_AVERAGE_DAYS):
+    """Vectorized forecast for every row of ``matrix``; ``stock`` holds current quantities."""
+    recent = matrix[:, -window:]
+    moving_average = recent.mean(axis=1)
+    deviation = recent.std(axis=1)
+
+    # s_t = alpha * x_t + (1 - alpha) * s_(t-1), seeded with the first day, unrolled into weights.
+    days = matrix.shape[1]
+    age = np.arange(days - 1, -1, -1)
+    weights = alpha * (1 - alpha) ** age
+    weights[0] = (1 - alpha) ** (days - 1)
+    smoothed = matrix @ weights
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(smoothed > 0, stock / smoothed, np.nan)
+    reorder_point = np.ceil(smoothed * lead_time + SERVICE_Z * deviation * np.sqrt(lead_time))
+    target = reorder_point + np.ceil(smoothed * ORDER_COVER_DAYS)
+    reorder_quantity = np.maximum(target - stock, 0)
+    return {
+        'moving_average': moving_average,
+        'smoothed': smoothed,
+        'deviation': deviation,
+        'days_of_cover': days_of_cover,
+        'reorder_point': reorder_point.astype(np.int64),
+        'reorder_quantity': reorder_quantity.astype(np.int64),
+    }
+
+
+def run(days=HISTORY_DAYS, alpha=ALPHA, lead_time=LEAD_TIME_DAYS, today=None, progress=None):
+    """
+    Forecast every medicine and replace the stored forecasts. Returns the
+    number written. ``progress(done, total, message)`` hears of each phase.
+    """
+    progress = progress or (lambda done, total, message: None)
+    today = today or timezone.localdate()
+    progress(0, 3, "Reading sales")
+    medicines = np.array(list(Medicine.objects.order_by('pk').values_list('pk', 'quantity')), dtype=np.int64)
+    ids, stock = medicines.reshape(-1, 2).T
+    matrix = daily_units(ids, today - timedelta(days=days), days)
+    progress(1, 3, "Forecasting")
+    result = forecast(matrix, stock.astype(float), alpha=alpha, lead_time=lead_time, window=min(MOVING_AVERAGE_DAYS, days))
+    progress(2, 3, "Saving forecasts")
+
+    now = timezone.now()
+    cover = result['days_of_cover']
+    with write_transaction():
+        DemandForecast.objects.all().delete()
+        DemandForecast.objects.bulk_create(
+            (
+                DemandForecast(
+                    medicine_id=pk, moving_average=ma, smoothed=smoothed, deviation=deviation,
+                    days_of_cover=None if np.isnan(days_of_cover) else days_of_cover,
+                    reorder_point=point, reorder_quantity=quantity, computed_at=now,
+                )
+                for pk, ma, smoothed, deviation, days_of_cover, point, quantity in zip(
+                    ids.tolist(), result['moving_average'].tolist(), result['smoothed'].tolist(),
+                    result['deviation'].tolist(), cover.tolist(),
+                    result['reorder_point'].tolist(), result['reorder_quantity'].tolist(),
+                )
+            ),
+            batch_size=1000,
+        )
+        catalog.invalidate()
+    return len(ids)
@@ -2,6 +2,12 @@ from django import forms
 from .models import Medicine
 
 class MedicineForm(forms.ModelForm):
+    lot_number = forms.CharField(
+        max_length=50, required=False,
+        help_text="Lot of the units being added; they keep the expiry date above.",
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+
     class Meta:
         model = Medicine
         fields = ['category', 'name', 'quantity', 'buying_price', 'selling_price', 'expiry_date', 'manufacturer']
@@ -14,3 +20,48 @@ class MedicineForm(forms.ModelForm):
             'expiry_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'manufacturer': forms.TextInput(attrs={'class': 'form-control'}),
         }
+
+    def __init__(self, *args, category_choices=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Render the category select from a cached snapshot instead of a query.
+        if category_choices is not None:
+            self.fields['category'].widget.choices = [('', self.fields['category'].empty_label)] + list(category_choices)
+
+
+class MedicineEditForm(MedicineForm):
+    # The stock shown when the form was rendered; the edit applies the change
+    # from it, so sales made while the form was open are kept.
+    seen_quantity = forms.IntegerField(required=False, min_value=0, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['seen_quantity'].initial = self.instance.quantity
+
+
+class MedicineImportForm(forms.Form):
+    QUANTITY_MODE_CHOICES = [
+        ('add', 'Add quantities to current stock (delivery)'),
+        ('set', 'Replace current stock (stock count)'),
+    ]
+
+    file = forms.FileField(
+        help_text="CSV or JSON with name, manufacturer, quantity, buying_price, selling_price, expiry_date, "
+                  "category and lot_number.",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.json,.jsonl'}),
+    )
+    quantity_mode = forms.ChoiceField(
+        choices=QUANTITY_MODE_CHOICES, initial='add', widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    dry_run = forms.BooleanField(
+        required=False, label="Only validate (dry run)", widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        extension = upload.name.rsplit('.', 1)[-1].lower()
+        if extension in ('jsonl', 'ndjson'):
+            extension = 'json'
+        if extension not in ('csv', 'json'):
+            raise forms.ValidationError("Upload a .csv or .json file.")
+        self.file_format = extension
+        return upload
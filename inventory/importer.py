@@ -0,0 +1,245 @@
+"""
+Streaming bulk import of medicines from CSV or JSON.
+
+Rows are read lazily, validated with the ``MedicineForm`` field rules and
+upserted in chunks: one query to find the existing medicines of a chunk, one
+``bulk_create`` and one ``bulk_update``, plus the stock ledger movements.
+Memory stays bounded by the chunk size whatever the file length.
+
+Columns: name, manufacturer, quantity, buying_price, selling_price,
+expiry_date (YYYY-MM-DD) and optional category and lot_number. A medicine is
+identified by its name and manufacturer; an existing one keeps its category
+when the row gives none. Added units are received as a new
+batch with the row's expiry date and lot number; removed units (stock counts
+in "set" mode) are written off first-expiry-first-out.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django import forms
+
+from . import catalog, ledger, sync
+from .db import write_transaction
+from .forms import MedicineForm
+from .models import Category, Medicine, StockBatch, StockMovement
+
+CHUNK_SIZE = 1000
+ADD = 'add'
+SET = 'set'
+QUANTITY_MODES = (ADD, SET)
+FORMATS = ('csv', 'json')
+
+RowForm = forms.modelform_factory(
+    Medicine, form=MedicineForm, fields=[name for name in MedicineForm.Meta.fields if name != 'category'],
+)
+UPDATED_FIELDS = ['buying_price', 'selling_price', 'category']
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be parsed at all (as opposed to a bad row)."""
+
+
+@dataclass
+class ImportReport:
+    valid: int = 0
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+    categories_created: int = 0
+
+    def add_error(self, row, errors):
+        self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'valid': self.valid,
+            'created': self.created,
+            'updated': self.updated,
+            'categories_created': self.categories_created,
+            'errors': self.errors,
+        }
+
+
+# -----------------------------
+# READERS
+# -----------------------------
+
+def iter_csv(stream):
+    try:
+        yield from csv.DictReader(stream)
+    except csv.Error as e:
+        raise ImportFormatError(f"Invalid CSV: {e}")
+
+
+def iter_json(stream, read_size=1 << 16):
+    """
+    Yield the objects of a JSON array (or of newline-delimited JSON) while
+    reading ``stream`` in ``read_size`` pieces.
+    """
+    decoder = json.JSONDecoder()
+    buffer, eof = '', False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,[')
+        if buffer.startswith(']'):
+            return
+        try:
+            if not buffer:
+                raise json.JSONDecodeError('empty buffer', buffer, 0)
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            if eof:
+                if not buffer:
+                    return
+                raise ImportFormatError(f"Invalid JSON: {e.msg}")
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield record
+
+
+def iter_records(fileobj, fmt):
+    """Decode a binary file object and yield one dict per row."""
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unsupported format '{fmt}'.")
+    stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    return _decoded(iter_csv(stream) if fmt == 'csv' else iter_json(stream))
+
+
+def _decoded(records):
+    # The file is decoded lazily, so a bad byte surfaces while rows are read.
+    try:
+        yield from records
+    except UnicodeDecodeError:
+        raise ImportFormatError("The file is not UTF-8 encoded text.")
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# -----------------------------
+# IMPORT
+# -----------------------------
+
+class Importer:
+    def __init__(self, quantity_mode=ADD, create_categories=True, dry_run=False):
+        if quantity_mode not in QUANTITY_MODES:
+            raise ValueError(f"quantity_mode must be one of {QUANTITY_MODES}")
+        self.quantity_mode = quantity_mode
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        self.report = ImportReport()
+        self.categories = {name.casefold(): pk for pk, name in Category.objects.values_list('id', 'name')}
+
+    def run(self, records, chunk_size=CHUNK_SIZE):
+        for chunk in _chunks(enumerate(records, start=1), chunk_size):
+            valid = [row for row in (self.validate(number, record) for number, record in chunk) if row]
+            self.report.valid += len(valid)
+            if not valid or self.dry_run:
+                continue
+            try:
+                self.save_chunk(valid)
+            except ledger.InsufficientStock as e:
+                for number, _ in chunk:
+                    self.report.add_error(number, {'quantity': [f"Chunk not imported: {e}"]})
+        return self.report
+
+    def validate(self, number, record):
+        if not isinstance(record, dict):
+            self.report.add_error(number, {'__all__': ["Row is not an object."]})
+            return None
+        form = RowForm(data={key: record.get(key) for key in RowForm.base_fields})
+        if not form.is_valid():
+            self.report.add_error(number, {name: list(errors) for name, errors in form.errors.items()})
+            return None
+        category = (record.get('category') or '').strip() or None
+        if category and category.casefold() not in self.categories and not self.create_categories:
+            self.report.add_error(number, {'category': [f"Unknown category '{category}'."]})
+            return None
+        return form.cleaned_data, category
+
+    def create_categories_of(self, rows):
+        """Create the categories named by ``rows`` that do not exist yet; returns ``{casefolded name: id}``."""
+        new = {}
+        for _, name in rows:
+            if name and name.casefold() not in self.categories and name.casefold() not in new:
+                new[name.casefold()] = Category.objects.get_or_create(name=name)[0].pk
+        return new
+
+    def save_chunk(self, rows):
+        # The categories are created in the chunk's transaction and only remembered once it commits.
+        with write_transaction():
+            new_categories = self.create_categories_of(rows)
+            created, updated = self.save_medicines(rows, {**self.categories, **new_categories})
+        self.categories.update(new_categories)
+        self.report.categories_created += len(new_categories)
+        self.report.created += created
+        self.report.updated += updated
+
+    def save_medicines(self, rows, categories):
+        # Later rows for the same medicine win, except that quantities add up.
+        merged = {}
+        for data, category in rows:
+            key = (data['name'], data['manufacturer'])
+            if key in merged and self.quantity_mode == ADD:
+                data = {**data, 'quantity': merged[key][0]['quantity'] + data['quantity']}
+            merged[key] = (data, categories[category.casefold()] if category else None)
+
+        existing = {
+            (medicine.name, medicine.manufacturer): medicine
+            for medicine in Medicine.objects.select_for_update().filter(name__in={name for name, _ in merged})
+        }
+        created, updated, received, removed = [], [], [], {}
+        for key, (data, category_id) in merged.items():
+            lot_number = data.pop('lot_number')
+            medicine = existing.get(key)
+            if medicine is None:
+                created.append((Medicine(**data, category_id=category_id), lot_number))
+                continue
+            delta = data['quantity'] if self.quantity_mode == ADD else data['quantity'] - medicine.quantity
+            medicine.buying_price = data['buying_price']
+            medicine.selling_price = data['selling_price']
+            if category_id is not None:  # a row without a category leaves it as it is
+                medicine.category_id = category_id
+            updated.append(medicine)
+            if delta > 0:
+                received.append((
+                    StockBatch(medicine=medicine, lot_number=lot_number, expiry_date=data['expiry_date'], quantity=0),
+                    delta,
+                ))
+            elif delta < 0:
+                removed[medicine.pk] = -delta
+
+        Medicine.objects.bulk_create([medicine for medicine, _ in created])
+        Medicine.objects.bulk_update(updated, UPDATED_FIELDS)
+        opening = StockBatch.objects.bulk_create(
+            StockBatch(medicine=medicine, lot_number=lot_number, expiry_date=medicine.expiry_date,
+                       quantity=medicine.quantity)
+            for medicine, lot_number in created if medicine.quantity
+        )
+        ledger.record(
+            [StockMovement(medicine=batch.medicine, batch=batch, kind=StockMovement.OPENING, quantity=batch.quantity,
+                           note="Bulk import") for batch in opening],
+            apply_balance=False,
+        )
+        StockBatch.objects.bulk_create([batch for batch, _ in received])
+        ledger.record(
+            [StockMovement(medicine=batch.medicine, batch=batch, kind=StockMovement.RESTOCK, quantity=delta,
+                           note="Bulk import") for batch, delta in received]
+            + ledger.take_movements(removed, StockMovement.ADJUSTMENT, note="Bulk import")
+        )
+        sync.record([medicine.pk for medicine, _ in created] + [medicine.pk for medicine in updated])
+        catalog.invalidate()
+        return len(created), len(updated)
+
+
+def import_file(fileobj, fmt, chunk_size=CHUNK_SIZE, **options):
+    """Import a binary file object; returns an ``ImportReport``."""
+    return Importer(**options).run(iter_records(fileobj, fmt), chunk_size=chunk_size)
@@ -0,0 +1,328 @@
+"""
+Background jobs without a broker.
+
+Heavy work - exports of the whole sales history, stock recounts, rollup
+and forecast rebuilds - would otherwise run inside a web request and can
+hit the worker timeout. Instead a view ``enqueue()``s a ``Job`` row and the
+``run_jobs`` management command runs it in a process pool, at most
+``JOB_WORKERS`` at a time, while the web workers stay free for the tills.
+
+* A worker takes a job with ``claim()``: a conditional ``UPDATE`` from
+  ``queued`` to ``running``, so several workers can share the table.
+* Handlers report ``progress(done, total, message)``; it is written to the
+  row at most every ``PROGRESS_INTERVAL`` seconds and doubles as the job's
+  heartbeat.
+* A handler that produces a file writes it to ``out``; the file appears
+  under ``JOB_RESULTS_DIR`` only once the job succeeded.
+* A failed job is queued again with exponential backoff until it has run
+  ``max_attempts`` times; ``retry()`` queues a failed job once more.
+  ``requeue_stale()`` recovers running jobs whose worker died; ``run_jobs``
+  calls it at startup and every minute, so another worker picks them up.
+"""
+import logging
+import os
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import batches, exports, ledger, rollups
+from .db import write_transaction
+from .models import Job
+
+PROGRESS_INTERVAL = 1.0  # seconds
+RETRY_BACKOFF = 30  # seconds before the first retry, doubled for each later one
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """A job that cannot succeed as requested (unknown kind, bad parameters); it is not retried."""
+
+
+@dataclass(frozen=True)
+class JobKind:
+    name: str
+    handler: Callable
+    clean: Callable = dict
+    filename: str = ''  # download name, formatted with the params; '' when the job writes no file
+    content_type: str = 'text/csv'
+
+    def download_name(self, params):
+        return self.filename.format(**params)
+
+
+REGISTRY = {}
+
+
+def register(name, clean=dict, filename='', content_type='text/csv'):
+    """
+    Register ``handler(params, progress, out)`` as job kind ``name``. It
+    returns a short summary for the job's message. ``clean(params)``
+    validates the parameters when the job is queued and raises ``JobError``.
+    """
+    def decorator(handler):
+        REGISTRY[name] = JobKind(name, handler, clean, filename, content_type)
+        return handler
+    return decorator
+
+
+def results_dir():
+    return Path(settings.JOB_RESULTS_DIR)
+
+
+def result_path(job):
+    return results_dir() / job.result
+
+
+# -----------------------------
+# QUEUE
+# -----------------------------
+
+def enqueue(kind, params=None, user=None):
+    """Validate ``params`` for job ``kind`` and queue it. Returns the ``Job``."""
+    if kind not in REGISTRY:
+        raise JobError(f"Unknown job kind {kind!r}.")
+    params = REGISTRY[kind].clean(dict(params or {}))
+    return Job.objects.create(kind=kind, params=params, created_by=user, max_attempts=settings.JOB_MAX_ATTEMPTS)
+
+
+def claim(now=None):
+    """Mark the oldest due job running and return its id, or None when nothing is due."""
+    now = now or timezone.now()
+    with write_transaction():
+        job_id = (
+            Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'pk').values_list('pk', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, progress=0, message='', error='',
+            started_at=now, heartbeat_at=now, finished_at=None,
+        )
+    return job_id if claimed else None
+
+
+def retry(job):
+    """Queue a failed job again with a fresh set of attempts. Returns False if it had not failed."""
+    return bool(Job.objects.filter(pk=job.pk, status=Job.FAILED).update(
+        status=Job.QUEUED, attempts=0, progress=0, message='', error='', run_after=timezone.now(),
+        finished_at=None,
+    ))
+
+
+def requeue_stale(now=None):
+    """
+    Queue again the running jobs that sent no heartbeat for
+    ``JOB_STALE_AFTER`` seconds (their worker was killed), or fail those
+    out of attempts. Returns the number of jobs recovered.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER))
+    with write_transaction():
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, error="The worker stopped while running this job.", finished_at=now,
+        )
+        requeued = stale.update(status=Job.QUEUED, run_after=now)
+    return failed + requeued
+
+
+def purge(days=None, now=None):
+    """Delete finished jobs older than ``days`` (``JOB_KEEP_DAYS``) and their result files."""
+    now = now or timezone.now()
+    old = Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED],
+        finished_at__lt=now - timedelta(days=settings.JOB_KEEP_DAYS if days is None else days),
+    )
+    for result in old.exclude(result='').values_list('result', flat=True):
+        (results_dir() / result).unlink(missing_ok=True)
+    return old.delete()[0]
+
+
+# -----------------------------
+# RUNNING
+# -----------------------------
+
+class Progress:
+    """``progress(done, total, message)`` for a handler; throttled to one write per ``interval``."""
+
+    def __init__(self, job_id, interval=PROGRESS_INTERVAL):
+        self.job_id = job_id
+        self.interval = interval
+        self._written = time.monotonic()
+
+    def __call__(self, done, total=None, message=''):
+        now = time.monotonic()
+        if now - self._written < self.interval:
+            return
+        self._written = now
+        percent = min(99, done * 100 // total) if total else 0
+        Job.objects.filter(pk=self.job_id).update(
+            progress=percent, message=message[:200], heartbeat_at=timezone.now(),
+        )
+
+
+def execute(job_id):
+    """Run a claimed job in this process and record how it ended. Returns the final status."""
+    job = Job.objects.get(pk=job_id)
+    try:
+        message, result = _run(job)
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        return _fail(job, exc)
+    now = timezone.now()
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, progress=100, message=(message or '')[:200], result=result,
+        heartbeat_at=now, finished_at=now,
+    )
+    return Job.DONE
+
+
+def work(job_id):
+    """``execute()`` in a pool process, which keeps its connection between jobs like a web worker."""
+    close_old_connections()
+    try:
+        return execute(job_id)
+    finally:
+        close_old_connections()
+
+
+def _run(job):
+    kind = REGISTRY.get(job.kind)
+    if kind is None:
+        raise JobError(f"Unknown job kind {job.kind!r}.")
+    progress = Progress(job.pk)
+    if not kind.filename:
+        return kind.handler(job.params, progress, None), ''
+
+    directory = results_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    result = f'{job.pk}-{kind.download_name(job.params)}'
+    partial = directory / f'{result}.part'
+    try:
+        with open(partial, 'w', newline='', encoding='utf-8') as out:
+            message = kind.handler(job.params, progress, out)
+        os.replace(partial, directory / result)
+    finally:
+        partial.unlink(missing_ok=True)
+    return message, result
+
+
+def _fail(job, exc):
+    now = timezone.now()
+    error = ''.join(traceback.format_exception_only(exc)).strip()
+    if isinstance(exc, JobError) or job.attempts >= job.max_attempts:
+        changes = {'status': Job.FAILED, 'finished_at': now}
+    else:
+        delay = RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        changes = {'status': Job.QUEUED, 'run_after': now + timedelta(seconds=delay)}
+    Job.objects.filter(pk=job.pk).update(error=error, heartbeat_at=now, **changes)
+    return changes['status']
+
+
+# -----------------------------
+# JOB KINDS
+# -----------------------------
+
+def _date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise JobError(f"{name} must be a date (YYYY-MM-DD).")
+
+
+def _number(params, name, default=None, kind=int):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise JobError(f"{name} must be a number.")
+
+
+def _dates(params):
+    start, end = params.get('start'), params.get('end')
+    return (date.fromisoformat(start) if start else None), (date.fromisoformat(end) if end else None)
+
+
+def _clean_export(params):
+    kind = params.get('kind')
+    if kind not in exports.EXPORTS:
+        raise JobError(f"kind must be one of {', '.join(sorted(exports.EXPORTS))}.")
+    if kind == 'sales':
+        return {'kind': kind, 'start': _date(params, 'start'), 'end': _date(params, 'end')}
+    if kind == 'expiry':
+        days = _number(params, 'days', exports.EXPIRY_DAYS)
+        if days < 0:
+            raise JobError("days must not be negative.")
+        return {'kind': kind, 'days': min(days, batches.MAX_ALERT_DAYS)}
+    return {'kind': kind}
+
+
+@register('export', clean=_clean_export, filename='{kind}.csv')
+def export(params, progress, out):
+    """A CSV export of any size, written to a file instead of a streaming response."""
+    kind = params['kind']
+    options = {name: value for name, value in params.items() if name != 'kind'}
+    if kind == 'sales':
+        options['start'], options['end'] = _dates(params)
+    total = exports.export_size(kind, **options)
+    lines = exports.export_lines(kind, **options)
+    out.write(next(lines))
+    for written, line in enumerate(lines, 1):
+        out.write(line)
+        progress(written, total, f"{written} of {total} rows")
+    return f"{total} rows"
+
+
+@register('reconcile', filename='stock-reconciliation.txt', content_type='text/plain')
+def reconcile(params, progress, out):
+    """Compare every medicine's stored quantity with its ledger balance and its batches."""
+    progress(0, 2, "Checking the stock ledger")
+    mismatches = list(ledger.reconcile().values_list('id', 'name', 'quantity', 'ledger_quantity'))
+    for pk, name, quantity, ledger_quantity in mismatches:
+        out.write(f"#{pk} {name}: stored {quantity}, ledger {ledger_quantity}\n")
+    progress(1, 2, "Checking the batches")
+    unbatched = list(batches.reconcile().values_list('id', 'name', 'quantity', 'batch_quantity'))
+    for pk, name, quantity, batch_quantity in unbatched:
+        out.write(f"#{pk} {name}: stored {quantity}, batches {batch_quantity}\n")
+    if not mismatches and not unbatched:
+        out.write("Stock matches the ledger and the batches.\n")
+    return f"{len(mismatches)} ledger and {len(unbatched)} batch mismatch(es)"
+
+
+def _clean_range(params):
+    return {'start': _date(params, 'start'), 'end': _date(params, 'end')}
+
+
+@register('rebuild_rollups', clean=_clean_range)
+def rebuild_rollups(params, progress, out):
+    """Recompute the daily sales rollup, e.g. after correcting past sales."""
+    written = rollups.rebuild(*_dates(params), progress=progress)
+    return f"{written} rollup rows written"
+
+
+def _clean_forecast(params):
+    numbers = {'days': _number(params, 'days'), 'alpha': _number(params, 'alpha', kind=float),
+               'lead_time': _number(params, 'lead_time')}
+    return {name: value for name, value in numbers.items() if value is not None}
+
+
+@register('forecast', clean=_clean_forecast)
+def forecast(params, progress, out):
+    """Refresh the demand forecasts and reorder points; unset parameters take forecasting's defaults."""
+    from . import forecasting  # NumPy is only needed where jobs run
+
+    return f"{forecasting.run(**params, progress=progress)} medicine(s) forecast"
@@ -0,0 +1,303 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, PositiveIntegerField, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import catalog, sync
+from .models import Medicine, SaleItem, StockBatch, StockMovement, StockSnapshot
+
+
+class InsufficientStock(Exception):
+    """Raised when a movement would take a medicine's balance below zero."""
+
+
+class AmbiguousExpiry(Exception):
+    """Raised when an expiry date cannot be pinned to a single batch."""
+
+
+def _guarded_update(model, deltas):
+    """
+    Move ``quantity`` of ``model`` rows by ``{pk: signed change}`` in one
+    UPDATE. Decrements are guarded with ``quantity >= -change``; returns
+    whether every row was updated.
+    """
+    guard = reduce(or_, (
+        Q(pk=pk, quantity__gte=-delta) if delta < 0 else Q(pk=pk)
+        for pk, delta in deltas.items()
+    ))
+    updated = model.objects.filter(guard).update(
+        quantity=Case(
+            *(When(pk=pk, then=F('quantity') + delta) for pk, delta in deltas.items()),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    return updated == len(deltas)
+
+
+def apply_deltas(deltas):
+    """
+    Move ``Medicine.quantity`` by ``{medicine_id: signed change}`` in one UPDATE.
+
+    Decrements are guarded with ``quantity >= -change`` so the balance can never
+    go negative; if any guard misses, ``InsufficientStock`` is raised and the
+    caller's transaction should roll back.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if not _guarded_update(Medicine, deltas):
+        raise InsufficientStock("Not enough stock to complete this movement.")
+    # Queryset updates skip the model signals the catalog cache and sync listen to.
+    sync.record(deltas)
+    catalog.invalidate()
+
+
+def apply_batch_deltas(deltas):
+    """Move ``StockBatch.quantity`` by ``{batch_id: signed change}``, guarded like ``apply_deltas``."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if deltas and not _guarded_update(StockBatch, deltas):
+        raise InsufficientStock("Not enough stock left in the batch.")
+
+
+def sync_expiry(medicine_ids):
+    """Set ``Medicine.expiry_date`` to the earliest expiry among its batches still in stock."""
+    if not medicine_ids:
+        return
+    earliest = (
+        StockBatch.objects.filter(medicine=OuterRef('pk'), quantity__gt=0)
+        .order_by('expiry_date').values('expiry_date')[:1]
+    )
+    Medicine.objects.filter(pk__in=medicine_ids).update(expiry_date=Coalesce(Subquery(earliest), F('expiry_date')))
+
+
+@transaction.atomic
+def record(movements, apply_balance=True):
+    """
+    Insert ``movements`` and move the medicine balances they describe.
+
+    Pass ``apply_balance=False`` when ``Medicine.quantity`` has already been
+    written, e.g. the opening balance of a newly created medicine.
+    """
+    movements = list(movements)
+    if apply_balance:
+        deltas, batch_deltas = defaultdict(int), defaultdict(int)
+        for movement in movements:
+            deltas[movement.medicine_id] += movement.quantity
+            if movement.batch_id:
+                batch_deltas[movement.batch_id] += movement.quantity
+        apply_deltas(deltas)
+        apply_batch_deltas(batch_deltas)
+        sync_expiry({movement.medicine_id for movement in movements if movement.batch_id})
+    return StockMovement.objects.bulk_create(movements)
+
+
+def allocate(quantities):
+    """
+    Pick stock first-expiry-first-out for ``{medicine_id: quantity}``.
+
+    The batches of every medicine are locked and read in a single query,
+    earliest expiry first. Returns ``[(medicine_id, batch_id, quantity)]``;
+    stock that predates batch tracking (not covered by any batch) is picked
+    last with ``batch_id=None``. Raises ``InsufficientStock`` when a medicine
+    cannot cover its quantity.
+    """
+    remaining = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    batched = defaultdict(int)
+    picks = []
+    batches = (
+        StockBatch.objects.select_for_update()
+        .filter(medicine_id__in=list(remaining), quantity__gt=0)
+        .order_by('medicine_id', 'expiry_date', 'pk')
+        .values_list('id', 'medicine_id', 'quantity')
+    )
+    for batch_id, medicine_id, available in batches:
+        batched[medicine_id] += available
+        take = min(remaining[medicine_id], available)
+        if take:
+            picks.append((medicine_id, batch_id, take))
+            remaining[medicine_id] -= take
+
+    short = {pk: quantity for pk, quantity in remaining.items() if quantity}
+    if short:
+        on_hand = dict(Medicine.objects.filter(pk__in=list(short)).values_list('id', 'quantity'))
+        for medicine_id, quantity in short.items():
+            if on_hand.get(medicine_id, 0) - batched[medicine_id] < quantity:
+                raise InsufficientStock("Not enough stock to complete this movement.")
+            picks.append((medicine_id, None, quantity))
+    return picks
+
+
+def take_movements(quantities, kind, **fields):
+    """Unsaved FEFO movements taking ``{medicine_id: quantity}`` out of stock."""
+    return [
+        StockMovement(medicine_id=medicine_id, batch_id=batch_id, kind=kind, quantity=-quantity, **fields)
+        for medicine_id, batch_id, quantity in allocate(quantities)
+    ]
+
+
+@transaction.atomic
+def receive(medicine, quantity, expiry_date, lot_number='', kind=StockMovement.RESTOCK, note=''):
+    """Book a delivery of ``quantity`` units into a new batch and return the batch."""
+    batch = StockBatch.objects.create(medicine=medicine, lot_number=lot_number, expiry_date=expiry_date, quantity=0)
+    record([StockMovement(medicine=medicine, batch=batch, kind=kind, quantity=quantity, note=note)])
+    return batch
+
+
+def adjust(medicine, delta, note='', expiry_date=None, lot_number=''):
+    """
+    Record a manual stock change for one medicine. Increases are received as
+    a new batch expiring on ``expiry_date`` (default: the medicine's);
+    decreases are written off first-expiry-first-out.
+    """
+    if delta > 0:
+        receive(medicine, delta, expiry_date or medicine.expiry_date, lot_number, note=note)
+    elif delta < 0:
+        record(take_movements({medicine.pk: -delta}, StockMovement.ADJUSTMENT, note=note))
+
+
+@transaction.atomic
+def set_expiry(medicine, expiry_date):
+    """
+    Correct the expiry date of a medicine's stock. Only allowed while at most
+    one batch holds stock; otherwise the expiry follows the earliest batch.
+    """
+    batches = StockBatch.objects.select_for_update().filter(medicine=medicine, quantity__gt=0)
+    if len(batches) > 1:
+        raise AmbiguousExpiry("This medicine is held in several batches; record a restock for new expiry dates.")
+    batches.update(expiry_date=expiry_date)
+    Medicine.objects.filter(pk=medicine.pk).update(expiry_date=expiry_date)
+    medicine.expiry_date = expiry_date
+    catalog.invalidate()
+
+
+@transaction.atomic
+def record_opening(medicine, lot_number=''):
+    """Record the initial quantity of a newly created medicine as its first batch."""
+    if not medicine.quantity:
+        return []
+    batch = StockBatch.objects.create(
+        medicine=medicine, lot_number=lot_number, expiry_date=medicine.expiry_date, quantity=medicine.quantity,
+    )
+    return record(
+        [StockMovement(medicine=medicine, batch=batch, kind=StockMovement.OPENING, quantity=medicine.quantity)],
+        apply_balance=False,
+    )
+
+
+def _return_batches(medicine_ids):
+    """
+    ``{medicine_id: batch_id}`` of the batch that takes back stock sold
+    before batch tracking: the latest-expiring one, created if needed.
+    """
+    targets = dict(
+        StockBatch.objects.filter(medicine_id__in=medicine_ids)
+        .order_by('medicine_id', 'expiry_date', 'pk').values_list('medicine_id', 'id')
+    )
+    for pk, expiry_date in Medicine.objects.filter(pk__in=set(medicine_ids) - set(targets)).values_list(
+        'id', 'expiry_date',
+    ):
+        targets[pk] = StockBatch.objects.create(medicine_id=pk, expiry_date=expiry_date, quantity=0).pk
+    return targets
+
+
+@transaction.atomic
+def void_sales(sales, note=''):
+    """
+    Return every line of ``sales`` to stock as VOID movements, into the
+    batches it was taken from. The lines of all the sales are summed per
+    sale, medicine and batch in one grouped query, and ``record`` moves the
+    balances with one UPDATE for the medicines and one for the batches.
+    """
+    sale_ids = [sale.pk for sale in sales]
+    lines = list(
+        StockMovement.objects.filter(sale_id__in=sale_ids, kind=StockMovement.SALE).order_by()
+        .values_list('sale_id', 'medicine_id', 'batch_id').annotate(total=-Sum('quantity'))
+    )
+    # Sales made before the ledger existed have no movements.
+    unrecorded = set(sale_ids) - {sale_id for sale_id, _, _, _ in lines}
+    if unrecorded:
+        lines += [
+            (sale_id, medicine_id, None, total)
+            for sale_id, medicine_id, total in SaleItem.objects.filter(sale_id__in=unrecorded).order_by()
+            .values_list('sale_id', 'medicine_id').annotate(total=Sum('quantity'))
+        ]
+    fallback = _return_batches({medicine_id for _, medicine_id, batch_id, _ in lines if batch_id is None})
+    return record(
+        StockMovement(
+            medicine_id=medicine_id,
+            batch_id=batch_id or fallback[medicine_id],
+            kind=StockMovement.VOID,
+            quantity=total,
+            sale_id=sale_id,
+            note=note,
+        )
+        for sale_id, medicine_id, batch_id, total in lines
+    )
+
+
+# -----------------------------
+# SNAPSHOTS AND RECONCILIATION
+# -----------------------------
+
+def _latest_snapshot(field, at=None):
+    snapshots = StockSnapshot.objects.filter(medicine=OuterRef('pk'))
+    if at is not None:
+        snapshots = snapshots.filter(taken_at__lte=at)
+    return Subquery(snapshots.order_by('-last_movement_id').values(field)[:1])
+
+
+def ledger_balances(medicines=None, at=None, last_movement_id=None):
+    """
+    Annotate medicines with ``ledger_quantity``: the balance implied by the
+    latest snapshot plus the movements recorded after it, optionally bounded by
+    time (``at``) or by movement id.
+    """
+    medicines = Medicine.objects.all() if medicines is None else medicines
+    medicines = medicines.annotate(
+        snapshot_quantity=Coalesce(_latest_snapshot('quantity', at), 0),
+        snapshot_movement_id=Coalesce(_latest_snapshot('last_movement_id', at), 0),
+    )
+    since = StockMovement.objects.filter(medicine=OuterRef('pk'), id__gt=OuterRef('snapshot_movement_id'))
+    if at is not None:
+        since = since.filter(created_at__lte=at)
+    if last_movement_id is not None:
+        since = since.filter(id__lte=last_movement_id)
+    since_total = since.order_by().values('medicine').annotate(total=Sum('quantity')).values('total')
+    return medicines.annotate(
+        ledger_quantity=F('snapshot_quantity') + Coalesce(Subquery(since_total, output_field=IntegerField()), 0),
+    )
+
+
+def on_hand_at(at, medicines=None):
+    """Return ``{medicine_id: quantity}`` as the ledger stood at ``at``."""
+    return dict(ledger_balances(medicines, at=at).values_list('id', 'ledger_quantity'))
+
+
+def reconcile(medicines=None):
+    """Return medicines whose stored balance disagrees with the ledger."""
+    return ledger_balances(medicines).exclude(quantity=F('ledger_quantity'))
+
+
+@transaction.atomic
+def take_snapshot():
+    """
+    Snapshot the ledger balance of every medicine that moved since its last
+    snapshot. Returns the number of snapshot rows written.
+    """
+    watermark = StockMovement.objects.aggregate(last=Max('id'))['last']
+    if watermark is None:
+        return 0
+    moved = ledger_balances(last_movement_id=watermark).filter(
+        movements__id__gt=F('snapshot_movement_id'),
+        movements__id__lte=watermark,
+    ).distinct()
+    now = timezone.now()
+    snapshots = StockSnapshot.objects.bulk_create(
+        StockSnapshot(medicine_id=pk, quantity=quantity, last_movement_id=watermark, taken_at=now)
+        for pk, quantity in moved.values_list('id', 'ledger_quantity')
+    )
+    return len(snapshots)
@@ -0,0 +1,125 @@
+"""
+Small concurrent load generator shared by the load and stress commands.
+
+``hammer`` calls a function from many threads and records per-call
+latencies; ``summarize`` turns them into throughput and percentiles.
+``HttpSession`` is a stdlib HTTP client that logs in through the normal
+login form, so a running server can be driven without extra dependencies.
+"""
+import http.cookiejar
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, errors, seconds):
+    ordered = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 2)  # noqa: E731
+    return {
+        'name': name,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 1) if seconds else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'max_ms': ms(ordered[-1] if ordered else None),
+    }
+
+
+def hammer(name, call, concurrency=20, requests=1000, duration=None, finish=None):
+    """
+    Run ``call(worker_number)`` from ``concurrency`` threads until ``requests``
+    calls are done (or ``duration`` seconds pass) and summarize the latencies.
+    A call fails by raising; failures are counted, not timed. ``finish()``
+    runs in each thread as it stops, e.g. to close its database connections.
+    """
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker(number):
+        nonlocal errors
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0 or (deadline and time.monotonic() >= deadline):
+                        return
+                    remaining[0] -= 1
+                start = time.perf_counter()
+                try:
+                    call(number)
+                except Exception:
+                    with lock:
+                        errors += 1
+                else:
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+        finally:
+            if finish is not None:
+                finish()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(name, latencies, errors, time.perf_counter() - start)
+
+
+class HttpSession:
+    """Cookie-keeping HTTP client for a running pharmacy server."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def url(self, path):
+        return path if path.startswith('http') else f'{self.base_url}{path}'
+
+    def get(self, path):
+        with self.opener.open(self.url(path), timeout=self.timeout) as response:
+            return response.status, response.read()
+
+    def _request(self, path, data):
+        return urllib.request.Request(
+            self.url(path),
+            data=urllib.parse.urlencode(data).encode(),
+            headers={'Referer': self.url(path), 'X-CSRFToken': self.cookie('csrftoken') or ''},
+        )
+
+    def post(self, path, data):
+        with self.opener.open(self._request(path, data), timeout=self.timeout) as response:
+            return response.status, response.read()
+
+    def submit(self, path, data):
+        """POST a form like a browser; returns the URL it ended on after redirects, and the body."""
+        with self.opener.open(self._request(path, data), timeout=self.timeout) as response:
+            return response.geturl(), response.read()
+
+    def cookie(self, name):
+        return next((cookie.value for cookie in self.cookies if cookie.name == name), None)
+
+    def login(self, username, password, path='/login/'):
+        self.get(path)
+        self.post(path, {
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.cookie('csrftoken') or '',
+        })
+        if not self.cookie('sessionid'):
+            raise urllib.error.URLError("Login failed: no session cookie was set.")
@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from inventory import archive
+
+
+def parse_month(value):
+    try:
+        return date.fromisoformat(f'{value}-01')
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}', expected YYYY-MM.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Move sales from whole months before the cutoff out of the live tables into compressed "
+        "per-month archive files. Receipts and exports still read them; the daily rollups are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.SALES_ARCHIVE_AFTER_MONTHS,
+                            help="Months of sales to keep live, not counting the current one.")
+        parser.add_argument('--before', type=parse_month,
+                            help="Archive the months before this one (YYYY-MM) instead of using --months.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or archive.cutoff_for(options['months'])
+        try:
+            archive.check_cutoff(cutoff)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['dry_run']:
+            old = archive.pending(cutoff).aggregate(sales=Count('id', distinct=True), lines=Count('items'))
+            self.stdout.write(f"Would archive {old['sales']} sale(s) and {old['lines']} line(s) "
+                              f"from before {cutoff:%Y-%m}.")
+            return
+
+        months = archive.archive_before(cutoff)
+        for record in months:
+            self.stdout.write(f"{record.month:%Y-%m}: {record.sales} sale(s), {record.lines} line(s), "
+                              f"{record.size / 1024:.1f} KiB in {record.filename}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(months)} month(s) from before {cutoff:%Y-%m}."))
@@ -0,0 +1,70 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from inventory import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic pharmacy in a throwaway test database, time every inventory view "
+        "and write a JSON report (optionally compared with an earlier one)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--medicines', type=int, default=50_000)
+        parser.add_argument('--sales', type=int, default=200_000)
+        parser.add_argument('--items-per-sale', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic data.")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed requests per view.")
+        parser.add_argument('-o', '--output', help="Write the JSON report to this file.")
+        parser.add_argument('--compare', help="Earlier JSON report to compare against.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed median slowdown against --compare (0.25 = 25%%).")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.stdout.write("Seeding...")
+            dataset = benchmarks.seed(
+                medicines=options['medicines'],
+                sales=options['sales'],
+                items_per_sale=options['items_per_sale'],
+                seed=options['seed'],
+            )
+            user = User.objects.create_user('benchmark', password='benchmark')
+            client = Client()
+            client.force_login(user)
+            report = benchmarks.run(client, benchmarks.cases(dataset, user), dataset, repeat=options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        for name, result in report['views'].items():
+            self.stdout.write(
+                f"{name:<24} {result['status']:>3} {result['queries']:>3}/{result['budget']:<3} queries "
+                f"{result['median_ms']:>9.2f} ms (first {result['first_ms']:.2f}) {result['peak_kib']:>9.1f} KiB"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        problems = [f"{name}: {queries} queries, budget {budget}"
+                    for name, queries, budget in benchmarks.over_budget(report)]
+        if baseline is not None:
+            problems += benchmarks.compare(baseline, report, tolerance=options['tolerance'])
+        if problems:
+            for problem in problems:
+                self.stderr.write(problem)
+            raise CommandError(f"{len(problems)} benchmark regression(s).")
+        self.stdout.write(self.style.SUCCESS("All views within budget."))
@@ -0,0 +1,41 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import exports
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV export of sales lines, stock valuation or expiring stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--from', dest='start', type=parse_date, help="Sales export: first day (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', type=parse_date, help="Sales export: last day (YYYY-MM-DD).")
+        parser.add_argument('--days', type=int, default=exports.EXPIRY_DAYS,
+                            help="Expiry export: include stock expiring within this many days.")
+        parser.add_argument('-o', '--output', help="Write to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        kwargs = {}
+        if kind == 'sales':
+            kwargs = {'start': options['start'], 'end': options['end']}
+        elif kind == 'expiry':
+            kwargs = {'days': options['days']}
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in exports.export_lines(kind, **kwargs):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
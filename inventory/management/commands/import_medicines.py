@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import importer
+
+
+class Command(BaseCommand):
+    help = "Bulk import or update medicines from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON (array or newline-delimited) file to import.")
+        parser.add_argument('--format', choices=importer.FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE)
+        parser.add_argument(
+            '--quantity-mode', choices=importer.QUANTITY_MODES, default=importer.ADD,
+            help="'add' treats quantities as a delivery, 'set' as a stock count.",
+        )
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help="Reject rows whose category does not exist yet.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate rows without writing anything.")
+        parser.add_argument('--report', help="Write the full JSON report (including row errors) to this file.")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        if fmt in ('jsonl', 'ndjson'):
+            fmt = 'json'
+        try:
+            with path.open('rb') as fileobj:
+                report = importer.import_file(
+                    fileobj, fmt,
+                    chunk_size=options['chunk_size'],
+                    quantity_mode=options['quantity_mode'],
+                    create_categories=not options['no_create_categories'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, importer.ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        if options['report']:
+            Path(options['report']).write_text(json.dumps(report.as_dict(), indent=2, default=str))
+        for error in report.errors[:20]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if len(report.errors) > 20:
+            self.stderr.write(f"... {len(report.errors) - 20} more row error(s).")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.valid} valid row(s): {report.created} created, {report.updated} updated, "
+            f"{report.categories_created} categor(ies) created, {len(report.errors)} rejected."
+        ))
@@ -0,0 +1,81 @@
+import json
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.loadtest import HttpSession, hammer
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the point-of-sale endpoints of a running server, comparing the sync views "
+        "with their async (/pos/) versions, optionally while a slow report is being downloaded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help="e.g. http://127.0.0.1:8000")
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=50, help="Simultaneous tills.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint.")
+        parser.add_argument('--query', default='para', help="Typeahead search text.")
+        parser.add_argument('--sale', type=int, help="Sale id for the receipt endpoints.")
+        parser.add_argument('--ids', default='1,2,3', help="Medicine ids for the stock check.")
+        parser.add_argument('--with-report', action='store_true',
+                            help="Keep downloading the sales CSV export in the background.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        sessions = []
+        for _ in range(options['concurrency']):
+            session = HttpSession(base_url)
+            try:
+                session.login(options['username'], options['password'])
+            except OSError as e:
+                raise CommandError(f"Could not log in to {base_url}: {e}")
+            sessions.append(session)
+
+        query = options['query']
+        targets = [
+            ('search (sync)', f'/medicines/search/?q={query}'),
+            ('search (async)', f'/pos/search/?q={query}'),
+            ('stock (async)', f"/pos/stock/?ids={options['ids']}"),
+        ]
+        if options['sale']:
+            targets += [
+                ('receipt (sync)', f"/sales/receipt/{options['sale']}/"),
+                ('receipt (async)', f"/pos/receipts/{options['sale']}/"),
+            ]
+
+        stop = threading.Event()
+        if options['with_report']:
+            reporter = HttpSession(base_url)
+            reporter.login(options['username'], options['password'])
+
+            def download_reports():
+                while not stop.is_set():
+                    reporter.get('/exports/sales.csv')
+            threading.Thread(target=download_reports, daemon=True).start()
+
+        results = []
+        try:
+            for name, path in targets:
+                results.append(hammer(
+                    name,
+                    lambda worker, path=path: sessions[worker].get(path),
+                    concurrency=options['concurrency'],
+                    requests=options['requests'],
+                ))
+        finally:
+            stop.set()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'endpoint':<18} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for row in results:
+            self.stdout.write(
+                f"{row['name']:<18} {row['throughput'] or 0:>9.1f} {row['p50_ms'] or 0:>9.2f} "
+                f"{row['p95_ms'] or 0:>9.2f} {row['p99_ms'] or 0:>9.2f} {row['errors']:>7}"
+            )
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import rollups
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales/profit rollup from the sales tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=parse_date, help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', type=parse_date, help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily summary row(s)."))
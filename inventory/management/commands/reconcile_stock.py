@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import batches, ledger
+
+
+class Command(BaseCommand):
+    help = "Compare each medicine's stored quantity with its stock ledger balance and its batches."
+
+    def handle(self, *args, **options):
+        mismatches = list(ledger.reconcile().values_list('id', 'name', 'quantity', 'ledger_quantity'))
+        for pk, name, quantity, ledger_quantity in mismatches:
+            self.stdout.write(f"#{pk} {name}: stored {quantity}, ledger {ledger_quantity}")
+        unbatched = list(batches.reconcile().values_list('id', 'name', 'quantity', 'batch_quantity'))
+        for pk, name, quantity, batch_quantity in unbatched:
+            self.stdout.write(f"#{pk} {name}: stored {quantity}, batches {batch_quantity}")
+        if mismatches or unbatched:
+            raise CommandError(
+                f"{len(mismatches)} medicine(s) disagree with the stock ledger, "
+                f"{len(unbatched)} with their batches."
+            )
+        self.stdout.write(self.style.SUCCESS("Stock matches the ledger and the batches."))
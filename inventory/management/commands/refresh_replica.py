@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the replica SQLite file, once or every few seconds. "
+        "A local stand-in for replication when REPLICA_DATABASE_URL points at a second SQLite file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help="Keep refreshing at this interval (simulates replication lag).")
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_DATABASE
+        if not alias:
+            raise CommandError("No replica configured; set REPLICA_DATABASE_URL.")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("refresh_replica only copies SQLite files; use the database's own replication.")
+        if primary.settings_dict['NAME'] == replica.settings_dict['NAME']:
+            raise CommandError("The replica and the primary are the same file.")
+
+        while True:
+            self.copy(primary, replica.settings_dict['NAME'])
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def copy(self, primary, target_name):
+        start = time.perf_counter()
+        primary.ensure_connection()
+        target = sqlite3.connect(target_name)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(f"Replica refreshed in {(time.perf_counter() - start) * 1000:.0f} ms.")
@@ -0,0 +1,58 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory import jobs
+
+RECOVER_EVERY = 60  # seconds between checks for jobs whose worker died
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (exports, stock recounts, rollup and forecast rebuilds) "
+        "in a pool of worker processes. Runs until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOB_WORKERS,
+                            help="Jobs run at the same time (one process each).")
+        parser.add_argument('--poll', type=float, default=2.0, metavar='SECONDS',
+                            help="How often to look for new jobs when idle.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no job is due and this worker's jobs have finished.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        recovered = jobs.requeue_stale()
+        purged = jobs.purge()
+        self.stdout.write(f"Job worker with {workers} process(es); {recovered} stale job(s) requeued, "
+                          f"{purged} old job(s) purged.")
+        # Spawned, not forked: each child sets Django up afresh and opens its own connection.
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            running = {}
+            recovered_at = time.monotonic()
+            while True:
+                if time.monotonic() - recovered_at >= RECOVER_EVERY:
+                    recovered_at = time.monotonic()
+                    if recovered := jobs.requeue_stale():
+                        self.stdout.write(f"{recovered} stale job(s) requeued")
+                for future in [future for future in running if future.done()]:
+                    job_id = running.pop(future)
+                    self.stdout.write(f"Job {job_id}: {future.result()}")
+                while len(running) < workers:
+                    job_id = jobs.claim()
+                    if job_id is None:
+                        break
+                    self.stdout.write(f"Job {job_id}: started")
+                    running[pool.submit(jobs.work, job_id)] = job_id
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll'])
+                else:
+                    wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
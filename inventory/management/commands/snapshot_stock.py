@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory import ledger
+
+
+class Command(BaseCommand):
+    help = "Snapshot ledger balances so stock-at-date queries only sum recent movements."
+
+    def handle(self, *args, **options):
+        written = ledger.take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} stock snapshot(s)."))
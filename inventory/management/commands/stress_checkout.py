@@ -0,0 +1,90 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from inventory import stress
+
+
+class Command(BaseCommand):
+    help = (
+        "Sell the same fast-moving medicines from many tills at once, report sales per second and "
+        "latency percentiles, and check that no stock was lost or oversold. Runs in-process against a "
+        "throwaway test database, or against a running server with --url (its medicines and sales are "
+        "removed afterwards unless --keep is given)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running local server, e.g. http://127.0.0.1:8000. "
+                                          "Its database must be the one configured here.")
+        parser.add_argument('--username', help="Login for --url.")
+        parser.add_argument('--password', help="Password for --url.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Simultaneous tills.")
+        parser.add_argument('--sales', type=int, default=2000, help="Baskets to sell.")
+        parser.add_argument('--items', type=int, default=5, help="Medicines to sell; the first is the hot one.")
+        parser.add_argument('--stock', type=int, default=1000,
+                            help="Starting stock of each medicine; low enough and the hot one sells out.")
+        parser.add_argument('--max-lines', type=int, default=3, help="Most medicines in one basket.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the baskets.")
+        parser.add_argument('--keep', action='store_true',
+                            help="With --url, leave the run's medicines and sales in the database.")
+        parser.add_argument('--json', action='store_true', help="Print the result as JSON.")
+
+    def handle(self, *args, **options):
+        if options['url'] and not (options['username'] and options['password']):
+            raise CommandError("--url needs --username and --password.")
+        if options['items'] < 1:
+            raise CommandError("--items must be at least 1.")
+
+        if options['url']:
+            result, problems = self.stress(options, lambda: stress.HttpSeller(
+                options['url'], options['username'], options['password'], options['concurrency'],
+            ), cleanup=not options['keep'])
+        else:
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            try:
+                user = User.objects.create_user('stress', password='stress')
+                # Tills queue for the write lock, so most requests would be logged as slow.
+                with override_settings(PROFILING_SAMPLE_RATE=0):
+                    result, problems = self.stress(
+                        options, lambda: stress.ClientSeller(user, options['concurrency']),
+                    )
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps({**result, 'problems': problems}, indent=2))
+        else:
+            self.stdout.write(
+                f"{result['sold']} sold, {result['rejected']} rejected, {result['errors']} error(s) "
+                f"in {result['seconds']:.2f}s: {result['sales_per_second'] or 0:.1f} sales/s"
+            )
+            self.stdout.write(
+                f"latency p50 {result['p50_ms'] or 0:.2f} ms, p95 {result['p95_ms'] or 0:.2f} ms, "
+                f"p99 {result['p99_ms'] or 0:.2f} ms, max {result['max_ms'] or 0:.2f} ms"
+            )
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems or result['errors']:
+            raise CommandError(f"{len(problems)} stock problem(s) and {result['errors']} failed request(s).")
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS("Stock matches the recorded sales: nothing lost or oversold."))
+
+    def stress(self, options, seller, cleanup=False):
+        start = stress.create_items(options['items'], options['stock'])
+        try:
+            try:
+                sell = seller()
+            except OSError as e:
+                raise CommandError(f"Could not log in to {options['url']}: {e}")
+            result = stress.run(sell, start, concurrency=options['concurrency'], sales=options['sales'],
+                                max_lines=options['max_lines'], seed=options['seed'])
+            return result, stress.check(start)
+        finally:
+            if cleanup:
+                stress.cleanup(start)
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    SaleItem = apps.get_model('inventory', 'SaleItem')
+    DailySalesSummary = apps.get_model('inventory', 'DailySalesSummary')
+    Medicine = apps.get_model('inventory', 'Medicine')
+    SaleItem.objects.filter(unit_cost__isnull=True).update(
+        unit_cost=Subquery(Medicine.objects.filter(pk=OuterRef('medicine_id')).values('buying_price')[:1])
+    )
+    money = models.DecimalField(max_digits=14, decimal_places=2)
+    grouped = (
+        SaleItem.objects.annotate(day=TruncDate('sale__sale_date'))
+        .values('day', 'sale__payment_mode', 'medicine__category')
+        .annotate(
+            revenue=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=money)),
+            cost=Sum(ExpressionWrapper(F('unit_cost') * F('quantity'), output_field=money)),
+            units=Sum('quantity'),
+            lines=Count('id'),
+        )
+        .order_by()
+    )
+    DailySalesSummary.objects.bulk_create(
+        DailySalesSummary(
+            date=row['day'], payment_mode=row['sale__payment_mode'], category_id=row['medicine__category'],
+            revenue=row['revenue'], cost=row['cost'], profit=row['revenue'] - row['cost'],
+            units=row['units'], lines=row['lines'],
+        )
+        for row in grouped.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_mode', models.CharField(choices=[('Cash', 'Cash'), ('Card', 'Card'), ('Mobile', 'Mobile Payment')], max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+                ('lines', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.category')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalessummary',
+            constraint=models.UniqueConstraint(fields=('date', 'payment_mode', 'category'), name='unique_daily_sales_summary'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
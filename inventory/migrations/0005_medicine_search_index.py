@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from inventory import search
+
+    search.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_sale_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def freeze_existing_receipts(apps, schema_editor):
+    from inventory.receipts import snapshot_data
+
+    Sale = apps.get_model('inventory', 'Sale')
+    Receipt = apps.get_model('inventory', 'Receipt')
+    SaleItem = apps.get_model('inventory', 'SaleItem')
+    lines = {}
+    for row in SaleItem.objects.order_by('pk').values_list(
+        'sale_id', 'medicine__name', 'quantity', 'price', 'unit_cost', 'medicine__buying_price',
+    ).iterator():
+        sale_id, name, quantity, price, unit_cost, buying_price = row
+        lines.setdefault(sale_id, []).append((name, quantity, price, buying_price if unit_cost is None else unit_cost))
+    Receipt.objects.bulk_create(
+        (Receipt(sale_id=sale.pk, data=snapshot_data(sale, lines.get(sale.pk, []))) for sale in Sale.objects.iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_medicine_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Receipt',
+            fields=[
+                ('sale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='receipt', serialize=False, to='inventory.sale')),
+                ('data', models.JSONField()),
+            ],
+        ),
+        migrations.RunPython(freeze_existing_receipts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_legacy_batches(apps, schema_editor):
+    Medicine = apps.get_model('inventory', 'Medicine')
+    StockBatch = apps.get_model('inventory', 'StockBatch')
+    StockBatch.objects.bulk_create(
+        (
+            StockBatch(medicine_id=pk, lot_number='LEGACY', expiry_date=expiry_date, quantity=quantity)
+            for pk, expiry_date, quantity in Medicine.objects.filter(quantity__gt=0)
+            .values_list('id', 'expiry_date', 'quantity').iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_receipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot_number', models.CharField(blank=True, max_length=50)),
+                ('expiry_date', models.DateField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='inventory.medicine')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='inventory.stockbatch'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbatch',
+            index=models.Index(fields=['expiry_date', 'medicine'], name='batch_expiry_medicine_idx'),
+        ),
+        migrations.RunPython(open_legacy_batches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stock_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('medicine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='inventory.medicine')),
+                ('moving_average', models.FloatField()),
+                ('smoothed', models.FloatField()),
+                ('deviation', models.FloatField()),
+                ('days_of_cover', models.FloatField(blank=True, null=True)),
+                ('reorder_point', models.PositiveIntegerField()),
+                ('reorder_quantity', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
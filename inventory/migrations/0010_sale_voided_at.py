@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='voided_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
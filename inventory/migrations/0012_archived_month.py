@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-17 23:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_catalog_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('filename', models.CharField(max_length=100)),
+                ('sales', models.PositiveIntegerField(default=0)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('first_sale_id', models.BigIntegerField()),
+                ('last_sale_id', models.BigIntegerField()),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['first_sale_id', 'last_sale_id'], name='archived_month_sale_ids_idx')],
+            },
+        ),
+    ]
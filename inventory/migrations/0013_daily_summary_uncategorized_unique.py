@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-17 23:29
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_uncategorized_duplicates(apps, schema_editor):
+    DailySalesSummary = apps.get_model('inventory', 'DailySalesSummary')
+    uncategorized = DailySalesSummary.objects.filter(category__isnull=True)
+    duplicated = (
+        uncategorized.values('date', 'payment_mode')
+        .annotate(rows=Count('id'), revenue_total=Sum('revenue'), cost_total=Sum('cost'),
+                  profit_total=Sum('profit'), units_total=Sum('units'), lines_total=Sum('lines'))
+        .filter(rows__gt=1).order_by()
+    )
+    for group in list(duplicated):
+        rows = uncategorized.filter(date=group['date'], payment_mode=group['payment_mode'])
+        keep = rows.order_by('pk').values_list('pk', flat=True).first()
+        rows.exclude(pk=keep).delete()
+        rows.filter(pk=keep).update(
+            revenue=group['revenue_total'], cost=group['cost_total'], profit=group['profit_total'],
+            units=group['units_total'], lines=group['lines_total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_archived_month'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_uncategorized_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysalessummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('date', 'payment_mode'), name='unique_daily_sales_summary_uncategorized'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-17 23:39
+
+import gzip
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_voided_lines(apps, schema_editor):
+    ArchivedMonth = apps.get_model('inventory', 'ArchivedMonth')
+    for record in ArchivedMonth.objects.all():
+        path = Path(settings.SALES_ARCHIVE_DIR) / record.filename
+        if not path.exists():
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            data = json.load(archive)
+        voided = {pk for pk, voided_at in zip(data['sales']['id'], data['sales']['voided_at']) if voided_at}
+        record.voided_lines = sum(1 for sale_id in data['lines']['sale_id'] if sale_id in voided)
+        record.save(update_fields=['voided_lines'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedmonth',
+            name='voided_lines',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_voided_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:12
+
+import time
+
+from django.db import migrations
+
+
+def seed(apps, schema_editor):
+    # With the row in place a void bumps it with one UPDATE instead of creating it.
+    CacheVersion = apps.get_model('inventory', 'CacheVersion')
+    CacheVersion.objects.get_or_create(name='receipts', defaults={'version': time.time_ns()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_archived_month_voided_lines'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,5 @@
 from django.db import models
-from django.db.models.signals import pre_save, post_save, post_delete
-from django.dispatch import receiver
+from django.utils import timezone
 
 
 class Category(models.Model):
@@ -36,6 +35,12 @@ class Sale(models.Model):
     sale_date = models.DateTimeField(auto_now_add=True)
     payment_mode = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='Cash')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Set when the sale is voided (``checkout.void_sales``); its stock is back
+    # on the shelf and it no longer counts in totals, reports or exports.
+    voided_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['sale_date', 'id'], name='sale_date_id_idx')]
 
     def __str__(self):
         return f"Sale #{self.id} - {self.sale_date.strftime('%Y-%m-%d %H:%M')}"
@@ -52,48 +57,228 @@ class SaleItem(models.Model):
     medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # buying price when sold
 
     def __str__(self):
         return f"{self.quantity} x {self.medicine.name}"
 
     def profit(self):
-        return (self.price - self.medicine.buying_price) * self.quantity
-
-
-# -----------------------------
-# SIGNALS FOR STOCK MANAGEMENT
-# -----------------------------
-
-# 1. Capture old quantity BEFORE saving
-@receiver(pre_save, sender=SaleItem)
-def store_old_quantity(sender, instance, **kwargs):
-    if instance.pk:  # means update
-        try:
-            old_instance = sender.objects.get(pk=instance.pk)
-            instance._old_quantity = old_instance.quantity
-        except sender.DoesNotExist:
-            instance._old_quantity = 0
-    else:  # new record
-        instance._old_quantity = 0
-
-
-# 2. Adjust stock AFTER saving
-@receiver(post_save, sender=SaleItem)
-def update_stock_on_save(sender, instance, created, **kwargs):
-    medicine = instance.medicine
-    if created:
-        # subtract exactly what was sold
-        medicine.quantity -= instance.quantity
-    else:
-        # adjust by the difference
-        difference = instance.quantity - instance._old_quantity
-        medicine.quantity -= difference
-    medicine.save(update_fields=["quantity"])
-
-
-# 3. Restore stock when sale item is deleted
-@receiver(post_delete, sender=SaleItem)
-def restore_stock_on_delete(sender, instance, **kwargs):
-    medicine = instance.medicine
-    medicine.quantity += instance.quantity
-    medicine.save(update_fields=["quantity"])
+        unit_cost = self.unit_cost if self.unit_cost is not None else self.medicine.buying_price
+        return (self.price - unit_cost) * self.quantity
+
+
+class Receipt(models.Model):
+    """
+    Frozen copy of a finished sale as printed on its receipt: line names,
+    quantities, prices and totals. Written once at checkout by
+    ``inventory.receipts`` so reprints never touch the sales tables.
+    """
+    sale = models.OneToOneField(Sale, on_delete=models.CASCADE, primary_key=True, related_name='receipt')
+    data = models.JSONField()
+
+    def __str__(self):
+        return f"Receipt for sale #{self.sale_id}"
+
+
+class CatalogChange(models.Model):
+    """
+    The latest change to a medicine's sell-page fields (name, price, stock),
+    one row per medicine, written by ``inventory.sync``. Each change replaces
+    the row, so the id only grows and doubles as the catalog sync version. A
+    row whose medicine no longer exists is a tombstone.
+    """
+    medicine_id = models.BigIntegerField(unique=True)  # no foreign key: outlives a deleted medicine
+
+    def __str__(self):
+        return f"Medicine #{self.medicine_id} at version {self.pk}"
+
+
+class CacheVersion(models.Model):
+    """
+    Version number of a group of cached snapshots (``inventory.versions``).
+    Cache keys embed it, so bumping the row invalidates the snapshots in
+    every process at once.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class StockBatch(models.Model):
+    """
+    One delivery (lot) of a medicine with its own expiry date. The batch
+    quantities of a medicine add up to ``Medicine.quantity``; sales take stock
+    first-expiry-first-out through ``inventory.ledger.allocate``.
+    """
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='batches')
+    lot_number = models.CharField(max_length=50, blank=True)
+    expiry_date = models.DateField()
+    quantity = models.PositiveIntegerField()
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['expiry_date', 'medicine'], name='batch_expiry_medicine_idx')]
+
+    def __str__(self):
+        return f"{self.medicine_id} lot {self.lot_number or '-'} exp {self.expiry_date}: {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of stock changes. ``Medicine.quantity`` is the running
+    balance of these rows and is only moved through ``inventory.ledger``.
+    """
+    OPENING = 'opening'
+    SALE = 'sale'
+    RESTOCK = 'restock'
+    VOID = 'void'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (SALE, 'Sale'),
+        (RESTOCK, 'Restock'),
+        (VOID, 'Void'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # signed: negative takes stock out
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    batch = models.ForeignKey(StockBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['medicine', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} {self.medicine_id}"
+
+
+class StockSnapshot(models.Model):
+    """
+    Ledger balance of a medicine up to and including movement ``last_movement_id``,
+    so balance queries only need to sum the movements recorded after it.
+    """
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='snapshots')
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['medicine', 'taken_at'])]
+
+    def __str__(self):
+        return f"{self.medicine_id} = {self.quantity} @ {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class DailySalesSummary(models.Model):
+    """
+    Sales rollup per day, payment mode and category, kept up to date by
+    ``inventory.rollups`` as sales are made or removed.
+    """
+    date = models.DateField()
+    payment_mode = models.CharField(max_length=20, choices=Sale.PAYMENT_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    lines = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_mode', 'category'], name='unique_daily_sales_summary'),
+            # NULLs are distinct in the constraint above, so uncategorized rows need their own.
+            models.UniqueConstraint(
+                fields=['date', 'payment_mode'], condition=models.Q(category__isnull=True),
+                name='unique_daily_sales_summary_uncategorized',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.payment_mode} {self.category_id}: {self.revenue}"
+
+
+class ArchivedMonth(models.Model):
+    """
+    A month of sales moved out of the live tables into a compressed file
+    under ``SALES_ARCHIVE_DIR`` by ``inventory.archive``. The daily rollup
+    rows of the month are kept.
+    """
+    month = models.DateField(unique=True)  # first day of the month
+    filename = models.CharField(max_length=100)
+    sales = models.PositiveIntegerField(default=0)
+    lines = models.PositiveIntegerField(default=0)
+    voided_lines = models.PositiveIntegerField(default=0)  # lines of voided sales, left out of exports
+    first_sale_id = models.BigIntegerField()
+    last_sale_id = models.BigIntegerField()
+    size = models.PositiveBigIntegerField(default=0)  # bytes on disk
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['first_sale_id', 'last_sale_id'], name='archived_month_sale_ids_idx')]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.sales} sales in {self.filename}"
+
+
+class DemandForecast(models.Model):
+    """
+    Latest demand forecast and reorder point of a medicine, written for the
+    whole catalog at once by ``inventory.forecasting`` (``forecast_demand``).
+    Demand is in units per day.
+    """
+    medicine = models.OneToOneField(Medicine, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    moving_average = models.FloatField()
+    smoothed = models.FloatField()
+    deviation = models.FloatField()
+    days_of_cover = models.FloatField(null=True, blank=True)  # null: no recent demand
+    reorder_point = models.PositiveIntegerField()
+    reorder_quantity = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.medicine_id}: {self.smoothed:.2f}/day, reorder at {self.reorder_point}"
+
+
+class Job(models.Model):
+    """
+    A background job: a heavy export, recount or rebuild queued from a
+    request and run by the ``run_jobs`` worker (see ``inventory.jobs``).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    message = models.CharField(max_length=200, blank=True)
+    result = models.CharField(max_length=255, blank=True)  # file name under JOB_RESULTS_DIR
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} ({self.status}, {self.progress}%)"
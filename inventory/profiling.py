@@ -0,0 +1,255 @@
+"""
+Per-request SQL and timing instrumentation.
+
+``install_wrapper`` adds an execute wrapper to every database connection as
+it opens. While ``ProfilingMiddleware`` handles a request (sync or async)
+the wrapper feeds that request's ``RequestProfile`` - found through a
+context variable, so queries run from ``sync_to_async`` threads count too -
+which records the number of queries, time spent in the database (session reads and writes counted
+apart), time spent rendering templates and how often each SQL statement
+ran. It then:
+
+* adds a ``Server-Timing`` header (``db``, ``session``, ``tpl``, ``app``),
+* logs statements repeated ``PROFILING_REPEATED_QUERY_THRESHOLD`` times or
+  more in one request (the usual N+1 signature),
+* logs a sample of requests slower than ``PROFILING_SLOW_REQUEST_MS`` with
+  their most expensive statements, and
+* keeps per-view totals in process, served by ``stats()``.
+
+None of this depends on ``DEBUG``. Template time is measured by
+``TimedDjangoTemplates``, a drop-in for the ``DjangoTemplates`` backend;
+it includes queries that templates trigger by evaluating lazy querysets.
+"""
+import logging
+import random
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+SESSION_TABLE = '"django_session"'
+
+_current = ContextVar('inventory_request_profile', default=None)
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _setting(name, default):
+    return getattr(settings, f'PROFILING_{name}', default)
+
+
+class RequestProfile:
+    """Query and template timings of one request; also the execute wrapper itself."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.session_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = defaultdict(lambda: [0, 0.0])  # sql -> [count, ms]
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (perf_counter() - start) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            if SESSION_TABLE in sql:
+                self.session_ms += elapsed
+            statement = self.statements[sql]
+            statement[0] += 1
+            statement[1] += elapsed
+
+    def repeated(self, threshold):
+        """``[(sql, count)]`` of statements run at least ``threshold`` times."""
+        return sorted(
+            ((sql, count) for sql, (count, _) in self.statements.items() if count >= threshold),
+            key=lambda item: -item[1],
+        )
+
+    def top_queries(self, limit=5):
+        """``[(sql, count, ms)]`` of the most expensive statements."""
+        ranked = sorted(self.statements.items(), key=lambda item: -item[1][1])[:limit]
+        return [(sql, count, round(ms, 2)) for sql, (count, ms) in ranked]
+
+
+def current_profile():
+    return _current.get()
+
+
+def _record(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_wrapper(sender=None, connection=None, **kwargs):
+    """``connection_created`` receiver adding the profiling execute wrapper once per connection."""
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` backend that adds render time to the current request profile."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        start = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile = _current.get()
+            if profile is not None:
+                profile.template_ms += (perf_counter() - start) * 1000
+
+
+# -----------------------------
+# MIDDLEWARE
+# -----------------------------
+
+class ProfilingMiddleware:
+    """
+    Put this first in ``MIDDLEWARE`` so the session save done by
+    ``SessionMiddleware`` on the way out is measured too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, start = RequestProfile(), perf_counter()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, profile, start)
+
+    async def __acall__(self, request):
+        profile, start = RequestProfile(), perf_counter()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, profile, start)
+
+    def process(self, request, response, profile, start):
+        if _setting('SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(profile, (perf_counter() - start) * 1000)
+        if not response.streaming:
+            finish(request, profile, (perf_counter() - start) * 1000)
+        elif response.is_async:
+            response.streaming_content = self._astream(response.streaming_content, request, profile, start)
+        else:
+            response.streaming_content = self._stream(response.streaming_content, request, profile, start)
+        return response
+
+    def _stream(self, content, request, profile, start):
+        token = _current.set(profile)
+        try:
+            yield from content
+        finally:
+            _current.reset(token)
+        finish(request, profile, (perf_counter() - start) * 1000)
+
+    async def _astream(self, content, request, profile, start):
+        token = _current.set(profile)
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            _current.reset(token)
+        finish(request, profile, (perf_counter() - start) * 1000)
+
+
+def server_timing(profile, total_ms):
+    return ', '.join([
+        f'db;dur={profile.db_ms:.1f};desc="{profile.queries} queries"',
+        f'session;dur={profile.session_ms:.1f}',
+        f'tpl;dur={profile.template_ms:.1f}',
+        f'app;dur={total_ms:.1f}',
+    ])
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match._func_path) if match else 'unresolved'
+
+
+def finish(request, profile, total_ms):
+    """Log repeated and slow requests and fold the request into the per-view stats."""
+    view = _view_name(request)
+    repeated = profile.repeated(_setting('REPEATED_QUERY_THRESHOLD', 5))
+    for sql, count in repeated:
+        logger.warning("Repeated query in %s %s (%s): %d x %s", request.method, request.path, view, count, sql)
+
+    slow = total_ms >= _setting('SLOW_REQUEST_MS', 500)
+    if slow and random.random() < _setting('SAMPLE_RATE', 1.0):
+        top = '\n'.join(
+            f"  {ms:8.2f} ms  {count:4d} x  {sql}" for sql, count, ms in profile.top_queries(_setting('TOP_QUERIES', 5))
+        )
+        logger.warning(
+            "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, templates %.1f ms\n%s",
+            request.method, request.path, view, total_ms, profile.queries, profile.db_ms, profile.template_ms, top,
+        )
+
+    with _stats_lock:
+        row = _stats.setdefault(view, {
+            'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'queries': 0, 'db_ms': 0.0,
+            'session_ms': 0.0, 'template_ms': 0.0, 'slow': 0, 'repeated_queries': 0,
+        })
+        row['requests'] += 1
+        row['total_ms'] += total_ms
+        row['max_ms'] = max(row['max_ms'], total_ms)
+        row['queries'] += profile.queries
+        row['db_ms'] += profile.db_ms
+        row['session_ms'] += profile.session_ms
+        row['template_ms'] += profile.template_ms
+        row['slow'] += slow
+        row['repeated_queries'] += len(repeated)
+
+
+def stats():
+    """Per-view request counts, averages and maxima since the process started."""
+    with _stats_lock:
+        rows = {view: dict(row) for view, row in _stats.items()}
+    for row in rows.values():
+        requests = row['requests']
+        for key in ('total_ms', 'queries', 'db_ms', 'session_ms', 'template_ms'):
+            row[f'avg_{key}'] = round(row.pop(key) / requests, 2)
+        row['max_ms'] = round(row['max_ms'], 2)
+    return rows
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
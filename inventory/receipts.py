@@ -0,0 +1,187 @@
+"""
+Receipt snapshots and their cached text/HTML renderings.
+
+A sale never changes once it is finished, so its receipt is frozen into a
+``Receipt`` row at checkout and the rendered output is cached by sale id.
+Reprints are then served from the cache, or from the single snapshot row.
+Voiding a sale stamps its snapshot with ``voided_at`` and moves the cached
+renderings to a new version (``inventory.versions``), so no worker serves
+the receipt as not voided.
+Receipts of archived sales are read back from the archive files.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import versions
+from .models import Receipt, Sale, SaleItem
+
+CACHE_TIMEOUT = 60 * 60 * 24
+VERSION_NAME = 'receipts'
+TEXT = 'text'
+HTML = 'html'
+
+
+def _money(value):
+    return f"{Decimal(value):.2f}"
+
+
+def snapshot_data(sale, lines):
+    """
+    Build receipt data for ``sale`` from ``(name, quantity, price, unit_cost)``
+    tuples. Money is stored as strings so the JSON round-trips exactly.
+    """
+    rows, total, profit = [], Decimal('0'), Decimal('0')
+    for name, quantity, price, unit_cost in lines:
+        subtotal = price * quantity
+        rows.append([name, quantity, _money(price), _money(subtotal)])
+        total += subtotal
+        profit += (price - unit_cost) * quantity
+    data = {
+        'sale_date': sale.sale_date.isoformat(),
+        'payment_mode': sale.payment_mode,
+        'lines': rows,
+        'total': _money(total),
+        'profit': _money(profit),
+    }
+    voided_at = getattr(sale, 'voided_at', None)  # the 0006 data migration passes historical models
+    if voided_at:
+        data['voided_at'] = voided_at.isoformat()
+    return data
+
+
+def freeze(sale, lines):
+    """Store the receipt snapshot for a just-finished sale."""
+    return Receipt.objects.create(sale=sale, data=snapshot_data(sale, lines))
+
+
+def mark_voided(sales):
+    """
+    Stamp the snapshots of voided ``sales`` so reprints say so (one read, one
+    bulk UPDATE) and retire the cached renderings of every process.
+    """
+    voided_at = {sale.pk: sale.voided_at.isoformat() for sale in sales}
+    snapshots = list(Receipt.objects.filter(sale_id__in=list(voided_at)))
+    for receipt in snapshots:
+        receipt.data['voided_at'] = voided_at[receipt.sale_id]
+    Receipt.objects.bulk_update(snapshots, ['data'])
+    versions.bump(VERSION_NAME)
+
+
+def _sale_lines(sale_id):
+    return (
+        SaleItem.objects.filter(sale_id=sale_id)
+        .order_by('pk')
+        .values_list('medicine__name', 'quantity', 'price', Coalesce('unit_cost', F('medicine__buying_price')))
+    )
+
+
+def get_data(sale_id):
+    """
+    Return the receipt data for ``sale_id``, or ``None`` if the sale does not
+    exist. Sales recorded before snapshots existed are frozen on first use.
+    """
+    data = Receipt.objects.filter(sale_id=sale_id).values_list('data', flat=True).first()
+    if data is None:
+        sale = Sale.objects.filter(pk=sale_id).first()
+        if sale is None:
+            from . import archive  # archive builds its snapshots with this module
+
+            return archive.receipt_data(sale_id)
+        data = freeze(sale, _sale_lines(sale_id)).data
+    return data
+
+
+def render_text(data):
+    sale_date = timezone.localtime(datetime.fromisoformat(data['sale_date']))
+    parts = ["--- PHARMACY RECEIPT ---\n\n"]
+    parts.extend(f"{name} - {quantity} x {price} = {subtotal}\n" for name, quantity, price, subtotal in data['lines'])
+    parts.append(
+        f"\nTotal Price: {data['total']}\nPayment Mode: {data['payment_mode']}\n"
+        f"Date: {sale_date:%Y-%m-%d %H:%M}\n\n-------------------------\nThank you for shopping with us!"
+    )
+    if data.get('voided_at'):
+        voided_at = timezone.localtime(datetime.fromisoformat(data['voided_at']))
+        parts.insert(1, f"*** VOIDED {voided_at:%Y-%m-%d %H:%M} ***\n\n")
+    return ''.join(parts)
+
+
+def html_context(sale_id, data):
+    return {
+        'sale': {
+            'id': sale_id,
+            'payment_mode': data['payment_mode'],
+            'sale_date': datetime.fromisoformat(data['sale_date']),
+            'voided_at': datetime.fromisoformat(data['voided_at']) if data.get('voided_at') else None,
+        },
+        'sale_items': [
+            {'medicine': {'name': name}, 'quantity': quantity, 'price': Decimal(price), 'total': Decimal(subtotal)}
+            for name, quantity, price, subtotal in data['lines']
+        ],
+        'total_price': Decimal(data['total']),
+        'profit': Decimal(data['profit']),
+        'show_back_button': False,
+    }
+
+
+def render_html(sale_id, data):
+    return render_to_string('inventory/sale_receipt.html', html_context(sale_id, data))
+
+
+def _cache_key(version, sale_id, fmt):
+    return f'receipt:{version}:{sale_id}:{fmt}'
+
+
+def _render(sale_id, data, fmt):
+    return render_text(data) if fmt == TEXT else render_html(sale_id, data)
+
+
+def rendered(sale_id, fmt):
+    """
+    Return the cached ``TEXT`` or ``HTML`` rendering of a receipt, rendering
+    and caching it on a miss. Returns ``None`` if the sale does not exist.
+    """
+    key = _cache_key(versions.get(VERSION_NAME), sale_id, fmt)
+    output = cache.get(key)
+    if output is None:
+        data = get_data(sale_id)
+        if data is None:
+            return None
+        output = _render(sale_id, data, fmt)
+        cache.set(key, output, CACHE_TIMEOUT)
+    return output
+
+
+async def arendered(sale_id, fmt):
+    """Async ``rendered``: cache and snapshot reads never block the event loop."""
+    key = _cache_key(await versions.aget(VERSION_NAME), sale_id, fmt)
+    output = await cache.aget(key)
+    if output is None:
+        data = await Receipt.objects.filter(sale_id=sale_id).values_list('data', flat=True).afirst()
+        if data is None:
+            # Rare: a sale from before snapshots (frozen on first use) or an archived one.
+            data = await sync_to_async(get_data)(sale_id)
+            if data is None:
+                return None
+        output = _render(sale_id, data, fmt)
+        await cache.aset(key, output, CACHE_TIMEOUT)
+    return output
+
+
+def stream_text(receipts, separator='\n\n\f\n'):
+    """
+    Yield the text rendering of every receipt in ``receipts`` (a ``Receipt``
+    queryset), reading the snapshots in chunks from a single query.
+    """
+    first = True
+    for data in receipts.order_by('sale_id').values_list('data', flat=True).iterator(chunk_size=500):
+        if not first:
+            yield separator
+        first = False
+        yield render_text(data)
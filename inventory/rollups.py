@@ -0,0 +1,209 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, Max, Min, Q, Sum, Value, When,
+)
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import analytics, archive
+from .models import Category, DailySalesSummary, Sale, SaleItem
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+
+
+def line_totals(lines):
+    """
+    Group ``(category_id, price, unit_cost, quantity)`` tuples into the rollup
+    columns for each category.
+    """
+    totals = defaultdict(lambda: {'revenue': ZERO, 'cost': ZERO, 'units': 0, 'lines': 0})
+    for category_id, price, unit_cost, quantity in lines:
+        row = totals[category_id]
+        row['revenue'] += price * quantity
+        row['cost'] += unit_cost * quantity
+        row['units'] += quantity
+        row['lines'] += 1
+    return totals
+
+
+def sale_lines(sale):
+    return SaleItem.objects.filter(sale=sale).values_list(
+        'medicine__category_id', 'price', Coalesce('unit_cost', 'medicine__buying_price'), 'quantity',
+    )
+
+
+def _add(rows, totals, sign):
+    """Add ``sign`` times ``totals`` to the matching ``rows`` in one UPDATE; returns the rows changed."""
+    def by_category(value, output_field):
+        whens = [
+            When(category__isnull=True, then=Value(sign * value(row)))
+            if category_id is None else When(category_id=category_id, then=Value(sign * value(row)))
+            for category_id, row in totals.items()
+        ]
+        return Case(*whens, default=Value(0), output_field=output_field)
+
+    ids = [category_id for category_id in totals if category_id is not None]
+    matching = Q(category_id__in=ids) | Q(category__isnull=True) if None in totals else Q(category_id__in=ids)
+    return rows.filter(matching).update(
+        revenue=F('revenue') + by_category(lambda row: row['revenue'], MONEY),
+        cost=F('cost') + by_category(lambda row: row['cost'], MONEY),
+        profit=F('profit') + by_category(lambda row: row['revenue'] - row['cost'], MONEY),
+        units=F('units') + by_category(lambda row: row['units'], IntegerField()),
+        lines=F('lines') + by_category(lambda row: row['lines'], IntegerField()),
+    )
+
+
+def apply(day, payment_mode, totals, sign=1):
+    """
+    Add (``sign=1``) or subtract (``sign=-1``) grouped totals for one day:
+    one UPDATE for all the categories, whatever their number. When some of
+    the rows do not exist yet, that update is taken back, the missing rows
+    are created empty (rows another worker created first are skipped) and
+    the update runs again - four queries.
+    """
+    if not totals:
+        return
+    rows = DailySalesSummary.objects.filter(date=day, payment_mode=payment_mode)
+    if _add(rows, totals, sign) == len(totals):
+        return
+    _add(rows, totals, -sign)
+    DailySalesSummary.objects.bulk_create(
+        [DailySalesSummary(date=day, payment_mode=payment_mode, category_id=category_id) for category_id in totals],
+        ignore_conflicts=True,
+    )
+    _add(rows, totals, sign)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    """
+    Fold the rows of a deleted category into the uncategorized rows of the
+    same day and payment mode; clearing their category would duplicate them.
+    """
+    rows = DailySalesSummary.objects.filter(category=instance)
+    for row in rows:
+        apply(row.date, row.payment_mode, {None: {
+            'revenue': row.revenue, 'cost': row.cost, 'units': row.units, 'lines': row.lines,
+        }})
+    if rows.delete()[0]:
+        analytics.invalidate()
+
+
+def add_sale(sale, lines=None):
+    """Fold a new sale into its day's rollup rows."""
+    lines = sale_lines(sale) if lines is None else lines
+    apply(timezone.localdate(sale.sale_date), sale.payment_mode, line_totals(lines))
+
+
+def remove_sales(sales):
+    """
+    Take voided sales back out of their days' rollup rows. The lines of all
+    of them are read in one query and subtracted per day and payment mode.
+    """
+    by_sale = {sale.pk: (timezone.localdate(sale.sale_date), sale.payment_mode) for sale in sales}
+    grouped = defaultdict(list)
+    lines = SaleItem.objects.filter(sale_id__in=list(by_sale)).values_list(
+        'sale_id', 'medicine__category_id', 'price', Coalesce('unit_cost', 'medicine__buying_price'), 'quantity',
+    )
+    for sale_id, *line in lines:
+        grouped[by_sale[sale_id]].append(line)
+    for (day, payment_mode), day_lines in grouped.items():
+        apply(day, payment_mode, line_totals(day_lines), sign=-1)
+    analytics.invalidate()
+
+
+def totals(**filters):
+    """Aggregate revenue, cost, profit and units over the matching rollup rows."""
+    result = DailySalesSummary.objects.filter(**filters).aggregate(
+        revenue=Sum('revenue', default=ZERO),
+        cost=Sum('cost', default=ZERO),
+        profit=Sum('profit', default=ZERO),
+        units=Sum('units', default=0),
+    )
+    for key in ('revenue', 'cost', 'profit'):
+        result[key] = result[key].quantize(CENTS)
+    return result
+
+
+def _extent():
+    """First and last day with rollup rows or unvoided sales, or ``(None, None)``."""
+    rows = DailySalesSummary.objects.aggregate(first=Min('date'), last=Max('date'))
+    sales = Sale.objects.filter(voided_at__isnull=True).aggregate(first=Min('sale_date'), last=Max('sale_date'))
+    firsts = [day for day in (rows['first'], sales['first'] and timezone.localdate(sales['first'])) if day]
+    lasts = [day for day in (rows['last'], sales['last'] and timezone.localdate(sales['last'])) if day]
+    return (min(firsts), max(lasts)) if firsts else (None, None)
+
+
+def rebuild(start=None, end=None, progress=None):
+    """
+    Recompute the rollup rows between ``start`` and ``end`` (inclusive dates)
+    from the sales tables. Returns the number of rows written. Archived
+    months are no longer in the sales tables, so their rows are kept.
+
+    The range is rebuilt a month at a time, each in its own transaction, so
+    checkouts are not locked out for the whole run; ``progress(done, total,
+    message)`` is called after each month (a job's heartbeat).
+    """
+    live_since = archive.live_since()
+    if live_since and (start is None or start < live_since):
+        start = live_since
+    if start is None or end is None:
+        first, last = _extent()
+        if first is None:
+            return 0
+        start, end = start or first, end or last
+    months = []
+    month = archive.month_start(start)
+    while month <= end:
+        months.append(month)
+        month = archive.next_month(month)
+    written = 0
+    for done, month in enumerate(months, 1):
+        written += _rebuild(max(start, month), min(end, archive.next_month(month) - timedelta(days=1)))
+        if progress:
+            progress(done, len(months), f"{month:%Y-%m} rebuilt")
+    return written
+
+
+@transaction.atomic
+def _rebuild(start, end):
+    DailySalesSummary.objects.filter(date__gte=start, date__lte=end).delete()
+    items = SaleItem.objects.filter(
+        sale__voided_at__isnull=True, sale__sale_date__date__gte=start, sale__sale_date__date__lte=end,
+    )
+
+    line_cost = ExpressionWrapper(Coalesce('unit_cost', 'medicine__buying_price') * F('quantity'), output_field=MONEY)
+    grouped = (
+        items.annotate(day=TruncDate('sale__sale_date'))
+        .values('day', 'sale__payment_mode', 'medicine__category')
+        .annotate(
+            revenue=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=MONEY)),
+            cost=Sum(line_cost),
+            units=Sum('quantity'),
+            lines=Count('id'),
+        )
+        .order_by()
+    )
+    rows = DailySalesSummary.objects.bulk_create(
+        DailySalesSummary(
+            date=row['day'],
+            payment_mode=row['sale__payment_mode'],
+            category_id=row['medicine__category'],
+            revenue=row['revenue'],
+            cost=row['cost'],
+            profit=row['revenue'] - row['cost'],
+            units=row['units'],
+            lines=row['lines'],
+        )
+        for row in grouped.iterator()
+    )
+    analytics.invalidate()
+    return len(rows)
@@ -0,0 +1,141 @@
+"""
+Primary/replica routing for reporting reads.
+
+With a ``replica`` database configured (``REPLICA_DATABASE_URL``, see
+settings), views decorated with ``@reporting`` - the dashboard, the sales
+history, its API and the exports - read from the replica so long scans stay off the database
+that checkout writes to. Everything else, and every write, uses ``default``.
+
+Read-your-writes: ``ReplicaRoutingMiddleware`` notes when a request writes
+inventory data and then sets a short-lived cookie. While it is present
+(``REPLICA_STICKY_SECONDS``), and for the rest of the writing request,
+that user's reporting reads stay on the primary, so a sale shows up in the
+sales list the moment it is made even if the replica is lagging.
+
+Without a replica every method returns ``default`` and nothing changes.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'pin_primary'
+
+_request = ContextVar('inventory_request_routing', default=None)
+_reads = ContextVar('inventory_read_database', default=None)
+
+
+class RequestRouting:
+    """Routing state of one request; the router marks it when a write happens."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+    @property
+    def on_primary(self):
+        return self.pinned or self.wrote
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+def reporting_database():
+    """The alias reporting reads should use right now."""
+    state = _request.get()
+    if state is not None and state.on_primary:
+        return DEFAULT_DB_ALIAS
+    return replica_alias() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads(alias=None):
+    """Send ORM reads inside the block to the replica (or to ``alias``)."""
+    token = _reads.set(alias or reporting_database())
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def _stream_from(alias, content):
+    with replica_reads(alias):
+        yield from content
+
+
+def reporting(view):
+    """
+    Run a sync view with ``replica_reads()``. Streaming responses are
+    iterated after the view returns, so they keep the alias chosen here.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = reporting_database()
+        with replica_reads(alias):
+            response = view(request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = _stream_from(alias, response.streaming_content)
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads go where ``replica_reads()`` says, writes and migrations to ``default``."""
+
+    def db_for_read(self, model, **hints):
+        return _reads.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None and model._meta.app_label == 'inventory':
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Pins a user's reporting reads to the primary for a while after they write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestRouting(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.process(state, response)
+
+    async def __acall__(self, request):
+        state = RequestRouting(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.process(state, response)
+
+    def process(self, state, response):
+        if state.wrote and replica_alias():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 15),
+                httponly=True, samesite='Lax',
+            )
+        return response
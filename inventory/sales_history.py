@@ -0,0 +1,152 @@
+import base64
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Sale, SaleItem
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sale):
+    raw = f"{sale.sale_date.isoformat()}|{sale.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        stamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(stamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid page cursor.")
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@dataclass
+class SalesFilter:
+    query: str = ''
+    medicine_id: int = None
+    payment_mode: str = ''
+    date_from: date = None
+    date_to: date = None
+    voided: bool = False  # list voided sales instead of the others
+
+    @classmethod
+    def from_params(cls, params):
+        medicine = params.get('medicine', '')
+        payment_mode = params.get('payment_mode', '')
+        return cls(
+            query=params.get('q', '').strip(),
+            medicine_id=int(medicine) if medicine.isdigit() else None,
+            payment_mode=payment_mode if payment_mode in dict(Sale.PAYMENT_CHOICES) else '',
+            date_from=_parse_date(params.get('from')),
+            date_to=_parse_date(params.get('to')),
+            voided=params.get('voided') == '1',
+        )
+
+    def as_params(self):
+        """Query-string parameters that reproduce this filter."""
+        params = {
+            'q': self.query,
+            'medicine': self.medicine_id or '',
+            'payment_mode': self.payment_mode,
+            'from': self.date_from.isoformat() if self.date_from else '',
+            'to': self.date_to.isoformat() if self.date_to else '',
+            'voided': '1' if self.voided else '',
+        }
+        return {key: value for key, value in params.items() if value}
+
+    def apply(self, sales):
+        sales = sales.filter(voided_at__isnull=not self.voided)
+        if self.payment_mode:
+            sales = sales.filter(payment_mode=self.payment_mode)
+        if self.date_from:
+            sales = sales.filter(sale_date__gte=timezone.make_aware(datetime.combine(self.date_from, time.min)))
+        if self.date_to:
+            end = timezone.make_aware(datetime.combine(self.date_to + timedelta(days=1), time.min))
+            sales = sales.filter(sale_date__lt=end)
+        # EXISTS keeps one row per sale, so no join + DISTINCT over the history.
+        if self.medicine_id:
+            sales = sales.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'), medicine_id=self.medicine_id)))
+        if self.query:
+            sales = sales.filter(Exists(SaleItem.objects.filter(
+                sale=OuterRef('pk'), medicine__name__icontains=self.query,
+            )))
+        return sales
+
+
+def _line_sum(expression):
+    lines = (
+        SaleItem.objects.filter(sale=OuterRef('pk'))
+        .order_by()
+        .values('sale')
+        .annotate(total=Sum(ExpressionWrapper(expression, output_field=MONEY)))
+        .values('total')
+    )
+    return Subquery(lines, output_field=MONEY)
+
+
+def annotate_totals(sales):
+    """Annotate each sale with ``total_sale`` and ``profit`` from its lines."""
+    unit_cost = Coalesce('unit_cost', 'medicine__buying_price')
+    return sales.annotate(
+        total_sale=_line_sum(F('price') * F('quantity')),
+        profit=_line_sum((F('price') - unit_cost) * F('quantity')),
+    )
+
+
+@dataclass
+class SalesPage:
+    sales: list
+    items: dict = field(default_factory=dict)
+    next_cursor: str = None
+
+
+def sales_page(filters, cursor=None, limit=PAGE_SIZE, sales=None):
+    """
+    Return one page of sales, newest first, using keyset pagination on
+    ``(sale_date, id)``.
+
+    Totals are computed by correlated subqueries that only run for the rows
+    on the page, and the lines of every sale on the page are fetched with one
+    extra query, so a deep page costs the same as the first one.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    sales = filters.apply(Sale.objects.all() if sales is None else sales)
+    if cursor:
+        stamp, pk = decode_cursor(cursor)
+        sales = sales.filter(Q(sale_date__lt=stamp) | Q(sale_date=stamp, pk__lt=pk))
+    rows = list(annotate_totals(sales).order_by('-sale_date', '-pk')[:limit + 1])
+
+    page = SalesPage(sales=rows[:limit])
+    for sale in page.sales:
+        sale.total_sale = (sale.total_sale or ZERO).quantize(CENTS)
+        sale.profit = (sale.profit or ZERO).quantize(CENTS)
+    if len(rows) > limit:
+        page.next_cursor = encode_cursor(page.sales[-1])
+    lines = SaleItem.objects.filter(sale__in=[sale.pk for sale in page.sales]).order_by('pk')
+    items = defaultdict(list)
+    for sale_id, name, quantity, price in lines.values_list('sale_id', 'medicine__name', 'quantity', 'price'):
+        items[sale_id].append((name, quantity, price))
+    page.items = dict(items)
+    return page
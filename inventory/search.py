@@ -0,0 +1,164 @@
+"""
+Medicine search backed by SQLite FTS5, or trigram GIN indexes on PostgreSQL.
+
+On SQLite the ``inventory_medicine_fts`` table holds one row per medicine
+(rowid = medicine id) and is kept in sync by triggers on the medicine table,
+so every save, delete and bulk write is indexed without Python hooks.
+Other databases fall back to ``icontains`` lookups.
+"""
+import re
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Medicine
+
+FTS_TABLE = 'inventory_medicine_fts'
+TYPEAHEAD_LIMIT = 10
+MAX_TYPEAHEAD_LIMIT = 50
+
+SQLITE_INDEX = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(name, manufacturer, tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+]
+SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON inventory_medicine BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, manufacturer) VALUES (new.id, new.name, new.manufacturer);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON inventory_medicine BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, manufacturer ON inventory_medicine BEGIN
+        UPDATE {FTS_TABLE} SET name = new.name, manufacturer = new.manufacturer WHERE rowid = old.id;
+    END""",
+]
+POSTGRES_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS inventory_medicine_name_trgm ON inventory_medicine USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS inventory_medicine_manufacturer_trgm "
+    "ON inventory_medicine USING gin (manufacturer gin_trgm_ops)",
+]
+
+_fts_ready = {}
+
+
+def install(connection):
+    """
+    Create the search index for ``connection`` if it is missing.
+
+    Safe to call repeatedly. SQLite drops triggers when a migration rebuilds
+    the medicine table, so this also runs after every ``migrate`` and
+    repopulates the index whenever a trigger had to be recreated.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_INDEX:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_a_'],
+            )
+            triggers_present = cursor.fetchone()[0] == len(SQLITE_TRIGGERS)
+            for statement in SQLITE_INDEX + SQLITE_TRIGGERS:
+                cursor.execute(statement)
+            if not triggers_present:
+                rebuild(connection)
+    _fts_ready.pop(connection.alias, None)
+
+
+def rebuild(connection):
+    """Reload the SQLite FTS index from the medicine table."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, manufacturer) SELECT id, name, manufacturer FROM inventory_medicine"
+        )
+
+
+def _uses_fts(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_ready[connection.alias] = cursor.fetchone() is not None
+    return _fts_ready[connection.alias]
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must match as a
+    prefix. Returns ``''`` when the query has no searchable words.
+    """
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def filter_medicines(query, medicines=None):
+    """Restrict ``medicines`` to those whose name or manufacturer matches ``query``."""
+    medicines = Medicine.objects.all() if medicines is None else medicines
+    connection = connections[medicines.db]
+    if _uses_fts(connection):
+        expression = match_expression(query)
+        if not expression:
+            return medicines.none()
+        return medicines.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression],
+        ))
+    return medicines.filter(Q(name__icontains=query) | Q(manufacturer__icontains=query))
+
+
+def typeahead(query, limit=TYPEAHEAD_LIMIT):
+    """
+    Return up to ``limit`` best matches for ``query`` as dicts with ``id``,
+    ``name``, ``manufacturer``, ``price`` (a string) and ``stock``.
+    """
+    limit = max(1, min(limit, MAX_TYPEAHEAD_LIMIT))
+    connection = connections[router.db_for_read(Medicine)]
+
+    if _uses_fts(connection):
+        expression = match_expression(query)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""SELECT m.id, m.name, m.manufacturer, m.selling_price, m.quantity
+                    FROM {FTS_TABLE} JOIN inventory_medicine m ON m.id = {FTS_TABLE}.rowid
+                    WHERE {FTS_TABLE} MATCH %s
+                    ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), m.name
+                    LIMIT %s""",
+                [expression, limit],
+            )
+            rows = cursor.fetchall()
+    else:
+        medicines = filter_medicines(query, Medicine.objects.using(connection.alias))
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.search import TrigramSimilarity
+
+            medicines = medicines.annotate(rank=TrigramSimilarity('name', query)).order_by('-rank', 'name')
+        else:
+            medicines = medicines.order_by('name')
+        rows = medicines.values_list('id', 'name', 'manufacturer', 'selling_price', 'quantity')[:limit]
+
+    return [
+        {'id': pk, 'name': name, 'manufacturer': manufacturer, 'price': f"{Decimal(str(price)):.2f}", 'stock': stock}
+        for pk, name, manufacturer, price, stock in rows
+    ]
+
+
+async def atypeahead(query, limit=TYPEAHEAD_LIMIT):
+    """
+    Async ``typeahead``. The FTS query needs a raw cursor, which Django only
+    offers synchronously, so it runs in the request's database thread.
+    """
+    return await sync_to_async(typeahead)(query, limit)
+
+
+def ensure_index(sender, using, **kwargs):
+    """``post_migrate`` receiver that (re)installs the search index."""
+    if router.allow_migrate_model(using, Medicine):
+        install(connections[using])
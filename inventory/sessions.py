@@ -0,0 +1,61 @@
+"""
+Sliding session expiry without a session write per request.
+
+With ``SESSION_SAVE_EVERY_REQUEST`` every page view - every typeahead
+keystroke on the sell page included - rewrote the session row on the
+database checkout writes to. Instead ``SlidingSessionMiddleware`` stamps
+the session with the time it was last saved and marks it modified only
+when that stamp is ``SESSION_REFRESH_AFTER`` seconds old (or the session
+changed anyway); ``SessionMiddleware`` then saves it with a fresh
+``SESSION_COOKIE_AGE`` expiry and cookie. Between refreshes read-only
+requests write nothing, and with the ``cached_db`` engine they are read
+from the cache too.
+
+An idle session therefore expires between ``SESSION_COOKIE_AGE -
+SESSION_REFRESH_AFTER`` and ``SESSION_COOKIE_AGE`` after the last request.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REFRESHED_KEY = '_refreshed_at'
+
+
+def refresh(session, now=None):
+    """Mark ``session`` for saving when it changed or its expiry is stale."""
+    if not session.accessed or session.is_empty():
+        return
+    now = int(now or time.time())
+    stale = now - session.get(REFRESHED_KEY, 0) >= getattr(settings, 'SESSION_REFRESH_AFTER', 0)
+    if session.modified or stale:
+        session[REFRESHED_KEY] = now
+
+
+class SlidingSessionMiddleware:
+    """Goes after ``SessionMiddleware``, so it runs before the session is saved."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.process(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # The session is already loaded if it was accessed, so this does no I/O.
+        self.process(request)
+        return response
+
+    def process(self, request):
+        session = getattr(request, 'session', None)
+        if session is not None:
+            refresh(session)
@@ -0,0 +1,154 @@
+"""
+Checkout stress test: many tills selling the same fast-moving item at once.
+
+``create_items`` adds a handful of medicines with known stock; every
+basket from ``basket`` contains the first ("hot") one most of the time,
+so the tills contend for the same row and it sells out mid-run. ``run``
+posts the baskets to the sell page from ``hammer`` threads, through the
+test client in this process (``ClientSeller``) or a running server
+(``HttpSeller``), and counts sales and stock rejections. ``check`` then
+proves nothing was lost or oversold: each medicine's stock must equal its
+starting stock minus the quantities of its recorded sale lines, and agree
+with the stock ledger and the batches. Against a running server the run
+writes to a real database, so ``cleanup`` voids the run's sales and deletes
+them and its medicines afterwards.
+"""
+import json
+import random
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from . import batches, ledger
+from .checkout import void_sales
+from .db import write_transaction
+from .loadtest import HttpSession, hammer
+from .models import Medicine, Sale, SaleItem
+
+HOT_SHARE = 0.8  # share of baskets that contain the hot item
+MAX_QUANTITY = 3
+
+
+def create_items(count=5, stock=1000):
+    """Add ``count`` medicines for the run; returns ``{medicine_id: starting quantity}``."""
+    stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    start = {}
+    for i in range(count):
+        medicine = Medicine.objects.create(
+            name=f"Stress item {i} ({stamp})", quantity=stock, buying_price=Decimal('1.00'),
+            selling_price=Decimal('2.50'), expiry_date=timezone.localdate() + timedelta(days=365),
+            manufacturer="Stress test",
+        )
+        ledger.record_opening(medicine)
+        start[medicine.pk] = stock
+    return start
+
+
+def basket(rng, medicine_ids, max_lines=3, hot_share=HOT_SHARE):
+    """Sell-page lines for one sale: one to ``max_lines`` medicines, usually including the hot one."""
+    hot, others = medicine_ids[0], medicine_ids[1:]
+    size = rng.randint(1, min(max_lines, len(medicine_ids)))
+    chosen = [hot] if rng.random() < hot_share else []
+    chosen += rng.sample(others, min(size - len(chosen), len(others)))
+    return [{'medicine_id': pk, 'quantity': rng.randint(1, MAX_QUANTITY)} for pk in chosen]
+
+
+class ClientSeller:
+    """Sells through the sell view in this process, with one logged-in test client per thread."""
+
+    def __init__(self, user, concurrency):
+        self.path = reverse('medicine_sell')
+        self.clients = []
+        for _ in range(concurrency):
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+
+    def __call__(self, worker, lines):
+        response = self.clients[worker].post(self.path, {'items': json.dumps(lines), 'payment_mode': 'Cash'})
+        if response.status_code == 302:
+            return True
+        if response.status_code == 200:  # the page came back with the reason, e.g. not enough stock
+            return False
+        raise RuntimeError(f"Unexpected status {response.status_code}")
+
+
+class HttpSeller:
+    """Sells through the sell page of a running server, with one session per thread."""
+
+    def __init__(self, base_url, username, password, concurrency):
+        self.path = reverse('medicine_sell')
+        self.sessions = []
+        for _ in range(concurrency):
+            session = HttpSession(base_url)
+            session.login(username, password)
+            self.sessions.append(session)
+
+    def __call__(self, worker, lines):
+        url, _ = self.sessions[worker].submit(self.path, {'items': json.dumps(lines), 'payment_mode': 'Cash'})
+        # A sale redirects to its receipt; a rejected basket re-renders the sell page.
+        return '/sales/receipt/' in url
+
+
+def run(sell, medicine_ids, concurrency=20, sales=2000, max_lines=3, seed=0):
+    """
+    Post ``sales`` baskets through ``sell(worker, lines)`` (True when sold) from
+    ``concurrency`` threads. Returns the ``hammer`` summary plus the counts of
+    sold and rejected baskets and the sales per second.
+    """
+    medicine_ids = list(medicine_ids)
+    rngs = [random.Random(seed * 1000 + worker) for worker in range(concurrency)]
+    counts = {'sold': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def call(worker):
+        outcome = 'sold' if sell(worker, basket(rngs[worker], medicine_ids, max_lines)) else 'rejected'
+        with lock:
+            counts[outcome] += 1
+
+    result = hammer('checkout', call, concurrency=concurrency, requests=sales, finish=connections.close_all)
+    result.update(counts)
+    result['sales_per_second'] = round(counts['sold'] / result['seconds'], 1) if result['seconds'] else None
+    return result
+
+
+def check(start):
+    """
+    Problems with the stock of the run's medicines (``{medicine_id: starting
+    quantity}``) after it; an empty list when every unit sold is accounted for.
+    """
+    medicines = Medicine.objects.filter(pk__in=list(start))
+    sold = dict(
+        SaleItem.objects.filter(medicine_id__in=list(start), sale__voided_at__isnull=True)
+        .values_list('medicine_id').annotate(units=Sum('quantity')).order_by()
+    )
+    problems = []
+    for pk, name, quantity in medicines.order_by('pk').values_list('pk', 'name', 'quantity'):
+        expected = start[pk] - sold.get(pk, 0)
+        if quantity != expected:
+            problems.append(f"{name}: stock {quantity}, expected {start[pk]} - {sold.get(pk, 0)} sold = {expected}")
+    for name, quantity, balance in ledger.reconcile(medicines).values_list('name', 'quantity', 'ledger_quantity'):
+        problems.append(f"{name}: stock {quantity}, ledger {balance}")
+    for name, quantity, balance in batches.reconcile(medicines).values_list('name', 'quantity', 'batch_quantity'):
+        problems.append(f"{name}: stock {quantity}, batches {balance}")
+    return problems
+
+
+def cleanup(start):
+    """
+    Remove the run's medicines (``{medicine_id: starting quantity}``) and
+    their sales. The sales are voided first, which takes them back out of
+    the daily rollups. Returns the number of sales removed.
+    """
+    sale_ids = list(SaleItem.objects.filter(medicine_id__in=list(start)).values_list('sale_id', flat=True).distinct())
+    void_sales(sale_ids, note="Stress test cleanup")
+    with write_transaction():
+        Sale.objects.filter(pk__in=sale_ids).delete()
+        Medicine.objects.filter(pk__in=list(start)).delete()
+    return len(sale_ids)
@@ -0,0 +1,83 @@
+"""
+Catalog sync for the sell page: a compact snapshot plus deltas.
+
+Tills keep a local copy of what can be sold (id, name, price and stock)
+instead of receiving the whole catalog inside every page. The copy is
+columnar JSON - column names once, then one array per medicine - and
+carries a version:
+
+* ``snapshot()`` is the whole catalog. It is serialized once per catalog
+  version and cached with the other catalog snapshots.
+* ``changes(since)`` is only the medicines changed after version ``since``,
+  plus the ids of deleted ones.
+
+Versions come from ``CatalogChange``: every write to a medicine's name,
+price or stock replaces its row, so the table has one row per medicine and
+its largest id is the catalog version. The rows are written in the same
+transaction as the change; on SQLite writers are serialized (see
+``inventory.db``), so versions become visible in order. On a PostgreSQL
+primary sequence ids can commit out of order: a till may then miss a change
+committed after a larger id it already has, until its next full snapshot.
+"""
+import json
+
+from django.db.models import Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog
+from .models import CatalogChange, Medicine
+
+COLUMNS = ['id', 'name', 'price', 'stock']
+SEPARATORS = (',', ':')
+
+
+def record(medicine_ids):
+    """Give the medicines a new version; call inside the transaction that changed them."""
+    medicine_ids = sorted(set(medicine_ids))
+    if medicine_ids:
+        CatalogChange.objects.filter(medicine_id__in=medicine_ids).delete()
+        CatalogChange.objects.bulk_create([CatalogChange(medicine_id=pk) for pk in medicine_ids])
+
+
+@receiver([post_save, post_delete], sender=Medicine)
+def medicine_changed(sender, instance, **kwargs):
+    record([instance.pk])
+
+
+def current_version():
+    """The catalog version: one indexed MAX, read fresh so every process agrees."""
+    return CatalogChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def _rows(medicines):
+    return [
+        [pk, name, f"{price:.2f}", quantity]
+        for pk, name, price, quantity in medicines.values_list('id', 'name', 'selling_price', 'quantity')
+    ]
+
+
+def _dumps(payload):
+    return json.dumps(payload, separators=SEPARATORS)
+
+
+def snapshot():
+    """``(version, json)`` of the whole catalog, ordered by name."""
+    def build():
+        # The version is read first: a change racing the read shows up again in the next delta.
+        version = current_version()
+        rows = _rows(Medicine.objects.order_by('name', 'pk'))
+        return version, _dumps({'version': version, 'full': True, 'columns': COLUMNS, 'rows': rows, 'deleted': []})
+    return catalog.cached('sync_snapshot', build)
+
+
+def changes(since, version):
+    """JSON of the medicines changed or deleted after version ``since``, up to ``version``."""
+    changed = set(
+        CatalogChange.objects.filter(id__gt=since, id__lte=version).values_list('medicine_id', flat=True)
+    )
+    rows = _rows(Medicine.objects.filter(pk__in=changed).order_by('name', 'pk')) if changed else []
+    deleted = sorted(changed - {row[0] for row in rows})
+    return _dumps({
+        'version': version, 'since': since, 'full': False, 'columns': COLUMNS, 'rows': rows, 'deleted': deleted,
+    })
@@ -1,3 +1,709 @@
-from django.test import TestCase
+import csv
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.utils.connection import ConnectionDoesNotExist
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analytics, archive, batches, benchmarks, catalog, dashboard, exports, forecasting, importer, jobs, ledger,
+    profiling, receipts, rollups, routers, search, sessions, stress, versions,
+)
+from .checkout import checkout, void_sales
+from .loadtest import hammer
+from .models import ArchivedMonth, Category, DailySalesSummary, Job, Medicine, Sale, SaleItem
+
+
+def make_medicine(name="Medicine", quantity=50, **fields):
+    """A medicine in stock for a year, with its opening quantity recorded on the ledger."""
+    fields = {
+        'buying_price': Decimal('1.00'), 'selling_price': Decimal('2.50'),
+        'expiry_date': date.today() + timedelta(days=365), 'manufacturer': "Test", **fields,
+    }
+    medicine = Medicine.objects.create(name=name, quantity=quantity, **fields)
+    ledger.record_opening(medicine)
+    return medicine
+
+
+class ViewQueryBudgetTests(TestCase):
+    """Every inventory URL stays within its query budget on a small seeded pharmacy."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = benchmarks.seed(medicines=120, sales=80, items_per_sale=3, categories=5)
+        cls.user = User.objects.create_user('benchmark', password='benchmark')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.cases = benchmarks.cases(self.dataset, self.user)
+        self.enterContext(override_settings(JOB_RESULTS_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def test_every_url_has_a_case(self):
+        self.assertEqual(benchmarks.uncovered_url_names(self.cases), set())
+
+    def test_views_within_query_budgets(self):
+        report = benchmarks.run(self.client, self.cases, self.dataset, repeat=2)
+        for name, result in report['views'].items():
+            with self.subTest(view=name):
+                self.assertLess(result['status'], 400)
+                self.assertLessEqual(result['queries'], result['budget'])
+        self.assertEqual(benchmarks.over_budget(report), [])
+
+
+class BenchmarkReportTests(TestCase):
+    def report(self, **views):
+        return {'meta': {}, 'views': {
+            name: {'status': 200, 'queries': queries, 'budget': 5, 'median_ms': median_ms}
+            for name, (queries, median_ms) in views.items()
+        }}
+
+    def test_compare_flags_extra_queries_and_slowdowns(self):
+        baseline = self.report(a=(3, 10.0), b=(3, 10.0), c=(3, 10.0))
+        current = self.report(a=(4, 10.0), b=(3, 20.0), c=(3, 11.0))
+        self.assertEqual(
+            benchmarks.compare(baseline, current),
+            ["a: queries 3 -> 4", "b: median 10.0ms -> 20.0ms"],
+        )
+
+    def test_over_budget(self):
+        self.assertEqual(benchmarks.over_budget(self.report(a=(6, 1.0), b=(5, 1.0))), [('a', 6, 5)])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Several threads, each with its own connection, selling from the same file database."""
+
+    THREADS = 8
+    SALES = 240
+
+    def setUp(self):
+        self.medicines = [make_medicine(f"Medicine {i}", quantity=1000) for i in range(5)]
+
+    def sell(self, worker):
+        lines = [
+            {'medicine_id': self.medicines[worker % 5].pk, 'quantity': 2},
+            {'medicine_id': self.medicines[(worker + 1) % 5].pk, 'quantity': 1},
+        ]
+        checkout(lines, payment_mode='Cash')
+
+    def assert_consistent(self, result):
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(Sale.objects.count(), self.SALES)
+        sold = SaleItem.objects.aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(sold, self.SALES * 3)
+        self.assertEqual(Medicine.objects.aggregate(total=Sum('quantity'))['total'], 5000 - sold)
+        self.assertFalse(ledger.reconcile().exists())
+        self.assertFalse(batches.reconcile().exists())
+
+    def run_checkouts(self):
+        return hammer('checkout', self.sell, concurrency=self.THREADS, requests=self.SALES,
+                      finish=connections.close_all)
+
+    def test_connection_uses_wal(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_checkout_begins_immediate(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.sell(0)
+        self.assertEqual(captured.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_concurrent_writers_without_lock_errors(self):
+        self.assert_consistent(self.run_checkouts())
+
+    @override_settings(SQLITE_WRITE_QUEUE=True)
+    def test_concurrent_writers_through_write_queue(self):
+        self.assert_consistent(self.run_checkouts())
+
+
+@override_settings(PROFILING_SAMPLE_RATE=0)
+class CheckoutStressTests(TransactionTestCase):
+    def test_hot_item_sells_out_without_losing_stock(self):
+        start = stress.create_items(count=3, stock=30)
+        sell = stress.ClientSeller(User.objects.create_user('cashier', password='cashier'), concurrency=4)
+        result = stress.run(sell, start, concurrency=4, sales=80)
+        self.assertEqual((result['errors'], result['sold'] + result['rejected']), (0, 80))
+        self.assertGreater(result['rejected'], 0)  # the hot item ran out
+        self.assertEqual(stress.check(start), [])
+        self.assertEqual(Sale.objects.count(), result['sold'])
+
+        self.assertEqual(stress.cleanup(start), result['sold'])
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(Medicine.objects.exists())
+        self.assertEqual(rollups.totals()['units'], 0)
+
+
+class BadInputTests(TestCase):
+    """Malformed requests get an error message or a 400, never a server error."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager', password='manager'))
+
+    def test_malformed_basket(self):
+        for items in ('5', '{"medicine_id": 1}', '[5]', '[[1, 2]]'):
+            response = self.client.post('/sell/', {'items': items})
+            self.assertEqual(response.status_code, 200, items)
+            self.assertContains(response, "Invalid basket")
+
+    def test_import_that_is_not_utf8(self):
+        upload = SimpleUploadedFile('stock.csv', "name,manufacturer\nCaf\xe9 tabs,Dawa\n".encode('latin-1'))
+        response = self.client.post('/import/', {'file': upload, 'quantity_mode': 'add'})
+        self.assertContains(response, "not UTF-8")
+
+    def test_huge_expiry_window(self):
+        self.assertEqual(self.client.get('/medicines/expiry/', {'days': '999999999'}).status_code, 200)
+
+    def test_expiry_export_window(self):
+        response = self.client.get('/exports/expiry.csv', {'days': '5000000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'medicine_id,'))
+        self.assertEqual(self.client.get('/exports/expiry.csv', {'days': 'soon'}).status_code, 400)
+
+    def test_huge_slow_mover_window(self):
+        response = self.client.get(reverse('analytics_report', args=['slow']), {'days': '999999999'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MedicineImportTests(TestCase):
+    HEADER = "name,manufacturer,quantity,buying_price,selling_price,expiry_date"
+
+    def run_import(self, header, *rows):
+        body = "\n".join([header, *rows]).encode()
+        return importer.import_file(BytesIO(body), 'csv')
+
+    def test_rows_without_a_category_keep_it(self):
+        expiry = date.today() + timedelta(days=365)
+        report = self.run_import(f"{self.HEADER},category", f"Paracetamol,Dawa,10,1.00,2.50,{expiry},Painkillers")
+        self.assertEqual((report.created, report.categories_created), (1, 1))
+        self.run_import(self.HEADER, f"Paracetamol,Dawa,5,1.20,2.80,{expiry}")
+        self.run_import(f"{self.HEADER},category", f"Paracetamol,Dawa,5,1.20,2.80,{expiry},")
+        medicine = Medicine.objects.get()
+        self.assertEqual((medicine.category.name, medicine.quantity), ("Painkillers", 20))
+        self.assertFalse(ledger.reconcile().exists())
+
+
+class MedicineEditTests(TestCase):
+    def test_sale_while_the_form_was_open_is_kept(self):
+        self.client.force_login(User.objects.create_user('manager', password='manager'))
+        medicine = make_medicine(
+            "Ibuprofen 200mg", quantity=10, manufacturer="Dawa", category=Category.objects.create(name="Painkillers"),
+        )
+        self.assertContains(self.client.get(f'/edit/{medicine.pk}/'), 'name="seen_quantity" value="10"')
+        checkout([{'medicine_id': medicine.pk, 'quantity': 3}])
+        self.client.post(f'/edit/{medicine.pk}/', {
+            'category': medicine.category_id, 'name': medicine.name, 'manufacturer': medicine.manufacturer,
+            'quantity': 15, 'seen_quantity': 10, 'buying_price': '1.00', 'selling_price': '2.50',
+            'expiry_date': medicine.expiry_date.isoformat(),
+        })
+        medicine.refresh_from_db()
+        self.assertEqual(medicine.quantity, 12)  # 10 - 3 sold + 5 received
+        self.assertFalse(ledger.reconcile().exists())
+
+    def test_admin_keeps_stock_on_the_ledger(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        fields = {'name': "Cetirizine 10mg", 'manufacturer': "Dawa", 'quantity': 8, 'buying_price': '1.00',
+                  'category': Category.objects.create(name="Antihistamines").pk,
+                  'selling_price': '2.50', 'expiry_date': (date.today() + timedelta(days=365)).isoformat()}
+        self.client.post('/admin/inventory/medicine/add/', fields)
+        medicine = Medicine.objects.get()
+        self.client.post(f'/admin/inventory/medicine/{medicine.pk}/change/', {**fields, 'quantity': 50})
+        medicine.refresh_from_db()
+        self.assertEqual(medicine.quantity, 8)
+        self.assertFalse(ledger.reconcile().exists())
+        self.assertFalse(batches.reconcile().exists())
+
+
+class MedicineSearchTests(TestCase):
+    def setUp(self):
+        self.assertTrue(search._uses_fts(connection))  # otherwise this would only test the icontains fallback
+        self.medicine = make_medicine("Paracetamol 500mg", manufacturer="Dawa")
+        make_medicine("Amoxicillin", manufacturer="Cosmos")
+
+    def found(self, query):
+        return [row['name'] for row in search.typeahead(query)]
+
+    def test_prefix_of_any_word(self):
+        self.assertEqual(list(search.filter_medicines("parac")), [self.medicine])
+        self.assertEqual(self.found("Para 500"), ["Paracetamol 500mg"])
+        self.assertEqual(self.found("cosm"), ["Amoxicillin"])
+        self.assertEqual(self.found("cetamol"), [])  # prefixes only
+        self.assertEqual(self.found("  "), [])
+
+    def test_rename_and_delete_update_the_index(self):
+        self.medicine.name = "Ibuprofen 200mg"
+        self.medicine.save()
+        self.assertEqual(self.found("parac"), [])
+        self.assertEqual(self.found("ibup"), ["Ibuprofen 200mg"])
+
+        self.medicine.delete()
+        self.assertEqual(self.found("ibup"), [])
+        self.assertEqual(list(search.filter_medicines("dawa")), [])
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='cashier'))
+        self.medicine = make_medicine("Paracetamol 500mg")
+        self.addCleanup(profiling.reset_stats)
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/medicines/search/', {'q': 'para'})
+        timings = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['db', 'session', 'tpl', 'app'])
+        self.assertTrue(timings['db'].endswith(f';desc="{len(queries)} queries"'))
+        with self.settings(PROFILING_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get('/medicines/search/', {'q': 'para'}))
+
+    def run_view(self, lookups):
+        def view(request):
+            for _ in range(lookups):  # an N+1 loop
+                Medicine.objects.get(pk=self.medicine.pk)
+            return HttpResponse()
+
+        profiling.ProfilingMiddleware(view)(RequestFactory().get('/loop/'))
+
+    @override_settings(PROFILING_REPEATED_QUERY_THRESHOLD=5, PROFILING_SLOW_REQUEST_MS=60_000)
+    def test_repeated_query_warning(self):
+        with self.assertNoLogs('inventory.profiling', 'WARNING'):
+            self.run_view(4)
+        with self.assertLogs('inventory.profiling', 'WARNING') as logs:
+            self.run_view(5)
+        [message] = logs.output
+        self.assertIn("Repeated query in GET /loop/", message)
+        self.assertIn(': 5 x SELECT', message)
+        self.assertEqual(profiling.stats()['unresolved']['repeated_queries'], 1)
+
+
+class CatalogFragmentTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='cashier'))
+        caches['catalog'].clear()  # the catalog version repeats once each test is rolled back
+        self.medicine = make_medicine("Paracetamol 500mg", category=Category.objects.create(name="Painkillers"))
+
+    def test_version_bump_invalidates_the_fragment(self):
+        self.assertContains(self.client.get('/medicines/'), "Paracetamol 500mg")
+        Medicine.objects.filter(pk=self.medicine.pk).update(name="Panadol")  # no signal, no bump
+        self.assertContains(self.client.get('/medicines/'), "Paracetamol 500mg")
+        catalog.invalidate()
+        response = self.client.get('/medicines/')
+        self.assertContains(response, "Panadol")
+        self.assertNotContains(response, "Paracetamol 500mg")
+
+        self.medicine.refresh_from_db()
+        self.medicine.name = "Calpol"
+        self.medicine.save()  # bumps through the post_save receiver
+        self.assertContains(self.client.get('/medicines/'), "Calpol")
+
+
+class SalesCursorTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager', password='manager'))
+        medicine = make_medicine()
+        sales = [checkout([{'medicine_id': medicine.pk, 'quantity': 1}]) for _ in range(5)]
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Sale.objects.filter(pk__in=[sale.pk for sale in sales[1:4]]).update(sale_date=an_hour_ago)  # ties on the date
+        Sale.objects.filter(pk=sales[0].pk).update(sale_date=an_hour_ago - timedelta(hours=1))
+        self.newest_first = [sale.pk for sale in reversed(sales)]
+
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        seen, params = [], {'limit': 2}
+        while True:
+            page = self.client.get('/medicines/sales/api/', params).json()
+            self.assertLessEqual(len(page['rows']), 2)
+            seen.extend(row[0] for row in page['rows'])
+            if page['next'] is None:
+                break
+            params['cursor'] = page['next']
+        self.assertEqual(seen, self.newest_first)
+
+    def test_bad_cursor(self):
+        response = self.client.get('/medicines/sales/api/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertRedirects(
+            self.client.get('/medicines/sales/', {'cursor': 'not-a-cursor'}), reverse('sales_list'),
+            fetch_redirect_response=False,
+        )
+
+
+class DailySummaryTests(TestCase):
+    def test_one_uncategorized_row_per_day_and_payment_mode(self):
+        category = Category.objects.create(name="Painkillers")
+        today = date.today()
+        line = {'revenue': Decimal('5.00'), 'cost': Decimal('2.00'), 'units': 2, 'lines': 1}
+        rollups.apply(today, 'Cash', {None: line})
+        rollups.apply(today, 'Cash', {None: line, category.pk: line})
+        category.delete()  # its row folds into the uncategorized one
+        row = DailySalesSummary.objects.get()
+        self.assertEqual((row.category_id, row.revenue, row.units, row.lines), (None, Decimal('15.00'), 6, 3))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailySalesSummary.objects.create(date=today, payment_mode='Cash')
+
+    def test_any_number_of_categories_in_a_fixed_number_of_queries(self):
+        categories = [Category.objects.create(name=f"Category {i}").pk for i in range(15)] + [None]
+        line = {'revenue': Decimal('5.00'), 'cost': Decimal('2.00'), 'units': 2, 'lines': 1}
+        today = date.today()
+        with self.assertNumQueries(4):  # the day's first sale creates the rows
+            rollups.apply(today, 'Cash', {pk: line for pk in categories})
+        with self.assertNumQueries(1):
+            rollups.apply(today, 'Cash', {pk: line for pk in categories})
+        with self.assertNumQueries(1):
+            rollups.apply(today, 'Cash', {categories[0]: line, None: line}, sign=-1)
+        self.assertEqual(DailySalesSummary.objects.count(), 16)
+        self.assertEqual(rollups.totals(category=None)['units'], 2)
+        self.assertEqual(rollups.totals()['units'], 2 * 2 * 16 - 2 * 2)
+        self.assertEqual(rollups.totals()['profit'], Decimal('3.00') * (2 * 16 - 2))
+
+    def test_rebuild_reports_progress_a_month_at_a_time(self):
+        medicine = make_medicine()
+        for days_ago in (40, 0):
+            sale = checkout([{'medicine_id': medicine.pk, 'quantity': 2}])
+            Sale.objects.filter(pk=sale.pk).update(sale_date=sale.sale_date - timedelta(days=days_ago))
+        reported = []
+        rollups.rebuild(progress=lambda done, total, message: reported.append((done, total)))
+        self.assertEqual(reported[-1][0], reported[-1][1])
+        self.assertGreaterEqual(len(reported), 2)
+        self.assertEqual(rollups.totals()['units'], 4)
+        self.assertEqual(DailySalesSummary.objects.count(), 2)
+
+
+class ForecastTests(TestCase):
+    def test_forecast_of_a_hand_built_matrix(self):
+        matrix = np.array([[2.0, 2.0, 2.0, 2.0], [0.0, 0.0, 0.0, 0.0]])
+        result = forecasting.forecast(matrix, np.array([5.0, 0.0]), alpha=0.5, lead_time=2, window=4)
+        np.testing.assert_allclose(result['moving_average'], [2, 0])
+        np.testing.assert_allclose(result['smoothed'], [2, 0])  # the weights add up to 1
+        np.testing.assert_allclose(result['deviation'], [0, 0])
+        self.assertEqual(result['days_of_cover'][0], 2.5)
+        self.assertTrue(np.isnan(result['days_of_cover'][1]))
+        self.assertEqual(result['reorder_point'].tolist(), [4, 0])  # 2/day over a 2-day lead time
+        self.assertEqual(result['reorder_quantity'].tolist(), [59, 0])  # up to 4 + 30 days of demand
+
+    def test_daily_units_and_reorder_list(self):
+        selling, idle = make_medicine("Amoxicillin", quantity=12), make_medicine("Idle syrup", quantity=0)
+        yesterday = checkout([{'medicine_id': selling.pk, 'quantity': 4}])
+        Sale.objects.filter(pk=yesterday.pk).update(sale_date=timezone.now() - timedelta(days=1))
+        checkout([{'medicine_id': selling.pk, 'quantity': 5}])
+        void_sales([checkout([{'medicine_id': selling.pk, 'quantity': 1}]).pk])
+
+        today = timezone.localdate()
+        matrix = forecasting.daily_units(np.array([selling.pk, idle.pk]), today - timedelta(days=2), 3)
+        self.assertEqual(matrix.tolist(), [[0, 4, 5], [0, 0, 0]])
+
+        forecasting.run(days=7, today=today + timedelta(days=1))
+        self.assertEqual([row['id'] for row in dashboard.reorder_list()], [selling.pk])  # not the idle one
+
+
+class SaleVoidTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager', password='manager'))
+        self.medicines = [make_medicine(f"Medicine {i}") for i in range(2)]
+        lines = [{'medicine_id': medicine.pk, 'quantity': 3} for medicine in self.medicines]
+        self.sales = [checkout(lines), checkout(lines[:1])]
+
+    def test_void_returns_stock_and_keeps_the_sales(self):
+        response = self.client.post('/sales/void/', {'ids': ','.join(str(sale.pk) for sale in self.sales)})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Medicine.objects.order_by('pk').values_list('quantity', flat=True)), [50, 50])
+        self.assertFalse(Sale.objects.filter(voided_at__isnull=True).exists())
+        self.assertEqual(SaleItem.objects.count(), 3)
+        self.assertEqual(rollups.totals()['units'], 0)
+        self.assertFalse(ledger.reconcile().exists())
+        self.assertFalse(batches.reconcile().exists())
+        self.assertEqual(void_sales([sale.pk for sale in self.sales]), [])  # already voided
+
+    def test_void_requires_post(self):
+        self.assertEqual(self.client.get(f'/sales/void/{self.sales[0].pk}/').status_code, 405)
+        self.assertIsNone(Sale.objects.get(pk=self.sales[0].pk).voided_at)
+
+
+class ReceiptTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='cashier'))
+        self.medicine = make_medicine(
+            "Paracetamol 500mg", buying_price=Decimal('2.00'), selling_price=Decimal('5.00'), manufacturer="Dawa",
+        )
+        self.sale = checkout([{'medicine_id': self.medicine.pk, 'quantity': 3}])
+        caches['default'].clear()  # sale ids and the receipts version repeat once each test is rolled back
+
+    def receipt(self):
+        return self.client.get(f'/sales/receipt/{self.sale.pk}/', {'print': 'true'}).content.decode()
+
+    def pos_receipt(self):
+        return self.client.get(f'/pos/receipts/{self.sale.pk}/', {'format': 'text'}).content.decode()
+
+    def test_voided_after_it_was_rendered(self):
+        self.assertNotIn("VOIDED", self.receipt())
+        self.assertNotIn("VOIDED", self.pos_receipt())
+        void_sales([self.sale.pk])  # in a TestCase no on_commit hook runs, as in another worker
+        self.assertIn("VOIDED", self.receipt())
+        self.assertIn("VOIDED", self.pos_receipt())
+
+    def test_frozen_after_the_medicine_changes(self):
+        self.assertIn("Paracetamol 500mg - 3 x 5.00 = 15.00", self.pos_receipt())
+        Medicine.objects.filter(pk=self.medicine.pk).update(name="Panadol", selling_price=Decimal('7.00'))
+        caches['default'].clear()  # rendered again from the snapshot
+        self.assertIn("Paracetamol 500mg - 3 x 5.00 = 15.00", self.pos_receipt())
+        self.assertNotIn("Panadol", self.receipt())
+        self.assertIn("Panadol - 1 x 7.00 = 7.00", receipts.rendered(
+            checkout([{'medicine_id': self.medicine.pk, 'quantity': 1}]).pk, receipts.TEXT,
+        ))
+
+    def test_void_retires_the_cached_rendering(self):
+        rendered = receipts.rendered(self.sale.pk, receipts.TEXT)
+        old_key = receipts._cache_key(versions.get(receipts.VERSION_NAME), self.sale.pk, receipts.TEXT)
+        self.assertEqual(caches['default'].get(old_key), rendered)
+        void_sales([self.sale.pk])
+        self.assertNotEqual(
+            receipts._cache_key(versions.get(receipts.VERSION_NAME), self.sale.pk, receipts.TEXT), old_key,
+        )
+        self.assertIn("VOIDED", receipts.rendered(self.sale.pk, receipts.TEXT))
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        medicine = make_medicine()
+        today = timezone.localdate()
+        self.start, self.end = today - timedelta(days=3), today - timedelta(days=1)
+        self.sales = []
+        for days_ago, quantity in [(3, 1), (2, 2), (2, 3), (1, 4)]:
+            sale = checkout([{'medicine_id': medicine.pk, 'quantity': quantity}])
+            Sale.objects.filter(pk=sale.pk).update(sale_date=sale.sale_date - timedelta(days=days_ago))
+            self.sales.append(sale)
+        rollups.rebuild()
+
+    def per_day(self):
+        return dict(
+            DailySalesSummary.objects.filter(date__range=(self.start, self.end))
+            .values_list('date').annotate(revenue=Sum('revenue')).order_by()
+        )
+
+    def test_series_matches_the_daily_rows_and_follows_voids(self):
+        rows = analytics.series(self.start, self.end, grain='day')
+        self.assertEqual({row['period']: row['revenue'] for row in rows}, self.per_day())
+        self.assertEqual([row['units'] for row in rows], [1, 5, 4])
+
+        void_sales([self.sales[1].pk])
+        rows = analytics.series(self.start, self.end, grain='day')
+        self.assertEqual({row['period']: row['revenue'] for row in rows}, self.per_day())
+        self.assertEqual([row['units'] for row in rows], [1, 3, 4])
+
+
+class CatalogSyncTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='cashier'))
+        self.medicines = [make_medicine(name, quantity=10) for name in ("Amoxicillin", "Ibuprofen", "Paracetamol")]
+
+    def test_snapshot_then_deltas(self):
+        response = self.client.get('/catalog/sync/')
+        snapshot = response.json()
+        self.assertEqual(snapshot['columns'], ['id', 'name', 'price', 'stock'])
+        self.assertEqual([row[1:] for row in snapshot['rows']][0], ["Amoxicillin", "2.50", 10])
+        self.assertEqual(self.client.get('/catalog/sync/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        checkout([{'medicine_id': self.medicines[1].pk, 'quantity': 4}])
+        deleted = self.medicines[2].pk
+        self.medicines[2].delete()
+        delta = self.client.get('/catalog/sync/', {'since': snapshot['version']}).json()
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['rows'], [[self.medicines[1].pk, "Ibuprofen", "2.50", 6]])
+        self.assertEqual(delta['deleted'], [deleted])
+
+        caught_up = self.client.get('/catalog/sync/', {'since': delta['version']})
+        self.assertEqual(caught_up.json()['rows'], [])
+        self.assertEqual(
+            self.client.get('/catalog/sync/', {'since': delta['version']},
+                            HTTP_IF_NONE_MATCH=caught_up['ETag']).status_code,
+            304,
+        )
+
+
+class SalesArchiveTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(SALES_ARCHIVE_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.client.force_login(User.objects.create_user('manager', password='manager'))
+        self.medicine = make_medicine(
+            "Paracetamol 500mg", buying_price=Decimal('2.00'), selling_price=Decimal('5.00'), manufacturer="Dawa",
+        )
+        self.old = checkout([{'medicine_id': self.medicine.pk, 'quantity': 3}])
+        self.recent = checkout([{'medicine_id': self.medicine.pk, 'quantity': 1}])
+        a_year_ago = timezone.now() - timedelta(days=400)
+        Sale.objects.filter(pk=self.old.pk).update(sale_date=a_year_ago)
+        rollups.rebuild()
+
+    def test_old_months_move_to_the_archive_and_stay_readable(self):
+        totals = rollups.totals()
+        call_command('archive_sales', months=12, stdout=StringIO())
+
+        self.assertEqual(list(Sale.objects.values_list('pk', flat=True)), [self.recent.pk])
+        self.assertFalse(SaleItem.objects.filter(sale_id=self.old.pk).exists())
+        self.assertEqual(ArchivedMonth.objects.get().sales, 1)
+        self.assertEqual(rollups.totals(), totals)
+        rollups.rebuild()  # archived days are left alone
+        self.assertEqual(rollups.totals(), totals)
+        self.assertFalse(ledger.reconcile().exists())
+
+        receipt = self.client.get(f'/sales/receipt/{self.old.pk}/', {'print': 'true'})
+        self.assertIn(b"Paracetamol 500mg - 3 x 5.00 = 15.00", receipt.content)
+        rows = list(csv.reader(line for line in exports.export_lines('sales')))[1:]
+        self.assertEqual([(int(row[0]), row[5]) for row in rows], [(self.old.pk, '3'), (self.recent.pk, '1')])
+        self.assertEqual(exports.export_size('sales'), 2)
+        old_day = timezone.localdate(timezone.now() - timedelta(days=400))
+        self.assertEqual(exports.export_size('sales', start=old_day + timedelta(days=1)), 1)  # cuts the month
+
+    def test_dry_run_only_counts(self):
+        out = StringIO()
+        call_command('archive_sales', months=12, dry_run=True, stdout=out)
+        self.assertIn("Would archive 1 sale(s) and 1 line(s)", out.getvalue())
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertFalse(ArchivedMonth.objects.exists())
+
+    def test_recent_months_stay_live(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_sales', months=1, stdout=StringIO())
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_failed_merge_keeps_the_month_file(self):
+        call_command('archive_sales', months=12, stdout=StringIO())
+        record = ArchivedMonth.objects.get()
+        late = checkout([{'medicine_id': self.medicine.pk, 'quantity': 2}])
+        Sale.objects.filter(pk=late.pk).update(sale_date=timezone.now() - timedelta(days=400))
+        with mock.patch.object(archive, '_delete', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            archive.archive_month(record.month)
+        self.assertTrue(Sale.objects.filter(pk=late.pk).exists())
+        self.assertEqual(ArchivedMonth.objects.get().filename, record.filename)
+        self.assertEqual([path.name for path in archive.archive_dir().iterdir()], [record.filename])
+        self.assertEqual(archive.load(record)['sales']['id'], [self.old.pk])
+
+    def test_reports_and_sizes_skip_what_they_cannot_count(self):
+        Sale.objects.filter(pk=self.old.pk).update(voided_at=timezone.now())
+        call_command('archive_sales', months=12, stdout=StringIO())
+        self.assertEqual(exports.export_size('sales'), 1)
+        self.assertEqual(exports.export_size('sales', start=timezone.localdate() - timedelta(days=30)), 1)
+        response = self.client.get(reverse('analytics_report', args=['top']),
+                                   {'from': str(archive.live_since() - timedelta(days=1))})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(TestCase):
+    """Routing decisions only; the test settings have no replica connection."""
+
+    def test_reporting_reads_use_the_replica(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Sale), 'default')
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(Sale), 'replica')
+            self.assertEqual(router.db_for_write(Sale), 'default')
+
+    def test_writer_is_pinned_to_the_primary(self):
+        user = User.objects.create_user('cashier', password='cashier')
+        medicine = make_medicine("Paracetamol", quantity=10)
+        self.client.force_login(user)
+
+        response = self.client.post('/sell/', {'items': f'[{{"medicine_id": {medicine.pk}, "quantity": 1}}]'})
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 15)
+        # Pinned, so no read goes to the (nonexistent) replica connection.
+        response = self.client.get('/medicines/sales/')
+        self.assertContains(response, "Paracetamol")
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+        response = self.client.get('/medicines/')  # the dashboard, still pinned
+        self.assertEqual(response.context['medicine_count'], 1)
+
+        self.client.cookies.pop(routers.PIN_COOKIE)
+        with self.assertRaises(ConnectionDoesNotExist):  # unpinned, the dashboard reads the replica
+            self.client.get('/medicines/')
+
+        state = routers.RequestRouting()
+        token = routers._request.set(state)
+        try:
+            self.assertEqual(routers.reporting_database(), 'replica')
+            state.wrote = True
+            self.assertEqual(routers.reporting_database(), 'default')
+        finally:
+            routers._request.reset(token)
+
+
+class SlidingSessionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='cashier'))
+
+    def session_writes(self, path):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(path)
+        return [q['sql'] for q in captured if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')]
+
+    def test_read_only_requests_do_not_write_the_session(self):
+        self.assertTrue(self.session_writes('/medicines/search/?q=para'))  # first request stamps the expiry
+        self.assertEqual(self.session_writes('/medicines/search/?q=para'), [])
+        self.assertEqual(self.session_writes('/medicines/search/?q=parac'), [])
+
+    def test_stale_expiry_is_refreshed(self):
+        self.client.get('/medicines/search/?q=para')
+        session = self.client.session
+        session[sessions.REFRESHED_KEY] -= settings.SESSION_REFRESH_AFTER
+        session.save()
+        self.assertTrue(self.session_writes('/medicines/search/?q=para'))
+
+    def test_sessions_live_in_the_shared_cache(self):
+        self.client.get('/medicines/search/?q=para')
+        key = self.client.session.cache_key
+        self.assertIsNotNone(caches[settings.SESSION_CACHE_ALIAS].get(key))
+        self.client.logout()
+        self.assertIsNone(caches[settings.SESSION_CACHE_ALIAS].get(key))
+
+
+class JobRunnerTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(JOB_RESULTS_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.user = User.objects.create_user('manager', password='manager')
+        self.client.force_login(self.user)
+        make_medicine("Paracetamol 500mg", quantity=0, buying_price=Decimal('2.00'), selling_price=Decimal('5.00'),
+                      manufacturer="Dawa")
+
+    def test_export_runs_in_the_worker_and_downloads(self):
+        status_url = self.client.post('/jobs/export/start/', {'kind': 'stock'}).json()['status_url']
+        self.assertEqual(jobs.execute(jobs.claim()), Job.DONE)
+        job = self.client.get(status_url).json()
+        self.assertEqual((job['status'], job['progress'], job['message']), ('done', 100, "1 rows"))
+        response = self.client.get(job['download_url'])
+        self.assertIn(b"Paracetamol 500mg", b''.join(response.streaming_content))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="stock.csv"')
+
+    def test_failures_back_off_then_fail_until_retried(self):
+        job = jobs.enqueue('rebuild_rollups', {'start': '2024-01-01'}, user=self.user)
+        with self.assertLogs('inventory.jobs', 'ERROR'):
+            Job.objects.filter(pk=job.pk).update(params={'start': 'not a date'})
+            self.assertEqual(jobs.execute(jobs.claim()), Job.QUEUED)
+            self.assertIsNone(jobs.claim())  # backing off
+            Job.objects.filter(pk=job.pk).update(attempts=job.max_attempts - 1, run_after=job.created_at)
+            self.assertEqual(jobs.execute(jobs.claim()), Job.FAILED)
+        self.assertEqual(self.client.post(f'/jobs/{job.pk}/retry/').status_code, 202)
+        self.assertEqual(jobs.claim(), job.pk)
+
+    def test_bad_parameters_are_rejected_when_queued(self):
+        for params in ({'kind': 'sales', 'start': 'yesterday'}, {'kind': 'expiry', 'days': 'soon'},
+                       {'kind': 'expiry', 'days': '-1'}):
+            self.assertEqual(self.client.post('/jobs/export/start/', params).status_code, 400, params)
+        self.assertFalse(Job.objects.exists())
+
+    def test_huge_expiry_window_is_clamped(self):
+        self.client.post('/jobs/export/start/', {'kind': 'expiry', 'days': '5000000'})
+        self.assertEqual(Job.objects.get().params['days'], batches.MAX_ALERT_DAYS)
+        self.assertEqual(jobs.execute(jobs.claim()), Job.DONE)
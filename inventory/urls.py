@@ -1,6 +1,6 @@
 from django.urls import path
 from django.shortcuts import redirect
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Homepage redirects to medicine list
@@ -8,7 +8,9 @@ urlpatterns = [
 
     # Medicine management
     path('medicines/', views.medicine_list, name='medicine_list'),
+    path('medicines/search/', views.medicine_search, name='medicine_search'),
     path('add/', views.medicine_add, name='medicine_add'),
+    path('import/', views.medicine_import, name='medicine_import'),
     path('edit/<int:id>/', views.medicine_edit, name='medicine_edit'),
     path('delete/<int:id>/', views.medicine_delete, name='medicine_delete'),
 
@@ -16,14 +18,44 @@ urlpatterns = [
     path('sell/', views.medicine_sell, name='medicine_sell'),               # Multiple medicines
     path('sell/<int:medicine_id>/', views.medicine_sell, name='medicine_sell'),  # Single medicine
 
+    # Catalog copy for the sell page (columnar JSON, ETag and ?since= deltas)
+    path('catalog/sync/', views.catalog_sync, name='catalog_sync'),
+
+    # Point of sale: async endpoints for the tills (serve through ASGI)
+    path('pos/search/', async_views.pos_search, name='pos_search'),
+    path('pos/stock/', async_views.pos_stock, name='pos_stock'),
+    path('pos/receipts/<int:sale_id>/', async_views.pos_receipt, name='pos_receipt'),
+
     # Sale receipt
     path('sales/receipt/<int:sale_id>/', views.sale_receipt, name='sale_receipt'),
+    path('sales/receipts/', views.sale_receipts_batch, name='sale_receipts_batch'),
 
     # Sales list
     path('medicines/sales/', views.sales_list, name='sales_list'),
+    path('medicines/sales/api/', views.sales_api, name='sales_api'),
+
+    # Expiring stock by batch (JSON)
+    path('medicines/expiry/', views.expiry_alerts, name='expiry_alerts'),
+
+    # CSV exports (sales, stock, expiry)
+    path('exports/<slug:kind>.csv', views.export_csv, name='export_csv'),
+
+    # Sales analytics for charts (series, top, slow)
+    path('analytics/<slug:report>/', views.analytics_report, name='analytics_report'),
+
+    # Background jobs: start, poll, download the result, retry (JSON)
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/<slug:kind>/start/', views.job_start, name='job_start'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
+    path('jobs/<int:job_id>/retry/', views.job_retry, name='job_retry'),
+
+    # Void sales (POST): one, or many at once
+    path('sales/void/<int:sale_id>/', views.sale_void, name='sale_void'),
+    path('sales/void/', views.sales_void, name='sales_void'),
 
-    # Delete a sale
-    path('sales/delete/<int:sale_id>/', views.sale_delete, name='sale_delete'),
+    # In-process request timings (staff only)
+    path('stats/requests/', views.request_stats, name='request_stats'),
 
     # Authentication
     path('login/', views.user_login, name='user_login'),
@@ -0,0 +1,43 @@
+"""
+Cache versions shared by every process.
+
+Catalog snapshots (``inventory.catalog``), analytics reports
+(``inventory.analytics``) and rendered receipts (``inventory.receipts``) are
+cached under keys that embed a version number. The numbers live in the ``CacheVersion`` table rather than in a
+cache, so a write handled by one web worker, or by the job runner,
+invalidates the snapshots cached by all of them: ``get()`` is a primary-key
+lookup and the old keys are simply never read again.
+
+``bump()`` updates the row in the writer's own transaction, so the new
+version becomes visible together with the data it describes. A snapshot
+built from older data is stored under the older version.
+"""
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CacheVersion
+
+
+def get(name):
+    """Current version of ``name``; 0 until it is first bumped."""
+    return CacheVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+async def aget(name):
+    """Async ``get()``."""
+    return await CacheVersion.objects.filter(name=name).values_list('version', flat=True).afirst() or 0
+
+
+def bump(name):
+    """Move ``name`` to a new version; call inside the transaction that changed the data."""
+    if CacheVersion.objects.filter(name=name).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            # Start from the clock so a re-created row never reuses old keys.
+            CacheVersion.objects.create(name=name, version=time.time_ns())
+    except IntegrityError:
+        # Another process created it first; that is a new version too.
+        pass
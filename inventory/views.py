@@ -1,13 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
-from django.db.models import Q
-from .models import Medicine, Sale, SaleItem, Category
-from .forms import MedicineForm
+from django.db import transaction
+from .models import Job, Medicine, Receipt, Sale
+from .forms import MedicineEditForm, MedicineForm, MedicineImportForm
+from . import analytics, batches, catalog, exports, importer, jobs, ledger, profiling, receipts, rollups, search, sync
+from .checkout import CheckoutError, checkout, void_sales
+from .routers import reporting
+from .sales_history import PAGE_SIZE, InvalidCursor, SalesFilter, sales_page
+from .dashboard import annotate_stock_values, dashboard_summary, low_stock_condition
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, quote_etag
 from django.utils import timezone
-from datetime import timedelta
-from django.http import JsonResponse, HttpResponse
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 import json
 
 # ----- LOGIN VIEW -----
@@ -35,69 +43,144 @@ def user_logout(request):
 
 # ----- MEDICINE LIST VIEW -----
 @login_required
+@reporting  # the dashboard only reads; its snapshots are keyed by the version read from the same database
+@catalog.pinned()  # one catalog version read for all the page's snapshots and fragments
 def medicine_list(request):
     query = request.GET.get('q')
     if query:
-        medicines = Medicine.objects.filter(
-            Q(name__icontains=query) | Q(manufacturer__icontains=query)
-        ).order_by('name')
+        medicines = annotate_stock_values(search.filter_medicines(query)).order_by('name')
         categories = None
+        # All KPIs come from one aggregate query; the row querysets stay lazy.
+        summary = dashboard_summary(medicines)
     else:
-        medicines = Medicine.objects.all().order_by('name')
-        categories = Category.objects.prefetch_related('medicines').all()
+        medicines = annotate_stock_values(Medicine.objects.all()).order_by('name')
+        # Called by the template only when its cached table fragment misses.
+        categories = catalog.category_tables
+        summary = catalog.summary()
+        # Expiry counts come from the cached batch buckets, not a medicine scan.
+        expiry = batches.expiry_buckets()
+        summary = {**summary, 'soon_to_expire_count': expiry['within_30']['medicines']}
 
-    low_stock = medicines.filter(quantity__lt=10)
-    today_plus_30 = timezone.now().date() + timedelta(days=30)
-    soon_to_expire = medicines.filter(expiry_date__lte=today_plus_30)
-
-    for med in medicines:
-        med.total_value = med.quantity * med.buying_price
-        med.profit_per_unit_value = med.selling_price - med.buying_price
-
-    total_quantity = sum(m.quantity for m in medicines)
-    total_stock_value = sum(m.total_value for m in medicines)
-    normal_stock_count = medicines.count() - low_stock.count()
+    low_stock = medicines.filter(low_stock_condition())
+    soon_to_expire = medicines.filter(
+        pk__in=batches.open_batches(summary['today_plus_30']).values('medicine_id'),
+    )
 
     context = {
         'medicines': medicines,
         'categories': categories,
         'low_stock': low_stock,
         'soon_to_expire': soon_to_expire,
-        'medicine_count': medicines.count(),
-        'normal_stock_count': normal_stock_count,
-        'total_quantity': total_quantity,
-        'total_stock_value': total_stock_value,
+        'low_stock_count': summary['low_stock_count'],
+        'soon_to_expire_count': summary['soon_to_expire_count'],
+        'medicine_count': summary['medicine_count'],
+        'normal_stock_count': summary['normal_stock_count'],
+        'total_quantity': summary['total_quantity'],
+        'total_stock_value': summary['total_stock_value'],
         'query': query,
-        'today_plus_30': today_plus_30,
+        'today_plus_30': summary['today_plus_30'],
+        'expiry_buckets': None if query else expiry,
+        'reorders': None if query else catalog.reorders(),
+        'catalog_version': catalog.current_version(),
+        'fragment_timeout': catalog.SNAPSHOT_TIMEOUT,
     }
     return render(request, 'inventory/medicine_list.html', context)
 
+# ----- EXPIRY ALERTS -----
+@login_required
+def expiry_alerts(request):
+    days = request.GET.get('days', '')
+    days = min(int(days), batches.MAX_ALERT_DAYS) if days.isdigit() else batches.BUCKET_DAYS[-1]
+    return JsonResponse({
+        'buckets': batches.expiry_buckets(),
+        'batches': batches.expiring(days),
+    })
+
+# ----- MEDICINE TYPEAHEAD -----
+@login_required
+def medicine_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', search.TYPEAHEAD_LIMIT))
+    except ValueError:
+        limit = search.TYPEAHEAD_LIMIT
+    results = search.typeahead(query, limit) if query else []
+    return JsonResponse({'results': results})
+
 # ----- MEDICINE ADD -----
 @login_required
 def medicine_add(request):
     if request.method == 'POST':
-        form = MedicineForm(request.POST)
+        form = MedicineForm(request.POST, category_choices=catalog.categories())
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                medicine = form.save()
+                ledger.record_opening(medicine, lot_number=form.cleaned_data['lot_number'])
             return redirect('medicine_list')
     else:
-        form = MedicineForm()
-    categories = Category.objects.all()
-    return render(request, 'inventory/medicine_form.html', {'form': form, 'categories': categories})
+        form = MedicineForm(category_choices=catalog.categories())
+    return render(request, 'inventory/medicine_form.html', {'form': form})
+
+# ----- MEDICINE BULK IMPORT -----
+@login_required
+def medicine_import(request):
+    report = error = None
+    dry_run = False
+    if request.method == 'POST':
+        form = MedicineImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            dry_run = form.cleaned_data['dry_run']
+            try:
+                report = importer.import_file(
+                    form.cleaned_data['file'], form.file_format,
+                    quantity_mode=form.cleaned_data['quantity_mode'],
+                    dry_run=dry_run,
+                )
+            except importer.ImportFormatError as e:
+                error = str(e)
+    else:
+        form = MedicineImportForm()
+    return render(request, 'inventory/medicine_import.html', {
+        'form': form,
+        'report': report,
+        'shown_errors': report.errors[:100] if report else [],
+        'dry_run': dry_run,
+        'error': error,
+    })
 
 # ----- MEDICINE EDIT -----
 @login_required
 def medicine_edit(request, id):
     medicine = get_object_or_404(Medicine, id=id)
     if request.method == 'POST':
-        form = MedicineForm(request.POST, instance=medicine)
+        current_quantity = medicine.quantity
+        form = MedicineEditForm(request.POST, instance=medicine, category_choices=catalog.categories())
         if form.is_valid():
-            form.save()
-            return redirect('medicine_list')
+            # Stock moves through the ledger as the change from the quantity the
+            # form displayed, so a sale made while the form was open is not
+            # overwritten. Added units become a new batch with the submitted
+            # expiry date; the medicine's own expiry date always follows its
+            # earliest batch.
+            seen_quantity = form.cleaned_data['seen_quantity']
+            medicine = form.save(commit=False)
+            expiry_date = form.cleaned_data['expiry_date']
+            delta = medicine.quantity - (current_quantity if seen_quantity is None else seen_quantity)
+            try:
+                with transaction.atomic():
+                    medicine.save(update_fields=[f for f in form.Meta.fields if f not in ('quantity', 'expiry_date')])
+                    ledger.adjust(medicine, delta, note="Edited from stock form",
+                                  expiry_date=expiry_date, lot_number=form.cleaned_data['lot_number'])
+                    if not delta and 'expiry_date' in form.changed_data:
+                        ledger.set_expiry(medicine, expiry_date)
+            except ledger.InsufficientStock as e:
+                form.add_error('quantity', str(e))
+            except ledger.AmbiguousExpiry as e:
+                form.add_error('expiry_date', str(e))
+            else:
+                return redirect('medicine_list')
     else:
-        form = MedicineForm(instance=medicine)
-    categories = Category.objects.all()
-    return render(request, 'inventory/medicine_form.html', {'form': form, 'categories': categories})
+        form = MedicineEditForm(instance=medicine, category_choices=catalog.categories())
+    return render(request, 'inventory/medicine_form.html', {'form': form})
 
 # ----- MEDICINE DELETE -----
 @login_required
@@ -118,158 +201,313 @@ def medicine_sell(request, medicine_id=None):
     if medicine_id:
         preselected_medicine = get_object_or_404(Medicine, id=medicine_id)
 
-    if query:
-        medicines = Medicine.objects.filter(
-            Q(name__icontains=query) | Q(manufacturer__icontains=query)
-        ).order_by('name')
-    else:
-        medicines = Medicine.objects.all().order_by('name')
-
     if request.method == 'POST':
-        items_data = json.loads(request.POST.get('items', '[]'))
+        try:
+            items_data = json.loads(request.POST.get('items', '[]'))
+        except ValueError:
+            items_data = []
         payment_mode = request.POST.get('payment_mode', 'Cash')
 
         # Single medicine sale
         if not items_data and preselected_medicine:
-            qty = int(request.POST.get('quantity', 0))
-            if qty <= 0 or qty > preselected_medicine.quantity:
-                error = f"Invalid quantity for {preselected_medicine.name}"
+            items_data = [{'medicine_id': preselected_medicine.id, 'quantity': request.POST.get('quantity', 0)}]
+
+        if items_data:
+            try:
+                sale = checkout(items_data, payment_mode)
+            except CheckoutError as e:
+                error = str(e)
             else:
-                sale = Sale.objects.create(payment_mode=payment_mode)
-                SaleItem.objects.create(
-                    sale=sale,
-                    medicine=preselected_medicine,
-                    quantity=qty,
-                    price=preselected_medicine.selling_price
-                )
-                sale.total_amount = qty * preselected_medicine.selling_price
-                sale.save()
                 return redirect('sale_receipt', sale_id=sale.id)
-
-        # Multiple medicine sale
-        elif items_data:
-            sale = Sale.objects.create(payment_mode=payment_mode)
-            total_amount = 0
-            for item in items_data:
-                try:
-                    med = Medicine.objects.get(id=item['medicine_id'])
-                    qty = int(item['quantity'])
-                    price = float(item['price'])
-                    if qty <= 0 or qty > med.quantity:
-                        raise ValueError(f"Invalid quantity for {med.name}")
-                    SaleItem.objects.create(
-                        sale=sale,
-                        medicine=med,
-                        quantity=qty,
-                        price=price
-                    )
-                    total_amount += price * qty
-                except Exception as e:
-                    sale.delete()
-                    error = str(e)
-                    return render(request, 'inventory/medicine_sell_multiple.html', {
-                        'medicines': medicines,
-                        'error': error,
-                        'query': query,
-                        'preselected_medicine': preselected_medicine
-                    })
-            sale.total_amount = total_amount
-            sale.save()
-            return redirect('sale_receipt', sale_id=sale.id)
         else:
             error = "No medicines selected for sale."
 
+    # The medicine options come from the till's local copy of catalog_sync.
     context = {
-        'medicines': medicines,
         'preselected_medicine': preselected_medicine,
         'error': error,
         'query': query,
     }
     return render(request, 'inventory/medicine_sell_multiple.html', context)
 
+# ----- CATALOG SYNC (JSON) -----
+@login_required
+def catalog_sync(request):
+    """
+    Columnar catalog for the sell page: the whole of it, or with
+    ``?since=<version>`` only what changed. Conditional requests get a 304.
+    """
+    since = request.GET.get('since', '')
+    since = int(since) if since.isdigit() else 0
+    version = sync.current_version() if since else None
+    if since and since <= version:
+        etag = quote_etag(f'{since}-{version}')
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is None:
+            body = sync.changes(since, version)
+    else:
+        version, body = sync.snapshot()
+        etag = quote_etag(str(version))
+        not_modified = get_conditional_response(request, etag=etag)
+    response = not_modified or HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 # ----- SALES LIST VIEW -----
 @login_required
+@reporting
 def sales_list(request):
-    query = request.GET.get('q')
-    sales = Sale.objects.prefetch_related('items__medicine').all().order_by('-id')
-
-    if query:
-        sales = sales.filter(items__medicine__name__icontains=query).distinct()
+    filters = SalesFilter.from_params(request.GET)
+    try:
+        page = sales_page(filters, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return redirect('sales_list')
 
     sales_data = []
-    total_profit = 0
-    today = timezone.now().date()
-    todays_sales_data = []
-
-    for sale in sales:
-        sale_total = sum(item.price * item.quantity for item in sale.items.all())
-        sale_profit = sum((item.price - item.medicine.buying_price) * item.quantity for item in sale.items.all())
+    for sale in page.sales:
         items_info = [{
-            'name': item.medicine.name,
-            'quantity': item.quantity,
-            'price': item.price,
-            'subtotal': item.price * item.quantity
-        } for item in sale.items.all()]
+            'name': name,
+            'quantity': quantity,
+            'price': price,
+            'subtotal': price * quantity
+        } for name, quantity, price in page.items.get(sale.pk, [])]
         sales_data.append({
             'sale': sale,
-            'total_sale': sale_total,
-            'profit': sale_profit,
+            'total_sale': sale.total_sale,
+            'profit': sale.profit,
             'items_info': items_info
         })
-        total_profit += sale_profit
-        if sale.sale_date.date() == today:
-            todays_sales_data.append({
-                'sale': sale,
-                'total_sale': sale_total,
-                'profit': sale_profit,
-                'items_info': items_info
-            })
-
-    todays_total_sales = sum(item['total_sale'] for item in todays_sales_data)
-    todays_total_profit = sum(item['profit'] for item in todays_sales_data)
+
+    next_page_query = None
+    if page.next_cursor:
+        next_page_query = urlencode({**filters.as_params(), 'cursor': page.next_cursor})
+
+    # Headline figures come from the daily rollup rows, not the sales history.
+    today = timezone.localdate()
+    todays_totals = rollups.totals(date=today)
+    day_start = timezone.make_aware(datetime.combine(today, time.min))
+    todays_sale_count = Sale.objects.filter(
+        sale_date__gte=day_start, sale_date__lt=day_start + timedelta(days=1), voided_at__isnull=True
+    ).count()
 
     context = {
         'sales_data': sales_data,
-        'total_profit': total_profit,
-        'todays_sales_data': todays_sales_data,
-        'todays_total_sales': todays_total_sales,
-        'todays_total_profit': todays_total_profit,
-        'query': query,
+        'total_profit': rollups.totals()['profit'],
+        'todays_sale_count': todays_sale_count,
+        'todays_total_sales': todays_totals['revenue'],
+        'todays_total_profit': todays_totals['profit'],
+        'query': filters.query,
+        'filters': filters,
+        'payment_choices': Sale.PAYMENT_CHOICES,
+        'is_first_page': not request.GET.get('cursor'),
+        'first_page_query': urlencode(filters.as_params()),
+        'next_page_query': next_page_query,
     }
     return render(request, 'inventory/sales_list.html', context)
 
+# ----- SALES HISTORY API -----
+@login_required
+@reporting
+def sales_api(request):
+    filters = SalesFilter.from_params(request.GET)
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+        page = sales_page(filters, cursor=request.GET.get('cursor'), limit=limit)
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = [[
+        sale.pk,
+        sale.sale_date.isoformat(),
+        sale.payment_mode,
+        str(sale.total_sale),
+        str(sale.profit),
+        [[name, quantity, str(price)] for name, quantity, price in page.items.get(sale.pk, [])],
+    ] for sale in page.sales]
+    return JsonResponse({
+        'columns': ['id', 'sale_date', 'payment_mode', 'total', 'profit', 'items'],
+        'rows': rows,
+        'next': page.next_cursor,
+    })
+
 # ----- SALE RECEIPT VIEW -----
 @login_required
 def sale_receipt(request, sale_id):
-    sale = get_object_or_404(Sale, id=sale_id)
-    sale_items = sale.items.all()
-    for item in sale_items:
-        item.total = item.quantity * item.price
-    total_price = sum(item.total for item in sale_items)
-    profit = sum((item.price - item.medicine.buying_price) * item.quantity for item in sale_items)
-
     if request.GET.get("print") == "true":
-        receipt_text = "--- PHARMACY RECEIPT ---\n\n"
-        for item in sale_items:
-            receipt_text += f"{item.medicine.name} - {item.quantity} x {item.price} = {item.total}\n"
-        receipt_text += f"\nTotal Price: {total_price}\nPayment Mode: {sale.payment_mode}\nDate: {sale.sale_date.strftime('%Y-%m-%d %H:%M')}\n\n-------------------------\nThank you for shopping with us!"
+        receipt_text = receipts.rendered(sale_id, receipts.TEXT)
+        if receipt_text is None:
+            raise Http404("Sale not found.")
         response = HttpResponse(receipt_text, content_type="text/plain")
         response['Content-Disposition'] = 'attachment; filename="receipt.txt"'
         return response
 
-    context = {
-        'sale': sale,
-        'total_price': total_price,
-        'profit': profit,
-        'sale_items': sale_items,
-        'show_back_button': False
+    receipt_html = receipts.rendered(sale_id, receipts.HTML)
+    if receipt_html is None:
+        raise Http404("Sale not found.")
+    return HttpResponse(receipt_html)
+
+# ----- BATCH RECEIPT REPRINT -----
+@login_required
+@reporting
+def sale_receipts_batch(request):
+    selected = Receipt.objects.all()
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip().isdigit()]
+    day = request.GET.get('date')
+    if ids:
+        selected = selected.filter(sale_id__in=ids)
+    elif day:
+        filters = SalesFilter.from_params({'from': day, 'to': day})
+        if not filters.date_from:
+            return HttpResponse("Invalid date, expected YYYY-MM-DD.", status=400, content_type="text/plain")
+        selected = selected.filter(sale__in=filters.apply(Sale.objects.all()))
+    else:
+        return HttpResponse("Pass ?ids=1,2,3 or ?date=YYYY-MM-DD.", status=400, content_type="text/plain")
+
+    response = StreamingHttpResponse(receipts.stream_text(selected), content_type="text/plain")
+    response['Content-Disposition'] = 'attachment; filename="receipts.txt"'
+    return response
+
+# ----- CSV EXPORTS -----
+@login_required
+@reporting
+def export_csv(request, kind):
+    if kind not in exports.EXPORTS:
+        raise Http404("Unknown export.")
+    options = {}
+    if kind == 'sales':
+        filters = SalesFilter.from_params(request.GET)
+        options = {'start': filters.date_from, 'end': filters.date_to}
+    elif kind == 'expiry':
+        days = request.GET.get('days', '')
+        if days and not days.isdigit():
+            return HttpResponse("days must be a whole number of days.", status=400, content_type="text/plain")
+        options = {'days': int(days) if days else exports.EXPIRY_DAYS}
+
+    response = StreamingHttpResponse(exports.export_lines(kind, **options), content_type="text/csv")
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{timezone.localdate():%Y%m%d}.csv"'
+    return response
+
+# ----- SALES ANALYTICS (JSON) -----
+@login_required
+@reporting
+def analytics_report(request, report):
+    """``series``, ``top`` or ``slow`` report for the charts, as JSON."""
+    today = timezone.localdate()
+    filters = SalesFilter.from_params(request.GET)
+    try:
+        limit = int(request.GET.get('limit', analytics.TOP_LIMIT))
+        if report == 'series':
+            grain = request.GET.get('grain', 'month')
+            start = filters.date_from or analytics.period_start(today - timedelta(days=365), grain)
+            rows = analytics.series(start, filters.date_to or today, grain, request.GET.get('by') or None)
+        elif report == 'top':
+            start = filters.date_from or today - timedelta(days=30)
+            rows = analytics.top_medicines(start, filters.date_to or today, request.GET.get('metric', 'revenue'), limit)
+        elif report == 'slow':
+            days = request.GET.get('days', '')
+            rows = analytics.slow_movers(int(days) if days.isdigit() else analytics.SLOW_MOVER_DAYS, limit)
+        else:
+            raise Http404("Unknown report.")
+    except (analytics.InvalidReport, ValueError, OverflowError) as e:  # OverflowError: a huge days or limit
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'report': report, 'rows': rows})
+
+# ----- BACKGROUND JOBS (JSON) -----
+def _user_jobs(user):
+    return Job.objects.all() if user.is_staff else Job.objects.filter(created_by=user)
+
+
+def _job_json(job):
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('job_status', args=[job.pk]),
+        'download_url': reverse('job_download', args=[job.pk]) if job.result else None,
     }
-    return render(request, 'inventory/sale_receipt.html', context)
 
-# ----- SALE DELETE VIEW -----
+
 @login_required
-def sale_delete(request, sale_id):
-    sale = get_object_or_404(Sale, id=sale_id)
-    # Only delete sale; stock is restored via post_delete signal in models.py
-    sale.delete()
+def job_list(request):
+    recent = _user_jobs(request.user).order_by('-created_at', '-pk')[:20]
+    return JsonResponse({'jobs': [_job_json(job) for job in recent]})
+
+
+@login_required
+def job_start(request, kind):
+    """Queue a ``kind`` job with the POSTed parameters; poll its ``status_url``."""
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST to start a job."}, status=405)
+    try:
+        job = jobs.enqueue(kind, request.POST.dict(), user=request.user)
+    except jobs.JobError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(_job_json(job), status=202)
+
+
+@login_required
+def job_status(request, job_id):
+    return JsonResponse(_job_json(get_object_or_404(_user_jobs(request.user), pk=job_id)))
+
+
+@login_required
+def job_download(request, job_id):
+    job = get_object_or_404(_user_jobs(request.user).filter(status=Job.DONE).exclude(result=''), pk=job_id)
+    kind = jobs.REGISTRY[job.kind]
+    try:
+        result = open(jobs.result_path(job), 'rb')
+    except FileNotFoundError:
+        raise Http404("The result file is gone; run the job again.")
+    return FileResponse(result, as_attachment=True, filename=kind.download_name(job.params),
+                        content_type=kind.content_type)
+
+
+@login_required
+def job_retry(request, job_id):
+    job = get_object_or_404(_user_jobs(request.user), pk=job_id)
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST to retry a job."}, status=405)
+    if not jobs.retry(job):
+        return JsonResponse({'error': "Only failed jobs can be retried."}, status=409)
+    job.refresh_from_db()
+    return JsonResponse(_job_json(job), status=202)
+
+# ----- VOID SALES -----
+# Voided sales are kept (see Sale.voided_at); their stock goes back on the shelf.
+@login_required
+def sale_void(request, sale_id):
+    if request.method != 'POST':
+        return HttpResponse("POST to void a sale.", status=405, content_type="text/plain")
+    get_object_or_404(Sale, id=sale_id)
+    void_sales([sale_id], note="Sale voided")
+    return redirect('sales_list')
+
+
+@login_required
+def sales_void(request):
+    """Void every sale in the POSTed ``ids`` (repeated or comma-separated) at once."""
+    if request.method != 'POST':
+        return HttpResponse("POST the ids of the sales to void.", status=405, content_type="text/plain")
+    ids = {int(pk) for value in request.POST.getlist('ids') for pk in value.split(',') if pk.strip().isdigit()}
+    if not ids:
+        return HttpResponse("Pass the ids of the sales to void.", status=400, content_type="text/plain")
+    voided = void_sales(ids, note="Sales voided")
+    if request.headers.get('Accept') == 'application/json':
+        return JsonResponse({'voided': [sale.pk for sale in voided]})
     return redirect('sales_list')
+
+# ----- REQUEST STATS (STAFF ONLY) -----
+@user_passes_test(lambda user: user.is_staff)
+def request_stats(request):
+    return JsonResponse({
+        'views': profiling.stats(),
+        'catalog_cache': catalog.stats(),
+    })
@@ -3,6 +3,19 @@ ASGI config for pharmacy project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving over ASGI is opt-in; production runs WSGI (see render.yaml). Under
+ASGI the async point-of-sale views in ``inventory.async_views`` can share a
+few processes between many tills:
+
+    gunicorn pharmacy.asgi:application -k uvicorn_worker.UvicornWorker --workers 2
+
+but Django 5.0 reads a synchronous ``StreamingHttpResponse`` or
+``FileResponse`` completely into memory before sending it under ASGI, so the
+CSV exports, batch receipt reprints and job result downloads would no
+longer stream. Run ``manage.py loadtest_pos`` against it before switching.
+Synchronous views keep working under ASGI; Django runs each one in a
+thread. Under WSGI the async views run too, one event loop per request.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,61 @@
+"""
+SQLite backend tuned for several workers writing at once.
+
+Every new connection gets the PRAGMAs in ``PRAGMAS`` (WAL journal so readers
+never wait for writers, ``synchronous=NORMAL``, a busy timeout, mmap and page
+cache sizes), overridable per database through ``OPTIONS['pragmas']``; a
+value of ``None`` leaves that PRAGMA at SQLite's default.
+
+``OPTIONS['transaction_mode']`` ('DEFERRED', 'IMMEDIATE' or 'EXCLUSIVE')
+sets how every transaction begins, as the built-in backend does from Django
+5.1. ``inventory.db.write_transaction`` asks for ``BEGIN IMMEDIATE`` on a
+single transaction instead, so a writer takes the write lock up front
+rather than failing to upgrade a read lock halfway through with "database
+is locked".
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # negative: KiB, i.e. ~20 MB
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.begin_immediate = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    @property
+    def pragmas(self):
+        return {**PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+
+    @property
+    def transaction_mode(self):
+        mode = (self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}.")
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = 'IMMEDIATE' if self.begin_immediate else self.transaction_mode
+        self.cursor().execute('BEGIN' if mode == 'DEFERRED' else f'BEGIN {mode}')
@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+import dj_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,11 +23,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory.profiling.ProfilingMiddleware',  # first, so it also times the session save
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'inventory.sessions.SlidingSessionMiddleware',  # after SessionMiddleware, so it runs before the save
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -34,10 +40,17 @@ ROOT_URLCONF = 'pharmacy.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'inventory.profiling.TimedDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [BASE_DIR / 'templates'],  # Template folder
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Parsed templates are kept in memory; runserver's autoreloader
+            # resets them when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -50,13 +63,92 @@ TEMPLATES = [
 WSGI_APPLICATION = 'pharmacy.wsgi.application'
 
 # -------------------------
-# Database (Use local SQLite for backup project only)
+# Databases
 # -------------------------
+# DATABASE_URL selects the primary (default: the local SQLite file); set
+# REPLICA_DATABASE_URL to send reporting reads to a read replica through
+# inventory.routers (e.g. sqlite:///replica.sqlite3 refreshed with
+# `manage.py refresh_replica`, or a Postgres standby). Connections are kept
+# open for CONN_MAX_AGE seconds and checked before reuse.
+#
+# SQLite goes through pharmacy.db_backends.sqlite3, which applies a
+# concurrency profile on connect (WAL, synchronous=NORMAL, busy timeout,
+# mmap and cache sizes); see its module docstring. Tests use a file so the
+# concurrency tests run against real WAL.
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 60))
+
+SQLITE_OPTIONS = {
+    'timeout': 20,  # seconds Python's sqlite3 waits on a locked database
+    'pragmas': {
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),
+    },
+}
+
+
+def database(url, **test):
+    config = dj_database_url.parse(url, conn_max_age=CONN_MAX_AGE, conn_health_checks=True)
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['ENGINE'] = 'pharmacy.db_backends.sqlite3'
+        config['OPTIONS'] = SQLITE_OPTIONS
+        test.setdefault('NAME', str(BASE_DIR / 'test_db.sqlite3'))
+    config['TEST'] = test
+    return config
+
+
 DATABASES = {
+    'default': database(os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db_backup.sqlite3'}")),
+}
+if os.environ.get('REPLICA_DATABASE_URL'):
+    # Mirrors the primary under test; run the test suite without a replica.
+    DATABASES['replica'] = database(os.environ['REPLICA_DATABASE_URL'], MIRROR='default')
+
+DATABASE_ROUTERS = ['inventory.routers.ReplicaRouter']
+REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+# After a user writes, their reporting reads stay on the primary this long.
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 15))
+
+# Serialize sale commits of one process through inventory.db.write_queue.
+# Worth enabling with many threads per worker; SQLite still serializes writers
+# of different processes through its own lock.
+SQLITE_WRITE_QUEUE = os.environ.get('SQLITE_WRITE_QUEUE', '') == '1'
+
+# -------------------------
+# Caches
+# -------------------------
+# "catalog" holds versioned medicine/category snapshots (see inventory.catalog).
+# Their versions live in the database, so each process may keep its own
+# copies; LocMemCache evicts least-recently-used entries once MAX_ENTRIES is
+# reached. Point CATALOG_CACHE_BACKEND at a shared cache to build them once.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db_backup.sqlite3',  # separate DB file
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pharmacy-default',
+    },
+    'catalog': {
+        'BACKEND': os.environ.get('CATALOG_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', 'pharmacy-catalog'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+    # Analytics reports (inventory.analytics): one entry per ended day, week or
+    # month and report, versioned in the database like the catalog. Kept apart
+    # so a long day-grain series does not cull sessions or receipts.
+    'analytics': {
+        'BACKEND': os.environ.get('ANALYTICS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('ANALYTICS_CACHE_LOCATION', 'pharmacy-analytics'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Sessions (cached_db, below) must come from a cache every process shares:
+    # a logout in one worker has to end the session in the others too. Files
+    # on the local disk are shared by the processes of one host; point
+    # SESSION_CACHE_BACKEND at Redis or Memcached when running several hosts.
+    'sessions': {
+        'BACKEND': os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'sessions')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
 # Password validation
@@ -74,7 +166,15 @@ USE_I18N = True
 USE_TZ = True
 
 # Static files
+# Served by WhiteNoise: `collectstatic` (part of the build) writes hashed,
+# gzip/Brotli-compressed copies to STATIC_ROOT and they are sent with a
+# one-year immutable Cache-Control. See pharmacy.storage.
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'pharmacy.storage.StaticFilesStorage'},
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -86,5 +186,53 @@ LOGIN_REDIRECT_URL = '/medicines/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 # Optional: add session expiration for security
-SESSION_COOKIE_AGE = 60 * 60 * 2  # 2 hours
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_COOKIE_AGE = 60 * 60 * 2  # 2 hours, sliding
+# Sessions are read from the shared "sessions" cache and saved only when they
+# change or their expiry is SESSION_REFRESH_AFTER seconds stale
+# (inventory.sessions), so read-only requests do no session writes.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_AFTER = int(os.environ.get('SESSION_REFRESH_AFTER', 60 * 5))
+
+# -------------------------
+# Request profiling (inventory.profiling)
+# -------------------------
+# Works without DEBUG. Slow requests are logged with their top queries; set
+# the sample rate below 1 to log only a fraction of them on busy servers.
+PROFILING_SERVER_TIMING = True
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 1.0))
+PROFILING_REPEATED_QUERY_THRESHOLD = 5
+PROFILING_TOP_QUERIES = 5
+
+# -------------------------
+# Background jobs (inventory.jobs)
+# -------------------------
+# Heavy exports, recounts and rebuilds are queued in the database and run by
+# `python manage.py run_jobs`, at most JOB_WORKERS at a time.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = 3
+JOB_STALE_AFTER = 60 * 15  # seconds without progress before a running job is requeued
+JOB_KEEP_DAYS = 7
+JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR', BASE_DIR / 'job_results')
+
+# -------------------------
+# Sales archive (inventory.archive)
+# -------------------------
+# `python manage.py archive_sales` moves whole months older than
+# SALES_ARCHIVE_AFTER_MONTHS out of the live tables into compressed files.
+SALES_ARCHIVE_DIR = os.environ.get('SALES_ARCHIVE_DIR', BASE_DIR / 'sales_archive')
+SALES_ARCHIVE_AFTER_MONTHS = int(os.environ.get('SALES_ARCHIVE_AFTER_MONTHS', 12))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'inventory.profiling': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'inventory.jobs': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,24 @@
+"""
+Static files storage.
+
+``collectstatic`` writes every file with a content hash in its name plus a
+gzip and a Brotli copy (when ``brotli`` is installed), and WhiteNoise serves
+the hashed names with a far-future, immutable ``Cache-Control``. A changed
+file gets a new name, so browsers never need to revalidate.
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Falls back to the plain file name for files that are not in the manifest
+    instead of raising, so pages still render where ``collectstatic`` has not
+    run (the test suite and the benchmark run with ``DEBUG`` off).
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name